@@ -0,0 +1,148 @@
+from typing import Deque, Optional
+from collections import deque
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class AdmissionRejected(Exception):
+    """Raised when a request is turned away instead of waiting for an LLM slot."""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class AdmissionTicket:
+    """A request's place in the admission queue."""
+
+    def __init__(self, future: asyncio.Future, enqueued_at: float):
+        self.future = future
+        self.enqueued_at = enqueued_at
+        self.finished = False
+
+    @property
+    def admitted(self) -> bool:
+        return self.future.done() and not self.future.cancelled()
+
+class AdmissionController:
+    """Limits how many requests run the LLM at once and queues the rest in FIFO order.
+
+    A request gets a slot immediately while fewer than ``max_concurrency`` are running
+    and nobody is queued; otherwise it waits in a queue of at most ``max_queue``
+    requests. A full queue is rejected with 429 right away, and a request still queued
+    after ``queue_timeout`` seconds is rejected with 503, so clients fail fast instead of
+    every request slowing down together. Used from the event loop only.
+    """
+
+    def __init__(self, max_concurrency: int = 2, max_queue: int = 16, queue_timeout: float = 30,
+                 retry_after: int = 5):
+        """Initialize the controller.
+
+        Args:
+            max_concurrency: Requests allowed to run the LLM at the same time
+            max_queue: Requests allowed to wait for a slot
+            queue_timeout: Seconds a request may wait before it is rejected
+            retry_after: Seconds clients are told to wait before retrying a rejected request
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._active = 0
+        self._waiting: Deque[AdmissionTicket] = deque()
+        metrics.register_gauge("admission.active", lambda: self._active)
+        metrics.register_gauge("admission.queue_depth", lambda: self.queue_depth)
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of requests waiting for a slot."""
+        return len(self._waiting)
+
+    def position(self, ticket: AdmissionTicket) -> int:
+        """Place of a ticket in the queue, starting at 1; 0 once it is no longer queued."""
+        try:
+            return self._waiting.index(ticket) + 1
+        except ValueError:
+            return 0
+
+    def enqueue(self) -> AdmissionTicket:
+        """Take a slot, or a place in the queue when all slots are busy.
+
+        Returns:
+            The request's ticket; pass it to ``finish`` when the request ends
+
+        Raises:
+            AdmissionRejected: With status 429 when the queue is full
+        """
+        loop = asyncio.get_running_loop()
+        ticket = AdmissionTicket(loop.create_future(), loop.time())
+        if self._active < self.max_concurrency and not self._waiting:
+            self._active += 1
+            ticket.future.set_result(True)
+            metrics.increment("admission.admitted")
+            return ticket
+        if len(self._waiting) >= self.max_queue:
+            metrics.increment("admission.rejected_full")
+            raise AdmissionRejected("Server is busy: the request queue is full", 429, self.retry_after)
+        self._waiting.append(ticket)
+        return ticket
+
+    async def wait(self, ticket: AdmissionTicket, timeout: Optional[float] = None) -> None:
+        """Wait until a ticket is admitted.
+
+        Args:
+            ticket: Ticket returned by ``enqueue``
+            timeout: Seconds to wait; ``queue_timeout`` when not given
+
+        Raises:
+            AdmissionRejected: With status 503 when the request is still queued after the timeout
+        """
+        if not ticket.future.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(ticket.future), timeout or self.queue_timeout)
+            except asyncio.TimeoutError:
+                if not ticket.admitted:
+                    self.finish(ticket)
+                    metrics.increment("admission.rejected_timeout")
+                    raise AdmissionRejected("Server is busy: timed out waiting in the request queue",
+                                            503, self.retry_after)
+            metrics.increment("admission.admitted")
+        metrics.observe("admission.queue_wait_ms", (asyncio.get_running_loop().time() - ticket.enqueued_at) * 1000)
+
+    def finish(self, ticket: AdmissionTicket) -> None:
+        """End a request: free its slot, or leave the queue if it was never admitted.
+
+        Safe to call more than once.
+        """
+        if ticket.finished:
+            return
+        ticket.finished = True
+        if not ticket.admitted:
+            self._waiting.remove(ticket)
+            ticket.future.cancel()
+            return
+        # Hand the slot straight to the next queued request
+        while self._waiting:
+            waiting = self._waiting.popleft()
+            if not waiting.future.done():
+                waiting.future.set_result(True)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold a slot for the duration of the block, queueing for it first if necessary.
+
+        Raises:
+            AdmissionRejected: When the queue is full or the wait times out
+        """
+        ticket = self.enqueue()
+        try:
+            await self.wait(ticket)
+            yield ticket
+        finally:
+            self.finish(ticket)
@@ -1,16 +1,21 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from pydantic_settings import BaseSettings
 from pydantic import BaseModel, Field
 from typing import Dict, Any, Optional, List
+import asyncio
 import logging
 import json
 import yaml
 import os
 
-from tools import retrieve_context, multiply
-from langgraph_agent import create_agent_graph, run_agent_graph, run_agent_graph_streaming
+from tools import retrieve_context, multiply, get_context_retriever, close_context_retriever
+from metrics import metrics
+from langgraph_agent import graph_registry, run_agent_graph, run_agent_graph_streaming
+from models import client_pool
+from admission import AdmissionController, AdmissionRejected, AdmissionTicket
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -41,6 +46,12 @@ class Settings(BaseSettings):
     MAX_TOKENS: int = Field(default=2048, description="Maximum tokens for model output")
     TEMPERATURE: float = Field(default=0.7, description="Model temperature setting")
     
+    # Admission Control Configuration
+    LLM_MAX_CONCURRENCY: int = Field(default=2, description="Chat requests running the LLM at the same time")
+    LLM_MAX_QUEUE: int = Field(default=16, description="Chat requests waiting for the LLM before new ones get 429")
+    LLM_QUEUE_TIMEOUT_SECONDS: float = Field(default=30, description="Seconds a queued chat request waits before it gets 503")
+    SSE_HEARTBEAT_SECONDS: float = Field(default=5, description="Seconds of stream silence before a heartbeat reporting the queue depth and, while the request is queued, its position")
+    
     # Logging Configuration
     LOG_LEVEL: str = Field(default="INFO", description="Logging level")
     
@@ -78,10 +89,72 @@ class ChatResponse(BaseModel):
     """Response model for chat endpoint."""
     response: str
 
+# Seconds between warm-up attempts while the retrieval resources are unavailable
+WARMUP_RETRY_SECONDS = 10
+
+# Seconds between checks for a disconnected client while no stream output is ready
+DISCONNECT_POLL_SECONDS = 1.0
+
+class Readiness:
+    """Tracks whether the retrieval resources are loaded and warmed."""
+
+    def __init__(self):
+        self.ready = False
+        self.error: Optional[str] = None
+        self.warmup_seconds: Optional[float] = None
+
+readiness = Readiness()
+
+# Admits chat requests to the single Ollama host
+admission = AdmissionController(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    max_queue=settings.LLM_MAX_QUEUE,
+    queue_timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS
+)
+
+def admission_error(e: AdmissionRejected) -> HTTPException:
+    """HTTP error for a request the admission controller turned away."""
+    return HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+async def warm_up_retrieval() -> None:
+    """Create and warm the retriever off the event loop, retrying until it succeeds."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        try:
+            await asyncio.to_thread(lambda: get_context_retriever().warm())
+            readiness.ready, readiness.error = True, None
+            readiness.warmup_seconds = round(loop.time() - started, 2)
+            logger.info(f"Retrieval warmed up in {readiness.warmup_seconds}s")
+            return
+        except Exception as e:
+            readiness.error = str(e)
+            logger.error(f"Failed to warm up retrieval, retrying in {WARMUP_RETRY_SECONDS}s: {str(e)}")
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Own the retrieval resources: warm them in the background and release them on shutdown.
+
+    The agent graphs are compiled up front. The app serves (and reports liveness)
+    immediately; readiness flips once the embedding model is loaded and a dummy encode
+    and search have run.
+    """
+    # Compile the agent graphs for the default model once, before the first request
+    for streaming in (False, True):
+        graph_registry.get(tools, assistant_system_prompt, streaming, settings.OLLAMA_MODEL)
+    warmup = asyncio.create_task(warm_up_retrieval())
+    yield
+    warmup.cancel()
+    graph_registry.clear()
+    await client_pool.aclose()
+    await asyncio.to_thread(close_context_retriever)
+
 app = FastAPI(
     title="RAG Backend API",
     description="Backend API for RAG (Retrieval-Augmented Generation) application",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -102,14 +175,30 @@ async def root() -> Dict[str, str]:
     return {"message": "Hello World from RAG Backend!"}
 
 @app.get("/health")
-async def health_check() -> Dict[str, str]:
-    """Health check endpoint."""
-    try:
-        # Add service health checks here
-        return {"status": "healthy"}
-    except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        raise HTTPException(status_code=503, detail="Service unhealthy")
+async def health_check() -> Dict[str, Any]:
+    """Liveness and readiness.
+
+    The process is live whenever it answers; it is ready once retrieval is warmed up.
+    """
+    return {
+        "status": "healthy",
+        "live": True,
+        "ready": readiness.ready,
+        "warmup_seconds": readiness.warmup_seconds,
+        "error": readiness.error
+    }
+
+@app.get("/health/ready")
+async def readiness_check() -> Dict[str, Any]:
+    """Readiness probe; fails with 503 until retrieval is warmed up."""
+    if not readiness.ready:
+        raise HTTPException(status_code=503, detail=readiness.error or "Retrieval is warming up")
+    return {"status": "ready", "warmup_seconds": readiness.warmup_seconds}
+
+@app.get("/metrics")
+async def get_metrics() -> Dict[str, Any]:
+    """Get in-process service metrics such as embedding cache hit rate."""
+    return metrics.snapshot()
 
 @app.get("/config")
 async def get_config() -> Dict[str, Any]:
@@ -128,6 +217,11 @@ async def get_config() -> Dict[str, Any]:
             "chunk_overlap": settings.CHUNK_OVERLAP,
             "max_tokens": settings.MAX_TOKENS,
             "temperature": settings.TEMPERATURE
+        },
+        "admission": {
+            "max_concurrency": settings.LLM_MAX_CONCURRENCY,
+            "max_queue": settings.LLM_MAX_QUEUE,
+            "queue_timeout_seconds": settings.LLM_QUEUE_TIMEOUT_SECONDS
         }
     }
 
@@ -142,36 +236,116 @@ async def chat(request: ChatRequest) -> ChatResponse:
         ChatResponse containing the model's response.
 
     Raises:
-        HTTPException: If there's an error processing the request.
+        HTTPException: 429 or 503 if the request is not admitted, 500 on errors processing it.
     """
-    agent_graph = create_agent_graph(tools, assistant_system_prompt, False)
+    agent_graph = graph_registry.get(tools, assistant_system_prompt, False, request.model)
     try:
-        # Use the LangGraph agent
-        response = run_agent_graph(agent_graph, request.user_prompt)
+        async with admission.admit():
+            # Use the LangGraph agent; the sync graph runs off the event loop so queued requests keep moving
+            response = await asyncio.to_thread(run_agent_graph, agent_graph, request.user_prompt)
         return ChatResponse(response=response)
+    except AdmissionRejected as e:
+        raise admission_error(e)
     except Exception as e:
         logger.error(f"Error in chat: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _produce_events(agent_graph, user_prompt: str, events: asyncio.Queue) -> None:
+    """Run the streaming agent into a queue, ending it with ``None``."""
+    try:
+        async for event in run_agent_graph_streaming(agent_graph, user_prompt):
+            await events.put(event)
+    except Exception as e:
+        logger.error(f"Error in stream generator: {str(e)}")
+        await events.put({"error": str(e)})
+    finally:
+        events.put_nowait(None)
+
+def _heartbeat(ticket: AdmissionTicket) -> str:
+    """SSE heartbeat with the queue depth and the request's place in the queue (0 once running)."""
+    status = {"event": "heartbeat", "queue_depth": admission.queue_depth, "position": admission.position(ticket)}
+    return f"data: {json.dumps(status)}\n\n"
+
 @app.post("/chat/stream")
-async def chat_stream(request: ChatRequest):
-    """Handle streaming chat requests with tool support."""
-    agent_graph = create_agent_graph(tools, assistant_system_prompt, True)
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """Handle streaming chat requests with tool support.
+
+    A full queue is rejected with 429 and a Retry-After header before the response
+    starts. A queued request's stream starts right away with heartbeats carrying its
+    ``position`` in the queue; if it is still queued after the timeout, the stream ends
+    with an in-band ``{"error", "status": 503, "retry_after"}`` event and the done marker.
+    Once admitted, the agent runs in its own task. When the client disconnects, the
+    task is cancelled, which cancels the graph's event stream and closes the in-flight
+    Ollama request, or the request leaves the queue. Heartbeats keep idle streams alive.
+    """
+    agent_graph = graph_registry.get(tools, assistant_system_prompt, True, request.model)
     try:
-        # Use the LangGraph agent in streaming mode
-        
-        async def stream_generator():
-            try:
-                async for chunk in run_agent_graph_streaming(agent_graph, request.user_prompt):
-                    if chunk:
-                        yield f"data: {json.dumps({'content': chunk})}\n\n"
-            except Exception as e:
-                logger.error(f"Error in stream generator: {str(e)}")
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
-            finally:
-                # Send an end-of-stream marker
-                yield "data: [DONE]\n\n"
+        ticket = admission.enqueue()
+    except AdmissionRejected as e:
+        raise admission_error(e)
 
+    async def stream_generator():
+        loop = asyncio.get_running_loop()
+        waiter = producer = None
+        try:
+            if ticket.admitted:
+                await admission.wait(ticket)
+            else:
+                waiter = asyncio.create_task(admission.wait(ticket))
+                last_sent = None
+                while not waiter.done():
+                    if last_sent is None or loop.time() - last_sent >= settings.SSE_HEARTBEAT_SECONDS:
+                        last_sent = loop.time()
+                        yield _heartbeat(ticket)
+                    await asyncio.wait({waiter}, timeout=DISCONNECT_POLL_SECONDS)
+                    if not waiter.done() and await http_request.is_disconnected():
+                        logger.info("Client disconnected while queued")
+                        metrics.increment("admission.abandoned")
+                        return
+                try:
+                    waiter.result()
+                except AdmissionRejected as e:
+                    # The response has started, so the queue timeout is reported in-band
+                    error = {"error": str(e), "status": e.status_code, "retry_after": e.retry_after}
+                    yield f"data: {json.dumps(error)}\n\n"
+                    yield "data: [DONE]\n\n"
+                    return
+
+            events: asyncio.Queue = asyncio.Queue()
+            producer = asyncio.create_task(_produce_events(agent_graph, request.user_prompt, events))
+            last_sent = loop.time()
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), timeout=DISCONNECT_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    if await http_request.is_disconnected():
+                        logger.info("Client disconnected, cancelling generation")
+                        return
+                    if loop.time() - last_sent >= settings.SSE_HEARTBEAT_SECONDS:
+                        last_sent = loop.time()
+                        yield _heartbeat(ticket)
+                    continue
+                if event is None:
+                    break
+                # Tokens are forwarded as they are generated, tool progress as separate events
+                last_sent = loop.time()
+                yield f"data: {json.dumps(event, default=str)}\n\n"
+        finally:
+            # Also reached when the server cancels the response because the client went away
+            if waiter is not None:
+                waiter.cancel()
+            if producer is not None and not producer.done():
+                producer.cancel()
+                metrics.increment("chat_stream.cancelled")
+                try:
+                    await producer
+                except asyncio.CancelledError:
+                    pass
+            admission.finish(ticket)
+        # Send an end-of-stream marker
+        yield "data: [DONE]\n\n"
+
+    try:
         return StreamingResponse(
             stream_generator(),
             media_type="text/event-stream",
@@ -181,8 +355,8 @@ async def chat_stream(request: ChatRequest):
                 "X-Accel-Buffering": "no",  # Disable nginx buffering
             }
         )
-        
     except Exception as e:
+        admission.finish(ticket)
         logger.error(f"Error in chat stream: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
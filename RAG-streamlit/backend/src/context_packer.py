@@ -0,0 +1,223 @@
+from typing import List, Dict, Any, Optional, Callable
+import re
+import threading
+import logging
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r"\w+")
+
+class ContextPacker:
+    """Turns retrieved chunks into the compact context block the model is prompted with.
+
+    Near-duplicate chunks are dropped, overlapping or consecutive chunks of the same
+    source are merged back together, and the result is formatted as short labelled
+    blocks and packed, in rank order, into ``token_budget`` tokens of the model's
+    tokenizer. Without the tokenizer, tokens are estimated from the text length.
+    """
+
+    # Characters per token used when the tokenizer is unavailable
+    CHARS_PER_TOKEN = 4
+
+    def __init__(self, token_budget: int = 1000, tokenizer_name: str = "",
+                 dedup_threshold: float = 0.85, shingle_size: int = 3, min_merge_overlap: int = 100):
+        """Initialize the packer.
+
+        Args:
+            token_budget: Maximum tokens of packed context
+            tokenizer_name: Hugging Face tokenizer of the chat model; empty to estimate tokens
+            dedup_threshold: Shingle overlap above which a chunk counts as a duplicate of a better one
+            shingle_size: Words per shingle when comparing chunks
+            min_merge_overlap: Characters two chunks must share before their overlap alone
+                merges them; matches the pipeline's ``chunk_overlap``
+        """
+        self.token_budget = token_budget
+        self.tokenizer_name = tokenizer_name
+        self.dedup_threshold = dedup_threshold
+        self.shingle_size = shingle_size
+        self.min_merge_overlap = min_merge_overlap
+        self._tokenizer = None
+        self._tokenizer_loaded = not tokenizer_name
+        self._lock = threading.Lock()
+
+    def _get_tokenizer(self) -> Optional[Any]:
+        if not self._tokenizer_loaded:
+            with self._lock:
+                if not self._tokenizer_loaded:
+                    try:
+                        from transformers import AutoTokenizer
+                        self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name)
+                        logger.info(f"Loaded context tokenizer {self.tokenizer_name}")
+                    except Exception as e:
+                        logger.warning(f"Failed to load tokenizer {self.tokenizer_name}, estimating tokens: {str(e)}")
+                    self._tokenizer_loaded = True
+        return self._tokenizer
+
+    def warm(self) -> None:
+        """Load the tokenizer ahead of the first request."""
+        self.count_tokens("warm up")
+
+    @classmethod
+    def estimate_tokens(cls, text: str) -> int:
+        """Estimate the tokens of a text from its length."""
+        return -(-len(text) // cls.CHARS_PER_TOKEN)
+
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens of a text with the model's tokenizer, or estimate them."""
+        tokenizer = self._get_tokenizer()
+        if tokenizer is None:
+            return self.estimate_tokens(text)
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut a text down to at most ``max_tokens`` tokens."""
+        tokenizer = self._get_tokenizer()
+        if tokenizer is None:
+            return text[:max_tokens * self.CHARS_PER_TOKEN]
+        token_ids = tokenizer.encode(text, add_special_tokens=False)
+        return tokenizer.decode(token_ids[:max_tokens])
+
+    def _shingles(self, text: str) -> set:
+        words = WORD_PATTERN.findall(text.lower())
+        if len(words) <= self.shingle_size:
+            return {tuple(words)}
+        return {tuple(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def deduplicate(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop chunks whose content is mostly contained in a higher-ranked chunk.
+
+        Args:
+            items: Context items in rank order
+
+        Returns:
+            The items that are not near-duplicates, in rank order
+        """
+        kept, kept_shingles = [], []
+        for item in items:
+            shingles = self._shingles(item["text"])
+            # Containment rather than Jaccard, so a chunk repeated inside a longer one also counts
+            if any(len(shingles & other) >= self.dedup_threshold * len(shingles) for other in kept_shingles):
+                continue
+            kept.append(item)
+            kept_shingles.append(shingles)
+        return kept
+
+    @staticmethod
+    def _source(item: Dict[str, Any]) -> Optional[str]:
+        metadata = item.get("metadata") or {}
+        return metadata.get("source") if isinstance(metadata, dict) else None
+
+    @staticmethod
+    def _overlap(first: List[str], second: List[str]) -> int:
+        """Number of trailing lines of ``first`` that ``second`` starts with."""
+        for n in range(min(len(first), len(second)), 0, -1):
+            if first[-n:] == second[:n]:
+                return n
+        return 0
+
+    @staticmethod
+    def _merge_metadata(first: Dict[str, Any], second: Dict[str, Any]) -> Dict[str, Any]:
+        """Metadata of two merged chunks; a header level that differs lists both sections."""
+        first_headers, second_headers = first.get("headers"), second.get("headers")
+        if not isinstance(first_headers, dict) or not isinstance(second_headers, dict):
+            return first
+        headers = dict(first_headers)
+        for level, title in second_headers.items():
+            titles = str(headers[level]).split(" / ") if level in headers else []
+            if str(title) not in titles:
+                headers[level] = " / ".join(titles + [str(title)])
+        return {**first, "headers": headers}
+
+    def merge_adjacent(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Merge chunks of the same source that continue one another.
+
+        The pipeline carries the last lines of a chunk over into the next one, so two
+        chunks are adjacent when one starts with at least ``min_merge_overlap`` characters
+        of the end of the other, or when their ids are consecutive. A shorter overlap, such
+        as a shared code fence or ``---`` line, is not enough on its own. The merged chunk takes the rank of its best-ranked part and the
+        section headers of all its parts.
+
+        Args:
+            items: Context items in rank order
+
+        Returns:
+            Merged items in rank order
+        """
+        merged: List[Dict[str, Any]] = []
+        # Walk each source's chunks in id order, remembering each chunk's original rank
+        ordered = sorted(
+            enumerate(items),
+            key=lambda entry: (str(self._source(entry[1])), entry[1].get("id") is None, entry[1].get("id") or 0)
+        )
+        previous = None
+        for rank, item in ordered:
+            source = self._source(item)
+            if previous is not None and source is not None and source == self._source(previous["item"]):
+                lines = item["text"].split("\n")
+                overlap = self._overlap(previous["lines"], lines)
+                continues = overlap and len("\n".join(lines[:overlap])) >= self.min_merge_overlap
+                consecutive = (isinstance(item.get("id"), int) and isinstance(previous["item"].get("id"), int)
+                               and item["id"] == previous["item"]["id"] + 1)
+                if continues or consecutive:
+                    previous["lines"].extend(lines[overlap:])
+                    previous["rank"] = min(previous["rank"], rank)
+                    metadata = self._merge_metadata(previous["item"]["metadata"], item["metadata"])
+                    previous["item"] = {**previous["item"], "id": item.get("id"), "metadata": metadata}
+                    continue
+            previous = {"rank": rank, "item": item, "lines": item["text"].split("\n")}
+            merged.append(previous)
+        return [
+            {**entry["item"], "text": "\n".join(entry["lines"])}
+            for entry in sorted(merged, key=lambda entry: entry["rank"])
+        ]
+
+    @staticmethod
+    def format_item(index: int, item: Dict[str, Any]) -> str:
+        """Format one chunk as a numbered block labelled with its source and section."""
+        metadata = item.get("metadata") or {}
+        label = [str(metadata["source"]).rsplit("/", 1)[-1]] if metadata.get("source") else []
+        headers = metadata.get("headers") or {}
+        if isinstance(headers, dict):
+            label.extend(str(headers[level]) for level in sorted(headers, key=str))
+        heading = f"[{index}] {' > '.join(label)}" if label else f"[{index}]"
+        return f"{heading}\n{item['text'].strip()}"
+
+    def pack(self, items: List[Dict[str, Any]],
+             baseline: Optional[Callable[[List[Dict[str, Any]]], str]] = None) -> str:
+        """Pack retrieved chunks into the token budget.
+
+        Args:
+            items: Context items in rank order
+            baseline: Renders the items the way they would be prompted without packing;
+                when given, the tokens saved are estimated from the text lengths and
+                recorded in metrics
+
+        Returns:
+            Compact context text
+        """
+        blocks, used = [], 0
+        for item in self.merge_adjacent(self.deduplicate(items)):
+            block = self.format_item(len(blocks) + 1, item)
+            tokens = self.count_tokens(block)
+            remaining = self.token_budget - used
+            if tokens > remaining:
+                # The best chunk is always included, cut down to fit; later ones are skipped
+                if blocks:
+                    continue
+                block = self.truncate(block, remaining)
+                tokens = self.count_tokens(block)
+            blocks.append(block)
+            used += tokens
+        context = "\n\n".join(blocks)
+
+        metrics.increment("context_packing.requests")
+        metrics.observe("context_packing.tokens", used)
+        if baseline is not None:
+            # Estimated rather than counted, so the metric never tokenizes the unpacked documents
+            saved = max(self.estimate_tokens(baseline(items)) - self.estimate_tokens(context), 0)
+            metrics.increment("context_packing.tokens_saved", saved)
+            metrics.observe("context_packing.tokens_saved_per_request", saved)
+            logger.info(f"Packed {len(items)} chunks into {len(blocks)} blocks, {used} tokens ({saved} saved)")
+        return context
@@ -1,11 +1,14 @@
-from typing import Annotated, TypedDict, List, Dict, Any, AsyncGenerator
+from typing import Annotated, TypedDict, List, Dict, Any, AsyncGenerator, Optional
+from collections import OrderedDict
+import hashlib
+import threading
 from langchain_core.tools import BaseTool
 from langchain_core.messages import AnyMessage, AIMessage, SystemMessage, HumanMessage
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import tools_condition, ToolNode
 from langgraph.graph.message import add_messages
 import logging
-from models import OllamaModelFactory
+from models import client_pool
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -14,9 +17,11 @@ logger = logging.getLogger(__name__)
 class AgentState(TypedDict, total=False):
     """State for the agent graph."""
     messages: Annotated[List[AnyMessage], add_messages]
-    streamed_output: AsyncGenerator[str, None]
 
-def assistant(state: AgentState, tools: List[BaseTool], system_prompt: str) -> Dict[str, Any]:
+# Nodes whose model output is the answer shown to the user
+ANSWER_NODES = ("assistant", "final_answer")
+
+def assistant(state: AgentState, tools: List[BaseTool], system_prompt: str, model_name: Optional[str] = None) -> Dict[str, Any]:
     logger.info("Running assistant node")
     logger.info(f"Current messages: {[msg.type for msg in state['messages']]}")
     messages = state["messages"]
@@ -24,49 +29,67 @@ def assistant(state: AgentState, tools: List[BaseTool], system_prompt: str) -> D
         logger.info("Adding system prompt to message history")
         messages.append(SystemMessage(content=system_prompt))
     
-    chat_model = OllamaModelFactory().create_model(format=None)
-    chat_with_tools = chat_model.bind_tools(tools)
+    chat_with_tools = client_pool.get_with_tools(tools, model_name)
     response = chat_with_tools.invoke(messages)
 
     logger.info(f"Assistant response: {getattr(response, 'content', '[no content]')}")
     return {"messages": [response]}
 
-async def final_answer_async(state: AgentState) -> Dict[str, Any]:
+async def assistant_async(state: AgentState, tools: List[BaseTool], system_prompt: str, model_name: Optional[str] = None) -> Dict[str, Any]:
+    logger.info("Running assistant async node")
+    logger.info(f"Current messages: {[msg.type for msg in state['messages']]}")
+    messages = state["messages"]
+    if len(messages) == 1 and isinstance(messages[0], HumanMessage):
+        logger.info("Adding system prompt to message history")
+        messages.append(SystemMessage(content=system_prompt))
+    
+    # Under astream_events the model streams, so its tokens reach the client as they are generated
+    chat_with_tools = client_pool.get_with_tools(tools, model_name)
+    response = await chat_with_tools.ainvoke(messages)
+
+    logger.info(f"Assistant response: {getattr(response, 'content', '[no content]')}")
+    return {"messages": [response]}
+
+async def final_answer_async(state: AgentState, model_name: Optional[str] = None) -> Dict[str, Any]:
     logger.debug("Running final answer async (streaming) node")
     messages = state["messages"]
     messages.append(AIMessage(content="Finalizing answer..."))
 
-    chat_model = OllamaModelFactory().create_model(format=None)
-    stream = chat_model.astream(messages)
-
-    async def wrapped_stream():
-        logger.debug("Running streaming wrapper...")
-        async for chunk in stream:
-            logger.debug(f"Streamed chunk: {chunk}")
-            if hasattr(chunk, "content"):
-                yield chunk.content
-            elif isinstance(chunk, str):
-                yield chunk
+    chat_model = client_pool.get(model_name)
+    response = await chat_model.ainvoke(messages)
 
-    return {"streamed_output": wrapped_stream()}
+    return {"messages": [response]}
 
-def final_answer_sync(state: AgentState) -> Dict[str, Any]:
+def final_answer_sync(state: AgentState, model_name: Optional[str] = None) -> Dict[str, Any]:
     logger.debug("Running final answer sync node")
     messages = state["messages"]
     messages.append(AIMessage(content="Finalizing answer..."))
 
-    chat_model = OllamaModelFactory().create_model(format=None)
+    chat_model = client_pool.get(model_name)
     response = chat_model.invoke(messages)
 
     return {"messages": [response]}
 
-def create_agent_graph(tools: List[BaseTool], system_prompt: str, streaming: bool = False) -> StateGraph:
+def create_agent_graph(tools: List[BaseTool], system_prompt: str, streaming: bool = False,
+                       model_name: Optional[str] = None) -> StateGraph:
     builder = StateGraph(AgentState)
     
     # Define nodes
-    builder.add_node("assistant", lambda s: assistant(s, tools, system_prompt))
+    if streaming:
+        async def assistant_node(s: AgentState) -> Dict[str, Any]:
+            return await assistant_async(s, tools, system_prompt, model_name)
+
+        async def final_answer(s: AgentState) -> Dict[str, Any]:
+            return await final_answer_async(s, model_name)
+    else:
+        def assistant_node(s: AgentState) -> Dict[str, Any]:
+            return assistant(s, tools, system_prompt, model_name)
+
+        def final_answer(s: AgentState) -> Dict[str, Any]:
+            return final_answer_sync(s, model_name)
+    builder.add_node("assistant", assistant_node)
     builder.add_node("tools", ToolNode(tools))
-    builder.add_node("final_answer", final_answer_async if streaming else final_answer_sync)
+    builder.add_node("final_answer", final_answer)
 
     # Define edges
     builder.add_edge(START, "assistant")
@@ -76,6 +99,64 @@ def create_agent_graph(tools: List[BaseTool], system_prompt: str, streaming: boo
     
     return builder.compile()
 
+class GraphRegistry:
+    """Compiles each agent graph once and hands the compiled graph to every request.
+
+    Compiled graphs hold no per-run state, so one instance serves concurrent requests.
+    Graphs are keyed by tool set, system prompt, model and streaming mode; the least
+    recently used one is dropped beyond ``max_graphs`` since the model comes from the request.
+    """
+
+    def __init__(self, max_graphs: int = 16):
+        """Initialize an empty registry.
+
+        Args:
+            max_graphs: Maximum number of compiled graphs kept
+        """
+        self.max_graphs = max_graphs
+        self._graphs: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(tools: List[BaseTool], system_prompt: str, streaming: bool, model_name: Optional[str]) -> tuple:
+        prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+        model = model_name.strip() if model_name else None
+        return tuple(tool.name for tool in tools), prompt_hash, model, streaming
+
+    def get(self, tools: List[BaseTool], system_prompt: str, streaming: bool = False,
+            model_name: Optional[str] = None):
+        """Get the compiled graph for a configuration, compiling it on first use.
+
+        Args:
+            tools: Tools the assistant can call
+            system_prompt: System prompt of the assistant
+            streaming: Whether the final answer is streamed
+            model_name: Ollama model; the configured default when not given
+
+        Returns:
+            Compiled agent graph
+        """
+        key = self.key(tools, system_prompt, streaming, model_name)
+        with self._lock:
+            graph = self._graphs.get(key)
+            if graph is not None:
+                self._graphs.move_to_end(key)
+                return graph
+            graph = create_agent_graph(tools, system_prompt, streaming, key[2])
+            self._graphs[key] = graph
+            if len(self._graphs) > self.max_graphs:
+                self._graphs.popitem(last=False)
+            logger.info(f"Compiled {'streaming' if streaming else 'non-streaming'} agent graph for model {key[2] or 'default'}")
+            return graph
+
+    def clear(self) -> None:
+        """Drop all compiled graphs."""
+        with self._lock:
+            self._graphs.clear()
+
+# Shared by every request of the backend process
+graph_registry = GraphRegistry()
+
 def run_agent_graph(
         graph, 
         user_prompt: str) -> str:
@@ -90,22 +171,30 @@ def run_agent_graph(
 async def run_agent_graph_streaming(
         graph, 
         user_prompt: str
-        ) -> AsyncGenerator[str, None]:
+        ) -> AsyncGenerator[Dict[str, Any], None]:
+    """Run the graph and yield its output as it is produced.
+
+    Yields ``{"content": token}`` for every token an answer node generates, whether the
+    answer comes straight from the assistant or after tool calls, ``{"event": "tool_start"
+    | "tool_end", "tool": name}`` around tool calls, and ``{"error": message}`` on failure.
+    """
     initial_state = {
         "messages": [HumanMessage(content=user_prompt)],
     }
     try:
         logger.debug("Running the Agent Graph Streaming Function...")
-        final_state = await graph.ainvoke(initial_state) # Run full graph
-        stream = final_state.get("streamed_output", None)
-        logger.debug(f'Debug Stream: {stream}')
-
-        if hasattr(stream, "__aiter__"): 
-            async for chunk in stream:
-                logger.debug(f"Debug Chunk: {chunk}")
-                yield chunk
-        else:
-            yield "No stream available."
+        async for event in graph.astream_events(initial_state, version="v2"):
+            kind = event["event"]
+            if kind == "on_chat_model_stream":
+                if event.get("metadata", {}).get("langgraph_node") not in ANSWER_NODES:
+                    continue
+                content = getattr(event["data"].get("chunk"), "content", None)
+                if content and isinstance(content, str):
+                    yield {"content": content}
+            elif kind == "on_tool_start":
+                yield {"event": "tool_start", "tool": event["name"], "input": event["data"].get("input")}
+            elif kind == "on_tool_end":
+                yield {"event": "tool_end", "tool": event["name"]}
     except Exception as e:
         logger.exception("Error during agent graph streaming")
-        yield f"Error: {str(e)}"
+        yield {"error": str(e)}
@@ -0,0 +1,92 @@
+from typing import Any, Callable, Dict
+import threading
+
+class Metrics:
+    """Thread-safe in-process registry of counters, gauges and timing summaries.
+
+    Services record into the shared ``metrics`` instance and the ``/metrics``
+    endpoint returns ``snapshot()`` as JSON.
+    """
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._gauge_callbacks: Dict[str, Callable[[], float]] = {}
+        self._summaries: Dict[str, Dict[str, float]] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """Add ``value`` to a counter.
+
+        Args:
+            name: Counter name
+            value: Amount to add
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a gauge to its current value.
+
+        Args:
+            name: Gauge name
+            value: Current value
+        """
+        with self._lock:
+            self._gauges[name] = value
+
+    def register_gauge(self, name: str, callback: Callable[[], float]) -> None:
+        """Register a gauge whose value is computed when a snapshot is taken.
+
+        Args:
+            name: Gauge name
+            callback: Function returning the current value
+        """
+        with self._lock:
+            self._gauge_callbacks[name] = callback
+
+    def observe(self, name: str, value: float) -> None:
+        """Record one observation, e.g. a latency or a batch size.
+
+        Args:
+            name: Summary name
+            value: Observed value
+        """
+        with self._lock:
+            summary = self._summaries.setdefault(
+                name, {"count": 0, "sum": 0.0, "min": value, "max": value}
+            )
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["min"] = min(summary["min"], value)
+            summary["max"] = max(summary["max"], value)
+
+    def counter(self, name: str) -> float:
+        """Get the current value of a counter."""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get all metrics.
+
+        Returns:
+            Counters, gauges and summaries (with their mean) keyed by name
+        """
+        with self._lock:
+            gauges = dict(self._gauges)
+            callbacks = dict(self._gauge_callbacks)
+            counters = dict(self._counters)
+            summaries = {
+                name: {**summary, "mean": summary["sum"] / summary["count"]}
+                for name, summary in self._summaries.items()
+            }
+        for name, callback in callbacks.items():
+            try:
+                gauges[name] = callback()
+            except Exception:
+                gauges[name] = None
+        return {"counters": counters, "gauges": gauges, "summaries": summaries}
+
+# Shared by every service in the backend process
+metrics = Metrics()
@@ -1,5 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import Optional, List, Any, AsyncGenerator
+from typing import Optional, List, Any, AsyncGenerator, Dict, Tuple
+from collections import OrderedDict
+import threading
+import httpx
 from pydantic_settings import BaseSettings
 from langchain_ollama import ChatOllama
 from langchain.chat_models.base import BaseChatModel
@@ -17,6 +20,10 @@ class OllamaSettings(BaseSettings):
     OLLAMA_MODEL: str 
     MAX_TOKENS: int 
     TEMPERATURE: float 
+    # Connections the pooled clients keep open to OLLAMA_HOST in total, split between the sync and the
+    # async pool (at least one each, so values below 2 still open 2), and how long idle ones stay open
+    OLLAMA_MAX_CONNECTIONS: int = 8
+    OLLAMA_KEEPALIVE_SECONDS: float = 300
 
     class Config:
         env_file = ".env"
@@ -45,11 +52,13 @@ class OllamaModelFactory(ModelFactory):
         Remember to use tools when they would provide more accurate or helpful results than trying to calculate or recall information yourself.
         """
     
-    def create_model(self, model_name: Optional[str] = None, system_prompt: Optional[str] = None, format:Optional[str] = "json", verbose: Optional[bool] = True) -> BaseChatModel:
+    def create_model(self, model_name: Optional[str] = None, system_prompt: Optional[str] = None, format:Optional[str] = "json", verbose: Optional[bool] = True,
+                     transport: Optional["OllamaTransport"] = None) -> BaseChatModel:
         """Create an Ollama chat model instance.
         
         Args:
             model_name: Optional model name to override the default from settings.
+            transport: Optional shared transport; the model gets its own connections when not given.
             
         Returns:
             A configured ChatOllama instance.
@@ -64,9 +73,168 @@ class OllamaModelFactory(ModelFactory):
             num_predict=self.settings.MAX_TOKENS,
             system=system_prompt or self.system_prompt,
             format=format,  
-            verbose=verbose
+            verbose=verbose,
+            client_kwargs={"transport": transport or OllamaTransport(*self.connection_limits(), shared=False)}
         )
 
+    def connection_limits(self) -> Tuple[httpx.Limits, httpx.Limits]:
+        """Keep-alive limits of the sync and the async connection pool.
+
+        ``OLLAMA_MAX_CONNECTIONS`` is split between the two pools. Agent runs stream
+        through async requests, so the async pool gets three quarters of the
+        connections; each pool keeps at least one.
+        """
+        total = self.settings.OLLAMA_MAX_CONNECTIONS
+        sync_connections = max(total // 4, 1)
+        async_connections = max(total - sync_connections, 1)
+        return tuple(
+            httpx.Limits(
+                max_connections=connections,
+                max_keepalive_connections=connections,
+                keepalive_expiry=self.settings.OLLAMA_KEEPALIVE_SECONDS
+            )
+            for connections in (sync_connections, async_connections)
+        )
+
+class OllamaTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """Keep-alive connection pools to Ollama shared by the HTTP clients of many models.
+
+    ChatOllama passes the same ``client_kwargs`` to its sync and its async HTTP client,
+    so one transport serves both: sync requests go through one pool and async requests
+    through the other. Closing a client leaves shared pools open; their owner closes
+    them with ``shutdown``.
+    """
+
+    def __init__(self, sync_limits: httpx.Limits, async_limits: httpx.Limits, shared: bool = True):
+        """Initialize the transport.
+
+        Args:
+            sync_limits: Connection limits of the sync pool
+            async_limits: Connection limits of the async pool
+            shared: Whether several models use the transport; a transport of a single
+                model closes each pool together with the client using it
+        """
+        self._sync = httpx.HTTPTransport(limits=sync_limits)
+        self._async = httpx.AsyncHTTPTransport(limits=async_limits)
+        self.shared = shared
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self._sync.handle_request(request)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._async.handle_async_request(request)
+
+    def close(self) -> None:
+        """Close the sync pool, unless other clients share it."""
+        if not self.shared:
+            self._sync.close()
+
+    async def aclose(self) -> None:
+        """Close the async pool, unless other clients share it."""
+        if not self.shared:
+            await self._async.aclose()
+
+    async def shutdown(self) -> None:
+        """Close both connection pools."""
+        self._sync.close()
+        await self._async.aclose()
+
+class OllamaClientPool:
+    """Process-wide cache of configured ChatOllama clients and their tool bindings.
+
+    Reusing the instances keeps connections to Ollama alive across requests instead of
+    reconnecting on every node call: every pooled client sends its requests through one
+    ``OllamaTransport`` owned by the pool, which also bounds the connections of all of
+    them together. Clients are keyed by model, format and system prompt, and since the
+    model name comes from the request, only the ``max_models`` most recently used are
+    kept; an evicted client holds no connections of its own, so it is simply dropped.
+    ``bind_tools`` variants wrap the cached instance and are dropped with it.
+    """
+
+    def __init__(self, factory: Optional[OllamaModelFactory] = None, max_models: int = 8):
+        """Initialize the pool.
+
+        Args:
+            factory: Factory the clients are created with; settings are read once when not given
+            max_models: Maximum number of model configurations kept
+        """
+        self._factory = factory
+        self.max_models = max_models
+        # Each entry holds the client and its tool bindings, keyed by tool names
+        self._models: "OrderedDict[tuple, Tuple[BaseChatModel, Dict[tuple, Any]]]" = OrderedDict()
+        self._transport: Optional[OllamaTransport] = None
+        self._lock = threading.Lock()
+
+    @property
+    def factory(self) -> OllamaModelFactory:
+        if self._factory is None:
+            with self._lock:
+                if self._factory is None:
+                    self._factory = OllamaModelFactory()
+        return self._factory
+
+    def _entry(self, model_name: Optional[str], format: Optional[str],
+               system_prompt: Optional[str]) -> Tuple[BaseChatModel, Dict[tuple, Any]]:
+        factory = self.factory
+        key = ((model_name or factory.settings.OLLAMA_MODEL).strip(), format, system_prompt)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                return entry
+            if self._transport is None:
+                self._transport = OllamaTransport(*factory.connection_limits())
+            entry = (factory.create_model(key[0], system_prompt, format=format, transport=self._transport), {})
+            self._models[key] = entry
+            if len(self._models) > self.max_models:
+                evicted, _ = self._models.popitem(last=False)
+                logger.info(f"Dropped pooled client for model {evicted[0]}")
+            return entry
+
+    def get(self, model_name: Optional[str] = None, format: Optional[str] = None,
+            system_prompt: Optional[str] = None) -> BaseChatModel:
+        """Get the pooled client for a model configuration, creating it on first use.
+
+        Args:
+            model_name: Optional model name to override the default from settings.
+            format: Response format passed to Ollama, e.g. "json".
+            system_prompt: Optional system prompt to override the factory's default.
+
+        Returns:
+            A shared ChatOllama instance.
+        """
+        return self._entry(model_name, format, system_prompt)[0]
+
+    def get_with_tools(self, tools: List[BaseTool], model_name: Optional[str] = None,
+                       format: Optional[str] = None, system_prompt: Optional[str] = None) -> Any:
+        """Get the pooled client with tools bound to it.
+
+        Args:
+            tools: Tools to bind.
+            model_name: Optional model name to override the default from settings.
+            format: Response format passed to Ollama, e.g. "json".
+            system_prompt: Optional system prompt to override the factory's default.
+
+        Returns:
+            The shared ChatOllama instance with the tools bound.
+        """
+        model, bindings = self._entry(model_name, format, system_prompt)
+        tool_names = tuple(tool.name for tool in tools)
+        with self._lock:
+            bound = bindings.get(tool_names)
+            if bound is None:
+                bound = model.bind_tools(tools)
+                bindings[tool_names] = bound
+        return bound
+
+    async def aclose(self) -> None:
+        """Empty the pool and close its connections to Ollama."""
+        with self._lock:
+            self._models.clear()
+            transport, self._transport = self._transport, None
+        if transport is not None:
+            await transport.shutdown()
+
 class ToolHandler(ABC):
     """Abstract base class for tool handling."""
     
@@ -212,6 +380,9 @@ class ModelManager:
 # Create a singleton instance for backward compatibility
 _model_manager = ModelManager()
 
+# Shared by every graph node; settings are read when the first client is created
+client_pool = OllamaClientPool()
+
 def get_model(model_name: Optional[str] = None) -> BaseChatModel:
     """Get a chat model instance (backward compatibility function).
     
@@ -1,12 +1,27 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+import asyncio
 import os
+import json
+import queue
+import re
+import hashlib
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import unicodedata
+from collections import OrderedDict
+import numpy as np
 from dotenv import load_dotenv
 from pymilvus import connections, Collection, utility
-from sentence_transformers import SentenceTransformer
-from langchain_core.tools import tool
+from sentence_transformers import SentenceTransformer, CrossEncoder
+from langchain_core.tools import tool, StructuredTool
 from langchain.schema import Document
 import logging
 
+from metrics import metrics
+from vector_store import VectorStore, MilvusVectorStore, EmbeddedVectorStore
+from context_packer import ContextPacker
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,18 +35,236 @@ COLLECTION_NAME = os.getenv("COLLECTION_NAME", "document_chunks")
 MILVUS_HOST = os.getenv("MILVUS_HOST", "localhost")
 MILVUS_PORT = os.getenv("MILVUS_PORT", "19530")
 TOP_K = int(os.getenv("TOP_K", "3"))
+# Per-call timeout of the retrieval tool (the sync path bounds its wait for the query embedding)
+# and the threads the async path's blocking work runs on
+RETRIEVAL_TIMEOUT_SECONDS = float(os.getenv("RETRIEVAL_TIMEOUT_SECONDS", "10"))
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "8"))
+# "milvus" searches the Milvus server; "embedded" searches the pipeline's memory-mapped store in-process
+VECTOR_STORE = os.getenv("VECTOR_STORE", "milvus")
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "/data/vector_store")
+VECTOR_STORE_EF = int(os.getenv("VECTOR_STORE_EF", "64"))
+# Number of query embeddings kept in memory and how long each stays valid
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "3600"))
+# Queries arriving within the window are encoded together, up to the batch size
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+# How often a cached collection handle is checked for reindexing or alias changes
+COLLECTION_REFRESH_SECONDS = float(os.getenv("COLLECTION_REFRESH_SECONDS", "30"))
+# Optional JSON override of the index search parameters, e.g. '{"ef": 128}'
+MILVUS_SEARCH_PARAMS = os.getenv("MILVUS_SEARCH_PARAMS")
+
+# "hybrid" fuses dense and keyword search when the collection has a sparse field; "dense" disables it
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+SPARSE_FIELD = os.getenv("SPARSE_FIELD", "sparse_embedding")
+# Weights and constant of the reciprocal-rank fusion, and how many candidates each search returns
+HYBRID_DENSE_WEIGHT = float(os.getenv("HYBRID_DENSE_WEIGHT", "1.0"))
+HYBRID_SPARSE_WEIGHT = float(os.getenv("HYBRID_SPARSE_WEIGHT", "1.0"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+
+# Optional cross-encoder reranking: set RERANK_MODEL (e.g. cross-encoder/ms-marco-MiniLM-L-6-v2) to enable
+RERANK_MODEL = os.getenv("RERANK_MODEL", "")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+# Scoring stops when this budget runs out; candidates left unscored keep their vector order
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "300"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "4096"))
+
+# Retrieved chunks are deduplicated, merged and packed into this many tokens of the chat model's tokenizer
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+# Hugging Face tokenizer matching OLLAMA_MODEL; empty (the default) estimates tokens from the text length.
+# The image runs offline, so a tokenizer set here must be pre-downloaded in the Dockerfile
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "")
+# Share of a chunk's word shingles found in a better-ranked chunk above which it is dropped
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.85"))
+# Characters a chunk must share with the end of another before they are merged; keep at the pipeline's chunk_overlap
+CONTEXT_MERGE_MIN_OVERLAP = int(os.getenv("CONTEXT_MERGE_MIN_OVERLAP", "100"))
+
+# Search parameters per index type when MILVUS_SEARCH_PARAMS is not set
+DEFAULT_SEARCH_PARAMS = {
+    "HNSW": {"ef": 64},
+    "IVF_FLAT": {"nprobe": 10},
+    "IVF_SQ8": {"nprobe": 10},
+    "IVF_PQ": {"nprobe": 10},
+    "DISKANN": {"search_list": 100},
+    "SPARSE_INVERTED_INDEX": {"drop_ratio_search": 0.0},
+    "SPARSE_WAND": {"drop_ratio_search": 0.0},
+}
+
+class SparseQueryEncoder:
+    """Builds keyword query vectors matching the pipeline's SparseEncoder.
+    
+    The tokenizer, stopwords and token hash must stay identical to ``SparseEncoder``
+    in pipelines/pipeline.py, which builds the document vectors at ingest time; both
+    test suites pin the dimensions of the same sample text. Neither side applies IDF.
+    """
+    
+    TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._\-][a-z0-9]+)*")
+    STOPWORDS = frozenset((
+        "a an and are as at be but by for from has have how i if in into is it its of on or "
+        "that the their then there these this to was we what when where which who will with "
+        "you your"
+    ).split())
+    
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        """Lowercase word tokens; dotted, dashed and underscored codes stay whole."""
+        return [token for token in cls.TOKEN_PATTERN.findall(text.lower()) if token not in cls.STOPWORDS]
+    
+    @staticmethod
+    def token_id(token: str) -> int:
+        """Sparse dimension of a token."""
+        return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(),
+                              "little") & 0x7FFFFFFF
+    
+    @classmethod
+    def encode(cls, text: str) -> Dict[int, float]:
+        """Sparse query vector; each occurrence of a query term adds one to its weight.
+        
+        Args:
+            text: Query text
+            
+        Returns:
+            Mapping of sparse dimension to weight
+        """
+        vector: Dict[int, float] = {}
+        for token in cls.tokenize(text):
+            dim = cls.token_id(token)
+            vector[dim] = vector.get(dim, 0.0) + 1.0
+        return vector
+
+def reciprocal_rank_fusion(ranked_lists: List[List[Dict[str, Any]]], weights: List[float],
+                           top_k: int, k: int = RRF_K) -> List[Dict[str, Any]]:
+    """Fuse ranked result lists with weighted reciprocal-rank fusion.
+    
+    Each result scores ``weight / (k + rank)`` in every list it appears in, with ranks
+    starting at 1, and results are ordered by their summed score.
+    
+    Args:
+        ranked_lists: Result lists, best first; results are identified by their "id"
+        weights: Weight of each list
+        top_k: Number of results to return
+        k: Rank constant damping the influence of the top ranks
+        
+    Returns:
+        Fused results with their fused "score"
+    """
+    scores: Dict[Any, float] = {}
+    results: Dict[Any, Dict[str, Any]] = {}
+    for ranked, weight in zip(ranked_lists, weights):
+        for rank, result in enumerate(ranked, start=1):
+            scores[result["id"]] = scores.get(result["id"], 0.0) + weight / (k + rank)
+            results.setdefault(result["id"], result)
+    fused = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [{**results[result_id], "score": scores[result_id]} for result_id in fused]
+
+class QueryEmbeddingCache:
+    """LRU cache of query embeddings with a time-to-live.
+    
+    Entries are keyed by model name and normalized query text and stored as float32
+    numpy arrays; hit rate and memory use are exported through ``metrics``.
+    """
+    
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE,
+                 ttl_seconds: float = EMBEDDING_CACHE_TTL_SECONDS):
+        """Initialize the cache.
+        
+        Args:
+            max_entries: Maximum number of embeddings kept; 0 disables the cache
+            ttl_seconds: Seconds an embedding stays valid
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        metrics.register_gauge("embedding_cache.entries", lambda: len(self._entries))
+        metrics.register_gauge("embedding_cache.bytes", lambda: self.nbytes)
+        metrics.register_gauge("embedding_cache.hit_rate", self.hit_rate)
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize query text so trivially different spellings share an entry."""
+        return " ".join(unicodedata.normalize("NFKC", text).split())
+    
+    def hit_rate(self) -> float:
+        """Fraction of lookups answered from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+    
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        """Get a cached embedding.
+        
+        Args:
+            model_name: Model that produced the embedding
+            text: Query text
+            
+        Returns:
+            The embedding, or None if it is missing or expired
+        """
+        key = (model_name, self.normalize(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] > self.ttl_seconds:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                metrics.increment("embedding_cache.misses")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        metrics.increment("embedding_cache.hits")
+        return entry[0]
+    
+    def put(self, model_name: str, text: str, embedding: np.ndarray) -> None:
+        """Store an embedding, evicting the least recently used entries if full.
+        
+        Args:
+            model_name: Model that produced the embedding
+            text: Query text
+            embedding: Embedding vector
+        """
+        if self.max_entries <= 0:
+            return
+        key = (model_name, self.normalize(text))
+        embedding = np.asarray(embedding, dtype=np.float32)
+        embedding.setflags(write=False)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (embedding, time.monotonic())
+            self.nbytes += embedding.nbytes
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+    
+    def _remove(self, key: tuple) -> None:
+        embedding, _ = self._entries.pop(key)
+        self.nbytes -= embedding.nbytes
+    
+    def clear(self) -> None:
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
 
 class EmbeddingService:
     """Service for handling text embeddings."""
     
-    def __init__(self, model_name: str = EMBEDDING_MODEL):
+    def __init__(self, model_name: str = EMBEDDING_MODEL,
+                 cache: Optional[QueryEmbeddingCache] = None):
         """Initialize the embedding service.
         
         Args:
             model_name: Name of the embedding model to use
+            cache: Query embedding cache; one is created when not given
         """
         self.model_name = model_name
         self.model = None
+        self.cache = cache if cache is not None else QueryEmbeddingCache()
         self._initialize_embeddings()
     
     def _initialize_embeddings(self) -> None:
@@ -52,17 +285,476 @@ class EmbeddingService:
         Returns:
             List of embeddings
         """
+        # Convert numpy arrays to lists for compatibility
+        return [embedding.tolist() for embedding in self.embed(texts)]
+    
+    def embed(self, texts: List[str]) -> List[np.ndarray]:
+        """Get float32 embeddings for a list of texts, encoding only cache misses.
+        
+        Args:
+            texts: List of texts to embed
+            
+        Returns:
+            List of embeddings in the order of ``texts``
+        """
+        if not self.model:
+            self._initialize_embeddings()
+        
+        embeddings: List[Optional[np.ndarray]] = [self.cache.get(self.model_name, text) for text in texts]
+        # Texts that normalize to the same query are encoded once
+        missing: Dict[str, List[int]] = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(self.cache.normalize(texts[i]), []).append(i)
+        if missing:
+            encoded = self.encode([texts[positions[0]] for positions in missing.values()])
+            for positions, embedding in zip(missing.values(), encoded):
+                for i in positions:
+                    embeddings[i] = embedding
+        return embeddings
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts in one model call and add the results to the cache.
+        
+        Args:
+            texts: List of texts to embed
+            
+        Returns:
+            Float32 array with one row per text
+        """
         if not self.model:
             self._initialize_embeddings()
         
         try:
             # Use sentence_transformers to generate embeddings
-            embeddings = self.model.encode(texts)
-            # Convert numpy arrays to lists for compatibility
-            return embeddings.tolist()
+            encoded = np.asarray(self.model.encode(texts), dtype=np.float32)
         except Exception as e:
             logger.error(f"Failed to get embeddings: {str(e)}")
             raise
+        for text, embedding in zip(texts, encoded):
+            self.cache.put(self.model_name, text, embedding)
+        return encoded
+
+class EmbeddingExecutor:
+    """Coalesces concurrent single-query embedding requests into batched encodes.
+    
+    Callers get a future immediately; a worker thread waits up to ``window_ms`` after
+    the first pending query (or until ``max_batch_size`` queries are pending), encodes
+    the whole batch in one model call and resolves every caller's future.
+    """
+    
+    def __init__(self, embedding_service: EmbeddingService,
+                 window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+                 max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE):
+        """Initialize the executor.
+        
+        Args:
+            embedding_service: Service whose model and cache are used
+            window_ms: How long to wait for more queries after the first one arrives
+            max_batch_size: Maximum number of queries encoded in one call
+        """
+        self.embedding_service = embedding_service
+        self.window_ms = window_ms
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending: "queue.Queue[tuple]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._closed = False
+        self._lock = threading.Lock()
+        metrics.register_gauge("embedding_batch.pending", self._pending.qsize)
+    
+    def submit(self, text: str) -> Future:
+        """Request the embedding of one query.
+        
+        Args:
+            text: Query text
+            
+        Returns:
+            Future resolving to the float32 embedding
+            
+        Raises:
+            RuntimeError: If the executor has been closed
+        """
+        future: Future = Future()
+        cached = self.embedding_service.cache.get(self.embedding_service.model_name, text)
+        if cached is not None:
+            future.set_result(cached)
+            return future
+        self._ensure_worker()
+        self._pending.put((text, future, time.monotonic()))
+        return future
+    
+    def embed(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        """Embed one query, sharing the model call with concurrent callers.
+        
+        Args:
+            text: Query text
+            timeout: Seconds to wait for the result
+            
+        Returns:
+            Float32 embedding
+            
+        Raises:
+            TimeoutError: If the embedding is not ready within ``timeout``; the query is
+                dropped from its batch if it has not been encoded yet
+        """
+        future = self.submit(text)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+    
+    def close(self, timeout: float = 5.0) -> None:
+        """Stop the worker thread and fail the queries still waiting for it.
+        
+        Args:
+            timeout: Seconds to wait for the batch being encoded to finish
+        """
+        with self._lock:
+            self._closed = True
+            worker, self._worker = self._worker, None
+        self._fail_pending()
+        if worker is not None and worker.is_alive():
+            self._pending.put(None)
+            worker.join(timeout)
+        self._fail_pending()
+    
+    def _fail_pending(self) -> None:
+        while True:
+            try:
+                item = self._pending.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                self._fail([item[1]], RuntimeError("Embedding executor is closed"))
+    
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Embedding executor is closed")
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-executor", daemon=True)
+                self._worker.start()
+    
+    def _collect(self) -> List[tuple]:
+        """Block for the first pending query, then gather more until the window closes.
+        
+        Returns an empty batch once ``close`` has been called.
+        """
+        first = self._pending.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.window_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = (self._pending.get(timeout=remaining) if remaining > 0
+                        else self._pending.get_nowait())
+            except queue.Empty:
+                break
+            if item is None:
+                # Encode what was collected, then stop on the next call
+                self._pending.put(None)
+                break
+            batch.append(item)
+        return batch
+    
+    @staticmethod
+    def _fail(futures: List[Future], error: BaseException) -> None:
+        for future in futures:
+            # Futures already claimed by the batch are running; unclaimed ones may be cancelled
+            if future.done():
+                continue
+            if future.running() or future.set_running_or_notify_cancel():
+                future.set_exception(error)
+    
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+            try:
+                self._encode_batch(batch)
+            except Exception as e:
+                # Never let one bad batch kill the worker and strand later queries
+                logger.error(f"Embedding batch failed: {str(e)}")
+                self._fail([future for _, future, _ in batch if not future.done()], e)
+    
+    def _encode_batch(self, batch: List[tuple]) -> None:
+        started = time.monotonic()
+        for _, _, enqueued in batch:
+            metrics.observe("embedding_batch.queue_delay_ms", (started - enqueued) * 1000)
+        metrics.observe("embedding_batch.size", len(batch))
+        
+        # Queries that normalize to the same text share one row of the batch; claiming
+        # a future fails if its caller cancelled it (e.g. a timed out async retrieval),
+        # and claimed futures can no longer be cancelled while they are encoded
+        groups: Dict[str, List[Future]] = {}
+        texts: Dict[str, str] = {}
+        for text, future, _ in batch:
+            if not future.set_running_or_notify_cancel():
+                metrics.increment("embedding_batch.cancelled")
+                continue
+            key = self.embedding_service.cache.normalize(text)
+            groups.setdefault(key, []).append(future)
+            texts.setdefault(key, text)
+        if not groups:
+            return
+        try:
+            encoded = self.embedding_service.encode(list(texts.values()))
+        except Exception as e:
+            for futures in groups.values():
+                for future in futures:
+                    future.set_exception(e)
+            return
+        metrics.observe("embedding_batch.encode_ms", (time.monotonic() - started) * 1000)
+        for futures, embedding in zip(groups.values(), encoded):
+            for future in futures:
+                future.set_result(embedding)
+
+class Reranker:
+    """Rescores retrieved chunks against the query with a cross-encoder.
+    
+    Candidates are scored in vector-search order, in batches sized from the measured
+    per-pair cost so that a batch never starts unless it can finish within ``budget_ms``;
+    until the cost is known, the first batch is a small probe. Candidates left unscored
+    when the budget runs out keep their vector-search order after the scored ones. Scores
+    are cached per normalized query and chunk ID, so repeated questions skip the model.
+    """
+    
+    # Pairs scored by the first batch, before the per-pair cost has been measured
+    PROBE_SIZE = 2
+    
+    def __init__(self, model_name: str = RERANK_MODEL, batch_size: int = RERANK_BATCH_SIZE,
+                 budget_ms: float = RERANK_BUDGET_MS, cache_size: int = RERANK_CACHE_SIZE):
+        """Initialize the reranker.
+        
+        Args:
+            model_name: Cross-encoder model name
+            batch_size: Maximum number of query/chunk pairs scored per model call
+            budget_ms: Latency budget of one rerank call
+            cache_size: Number of query/chunk scores kept
+        """
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.budget_ms = budget_ms
+        self.cache_size = cache_size
+        self.model = None
+        # Moving average of the milliseconds one pair takes to score
+        self.pair_ms: Optional[float] = None
+        self._scores: "OrderedDict[tuple, float]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _initialize_model(self) -> None:
+        """Load the cross-encoder."""
+        try:
+            self.model = CrossEncoder(self.model_name, device="cpu")
+            logger.info(f"Initialized rerank model: {self.model_name}")
+        except Exception as e:
+            logger.error(f"Failed to initialize rerank model: {str(e)}")
+            raise
+    
+    def _cached_score(self, key: tuple) -> Optional[float]:
+        with self._lock:
+            score = self._scores.get(key)
+            if score is not None:
+                self._scores.move_to_end(key)
+            return score
+    
+    def _cache_scores(self, scores: Dict[tuple, float]) -> None:
+        with self._lock:
+            self._scores.update(scores)
+            while len(self._scores) > self.cache_size:
+                self._scores.popitem(last=False)
+    
+    def _next_batch_size(self, remaining_ms: float) -> int:
+        """Number of pairs that can be scored in the remaining budget, 0 if none."""
+        if self.pair_ms is None:
+            return min(self.batch_size, self.PROBE_SIZE)
+        return min(self.batch_size, int(remaining_ms / max(self.pair_ms, 1e-3)))
+    
+    def _record_cost(self, elapsed_ms: float, pairs: int) -> None:
+        pair_ms = elapsed_ms / pairs
+        self.pair_ms = pair_ms if self.pair_ms is None else 0.8 * self.pair_ms + 0.2 * pair_ms
+    
+    def rerank(self, query: str, items: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """Order context items by cross-encoder score and keep the best ones.
+        
+        Args:
+            query: Query text
+            items: Context items in vector-search order, with "id" and "text"
+            top_k: Number of items to keep
+            
+        Returns:
+            The ``top_k`` best items; scored items come first, ordered by score, followed by
+            any the budget left unscored in vector-search order
+        """
+        if len(items) <= 1:
+            return items[:top_k]
+        if not self.model:
+            self._initialize_model()
+        
+        started = time.monotonic()
+        normalized = QueryEmbeddingCache.normalize(query)
+        keys = [(normalized, item["id"]) for item in items]
+        scores = {key: self._cached_score(key) for key in keys}
+        missing = [i for i, key in enumerate(keys) if scores[key] is None]
+        metrics.increment("rerank.cache_hits", len(items) - len(missing))
+        
+        new_scores: Dict[tuple, float] = {}
+        try:
+            while missing:
+                size = self._next_batch_size(self.budget_ms - (time.monotonic() - started) * 1000)
+                if size < 1:
+                    break
+                batch, missing = missing[:size], missing[size:]
+                batch_started = time.monotonic()
+                predictions = self.model.predict([(query, items[i]["text"]) for i in batch],
+                                                 batch_size=size)
+                self._record_cost((time.monotonic() - batch_started) * 1000, len(batch))
+                for i, score in zip(batch, predictions):
+                    new_scores[keys[i]] = float(score)
+        except Exception as e:
+            logger.error(f"Failed to rerank: {str(e)}")
+            metrics.increment("rerank.errors")
+        finally:
+            self._cache_scores(new_scores)
+        scores.update(new_scores)
+        
+        elapsed_ms = (time.monotonic() - started) * 1000
+        metrics.observe("rerank.ms", elapsed_ms)
+        scored = [i for i, key in enumerate(keys) if scores[key] is not None]
+        if len(scored) < len(items):
+            logger.warning(f"Reranking exceeded its {self.budget_ms:.0f}ms budget ({elapsed_ms:.0f}ms), "
+                           f"{len(items) - len(scored)} of {len(items)} candidates keep vector order")
+            metrics.increment("rerank.budget_exceeded")
+        
+        scored.sort(key=lambda i: scores[keys[i]], reverse=True)
+        unscored = [i for i, key in enumerate(keys) if scores[key] is None]
+        reranked = [{**items[i], "rerank_score": scores[keys[i]]} for i in scored]
+        return (reranked + [items[i] for i in unscored])[:top_k]
+
+class CollectionManager:
+    """Keeps one Milvus collection loaded and its handle cached between searches.
+    
+    The collection is loaded once; afterwards its identity (the collection an alias
+    points to) and index definitions are re-checked at most every ``refresh_interval``
+    seconds, and the collection is only reloaded when one of them changed.
+    """
+    
+    def __init__(self, collection_name: str, search_field: str = "embedding",
+                 refresh_interval: float = COLLECTION_REFRESH_SECONDS):
+        """Initialize the collection manager.
+        
+        Args:
+            collection_name: Name or alias of the collection
+            search_field: Vector field searched by default
+            refresh_interval: Seconds between checks for reindexing or alias changes
+        """
+        self.collection_name = collection_name
+        self.search_field = search_field
+        self.refresh_interval = refresh_interval
+        self.collection: Optional[Collection] = None
+        self.fingerprint: Optional[tuple] = None
+        self.loads = 0
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+    
+    def _fingerprint(self, collection: Collection) -> tuple:
+        """Identify the underlying collection and its indexes."""
+        description = collection.describe()
+        indexes = tuple(sorted(
+            (index.field_name, index.index_name, json.dumps(index.params, sort_keys=True, default=str))
+            for index in collection.indexes
+        ))
+        return description.get("collection_id"), indexes
+    
+    def _load(self) -> Collection:
+        if not utility.has_collection(self.collection_name):
+            raise ValueError(f"Collection '{self.collection_name}' does not exist")
+        collection = Collection(self.collection_name)
+        fingerprint = self._fingerprint(collection)
+        collection.load()
+        self.collection = collection
+        self.fingerprint = fingerprint
+        self.loads += 1
+        logger.info(f"Loaded collection {self.collection_name} (collection_id={fingerprint[0]})")
+        return collection
+    
+    def get(self) -> Collection:
+        """Return the loaded collection, reloading it only if it was reindexed or re-aliased.
+        
+        Returns:
+            Loaded Milvus collection
+        """
+        now = time.monotonic()
+        if self.collection is not None and now - self._last_check < self.refresh_interval:
+            return self.collection
+        
+        with self._lock:
+            if self.collection is None:
+                self._last_check = now
+                return self._load()
+            if now - self._last_check >= self.refresh_interval:
+                self._last_check = now
+                try:
+                    changed = self._fingerprint(Collection(self.collection_name)) != self.fingerprint
+                except Exception as e:
+                    logger.warning(f"Failed to check collection {self.collection_name}: {str(e)}")
+                    changed = False
+                if changed:
+                    logger.info(f"Collection {self.collection_name} was reindexed or re-aliased, reloading")
+                    return self._load()
+            return self.collection
+    
+    def invalidate(self) -> None:
+        """Drop the cached handle so the next ``get`` loads the collection again.
+        
+        Used when a search shows the collection was released or reindexed since the last
+        fingerprint check.
+        """
+        with self._lock:
+            self.collection = None
+            self.fingerprint = None
+    
+    def has_field(self, field_name: str) -> bool:
+        """Whether the collection schema has a field.
+        
+        Args:
+            field_name: Name of the field
+            
+        Returns:
+            True if the field exists
+        """
+        return any(field.name == field_name for field in self.get().schema.fields)
+    
+    def warm(self) -> None:
+        """Load the collection and run one search so the first real query is not slow."""
+        collection = self.get()
+        dim = next(
+            (field.params.get("dim") for field in collection.schema.fields if field.name == self.search_field),
+            None
+        )
+        if dim:
+            collection.search(
+                data=[[1.0 / dim ** 0.5] * dim],
+                anns_field=self.search_field,
+                param=MilvusService.get_search_params(collection, self.search_field, 1),
+                limit=1
+            )
+        logger.info(f"Warmed collection {self.collection_name}")
+    
+    def release(self) -> None:
+        """Release the collection from memory."""
+        with self._lock:
+            if self.collection is not None:
+                self.collection.release()
+                self.collection = None
+                self.fingerprint = None
+
+# Search errors raised when the collection was released, dropped or reindexed behind our back
+STALE_COLLECTION_ERROR = re.compile(r"not loaded|not found|index", re.IGNORECASE)
 
 class MilvusService:
     """Service for interacting with Milvus vector database."""
@@ -76,6 +768,8 @@ class MilvusService:
         """
         self.host = host
         self.port = port
+        self._collections: Dict[str, CollectionManager] = {}
+        self._collections_lock = threading.Lock()
         self._connect()
     
     def _connect(self) -> None:
@@ -90,6 +784,9 @@ class MilvusService:
     def disconnect(self) -> None:
         """Disconnect from Milvus."""
         try:
+            for manager in self._collections.values():
+                manager.release()
+            self._collections.clear()
             connections.disconnect()
             logger.info("Disconnected from Milvus")
         except Exception as e:
@@ -112,6 +809,64 @@ class MilvusService:
         
         return Collection(collection_name)
     
+    def collection_manager(self, collection_name: str) -> CollectionManager:
+        """Get the lifecycle manager that keeps a collection loaded.
+        
+        Args:
+            collection_name: Name or alias of the collection
+            
+        Returns:
+            Collection manager shared by all searches on that collection
+        """
+        with self._collections_lock:
+            if collection_name not in self._collections:
+                self._collections[collection_name] = CollectionManager(collection_name)
+            return self._collections[collection_name]
+    
+    def warm(self, collection_name: str) -> None:
+        """Load and warm a collection ahead of the first search.
+        
+        Args:
+            collection_name: Name or alias of the collection
+        """
+        self.collection_manager(collection_name).warm()
+    
+    @staticmethod
+    def get_search_params(collection: Collection, search_field: str = "embedding",
+                          top_k: int = TOP_K) -> Dict[str, Any]:
+        """Build search parameters matching the index the pipeline built.
+
+        The metric is read from the index on ``search_field``, so queries always use the
+        metric configured in the pipeline's config.yaml.
+        
+        Args:
+            collection: Milvus collection to search
+            search_field: Vector field the index is built on
+            top_k: Number of results that will be requested
+            
+        Returns:
+            Search parameters for ``Collection.search``
+        """
+        index_type, metric_type = None, "COSINE"
+        for index in collection.indexes:
+            if index.field_name == search_field:
+                index_type = index.params.get("index_type")
+                metric_type = index.params.get("metric_type", metric_type)
+                break
+        
+        # The override is meant for the dense index, keyword (sparse) indexes keep their defaults
+        if MILVUS_SEARCH_PARAMS and not str(index_type).startswith("SPARSE"):
+            params = json.loads(MILVUS_SEARCH_PARAMS)
+        else:
+            params = dict(DEFAULT_SEARCH_PARAMS.get(index_type, {}))
+        # Graph indexes cannot return more results than their candidate list holds
+        if "ef" in params:
+            params["ef"] = max(params["ef"], top_k)
+        if "search_list" in params:
+            params["search_list"] = max(params["search_list"], top_k)
+        
+        return {"metric_type": metric_type, "params": params}
+    
     def search(self, collection_name: str, query_embedding: List[float], 
            top_k: int = TOP_K, search_field: str = "embedding", 
            output_fields: List[str] = None) -> List[Dict[str, Any]]:
@@ -127,26 +882,44 @@ class MilvusService:
         Returns:
             List of search results
         """
-        try:
-            collection = self.get_collection(collection_name)
-            collection.load()
-            
-            search_params = {
-                "metric_type": "COSINE",
-                "params": {"nprobe": 10}
-            }
+        return self.search_many(collection_name, [query_embedding], top_k, search_field, output_fields)[0]
+    
+    def search_many(self, collection_name: str, query_embeddings: List[Any],
+                    top_k: int = TOP_K, search_field: str = "embedding",
+                    output_fields: List[str] = None) -> List[List[Dict[str, Any]]]:
+        """Search for several query vectors in one Milvus request.
+        
+        Args:
+            collection_name: Name of the collection to search
+            query_embeddings: Query embedding vectors, or {dimension: weight} sparse vectors
+                when ``search_field`` is a sparse field
+            top_k: Number of results to return per query
+            search_field: Field to search on
+            output_fields: Fields to return in results
             
-            results = collection.search(
-                data=[query_embedding],
-                anns_field=search_field,
-                param=search_params,
-                limit=top_k,
-                output_fields=output_fields or ["content", "metadata"]
-            )
+        Returns:
+            One list of search results per query, in the order of ``query_embeddings``
+        """
+        if not len(query_embeddings):
+            return []
+        try:
+            manager = self.collection_manager(collection_name)
+            data = [embedding if isinstance(embedding, dict) else list(map(float, embedding))
+                    for embedding in query_embeddings]
+            try:
+                results = self._search_collection(manager.get(), data, top_k, search_field, output_fields)
+            except Exception as e:
+                if not STALE_COLLECTION_ERROR.search(str(e)):
+                    raise
+                # The pipeline released or reindexed the collection since the last check
+                logger.warning(f"Search on {collection_name} failed ({str(e)}), reloading the collection")
+                manager.invalidate()
+                results = self._search_collection(manager.get(), data, top_k, search_field, output_fields)
             
             # Format results
             formatted_results = []
             for hits in results:
+                query_results = []
                 for hit in hits:
                     result = {
                         "id": hit.id,
@@ -154,27 +927,83 @@ class MilvusService:
                         "content": getattr(hit, "content", ""),  # Fix: use getattr instead of .get()
                         "metadata": getattr(hit, "metadata", {})  # Fix: use getattr instead of .get()
                     }
-                    formatted_results.append(result)
+                    query_results.append(result)
+                formatted_results.append(query_results)
             
-            collection.release()
             return formatted_results
         except Exception as e:
             logger.error(f"Failed to search Milvus: {str(e)}")
             raise
+    
+    def _search_collection(self, collection: Collection, data: List[Any], top_k: int,
+                           search_field: str, output_fields: Optional[List[str]]):
+        return collection.search(
+            data=data,
+            anns_field=search_field,
+            param=self.get_search_params(collection, search_field, top_k),
+            limit=top_k,
+            output_fields=output_fields or ["content", "metadata"]
+        )
+
 
+def create_vector_store(collection_name: str = COLLECTION_NAME, store_type: str = VECTOR_STORE) -> VectorStore:
+    """Create the vector store selected by ``VECTOR_STORE``.
+    
+    Args:
+        collection_name: Milvus collection searched by the Milvus store
+        store_type: "milvus" or "embedded"
+        
+    Returns:
+        Vector store
+    """
+    if store_type == "embedded":
+        return EmbeddedVectorStore(VECTOR_STORE_PATH, ef=VECTOR_STORE_EF,
+                                   refresh_interval=COLLECTION_REFRESH_SECONDS)
+    if store_type != "milvus":
+        raise ValueError(f"Unknown VECTOR_STORE '{store_type}', expected milvus or embedded")
+    return MilvusVectorStore(MilvusService(), collection_name)
 
 class ContextRetriever:
-    """Service for retrieving context from Milvus."""
+    """Service for retrieving context from the vector store."""
     
-    def __init__(self, collection_name: str = COLLECTION_NAME):
+    def __init__(self, collection_name: str = COLLECTION_NAME, retrieval_mode: str = RETRIEVAL_MODE,
+                 rerank_model: str = RERANK_MODEL, vector_store: Optional[VectorStore] = None):
         """Initialize the context retriever.
         
         Args:
             collection_name: Name of the Milvus collection
+            retrieval_mode: "hybrid" to fuse dense and keyword search, "dense" for dense only
+            rerank_model: Cross-encoder used to rerank candidates; empty to disable reranking
+            vector_store: Store to search; created from ``VECTOR_STORE`` when not given
         """
         self.collection_name = collection_name
+        self.retrieval_mode = retrieval_mode
+        self.reranker = Reranker(rerank_model) if rerank_model else None
         self.embedding_service = EmbeddingService()
-        self.milvus_service = MilvusService()
+        self.embedding_executor = EmbeddingExecutor(self.embedding_service)
+        self.vector_store = vector_store or create_vector_store(collection_name)
+        self.context_packer = ContextPacker(CONTEXT_TOKEN_BUDGET, CONTEXT_TOKENIZER, CONTEXT_DEDUP_THRESHOLD,
+                                            min_merge_overlap=CONTEXT_MERGE_MIN_OVERLAP)
+        # Runs the dense and keyword searches of a hybrid query concurrently
+        self._search_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid-search")
+        # Runs the blocking search and rerank steps of async retrievals off the event loop;
+        # separate from the hybrid pool so a saturated pool never waits on itself
+        self._retrieval_pool = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+    
+    def warm(self) -> None:
+        """Run a dummy encode and search so the first query does not pay for loading."""
+        self.embedding_service.model.encode(["warm up"])
+        self.vector_store.warm()
+        self.context_packer.warm()
+        if self.reranker:
+            self.reranker.rerank("warm up", [{"id": 0, "text": "warm up"}, {"id": 1, "text": "up"}], 1)
+    
+    def close(self) -> None:
+        """Release the vector store and worker threads."""
+        self.embedding_executor.close()
+        self._retrieval_pool.shutdown(wait=False, cancel_futures=True)
+        self._search_pool.shutdown(wait=False, cancel_futures=True)
+        self.vector_store.close()
     
     def retrieve(self, query: str, top_k: int = TOP_K) -> List[Dict[str, Any]]:
         """Retrieve context for a query.
@@ -188,60 +1017,241 @@ class ContextRetriever:
         """
         try:
             # Get query embedding
-            query_embedding = self.embedding_service.get_embeddings([query])[0]
+            query_embedding = self.embedding_executor.embed(query, timeout=RETRIEVAL_TIMEOUT_SECONDS).tolist()
             
-            # Search Milvus
-            results = self.milvus_service.search(
-                self.collection_name, 
-                query_embedding, 
-                top_k=top_k
+            return self._search_and_rerank(query, query_embedding, top_k)
+        except Exception as e:
+            logger.error(f"Failed to retrieve context: {str(e)}")
+            raise
+    
+    async def aretrieve(self, query: str, top_k: int = TOP_K) -> List[Dict[str, Any]]:
+        """Retrieve context for a query without blocking the event loop.
+        
+        Encoding runs on the embedding executor's thread, where it is batched with
+        concurrent queries; search and reranking run on the retrieval thread pool.
+        
+        Args:
+            query: Query text
+            top_k: Number of results to return
+            
+        Returns:
+            List of context items
+        """
+        try:
+            query_embedding = await asyncio.wrap_future(self.embedding_executor.submit(query))
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._retrieval_pool, self._search_and_rerank, query, query_embedding.tolist(), top_k
             )
+        except Exception as e:
+            logger.error(f"Failed to retrieve context: {str(e)}")
+            raise
+    
+    async def aretrieve_many(self, queries: List[str], top_k: int = TOP_K) -> List[Dict[str, Any]]:
+        """Async variant of ``retrieve_many``, run on the retrieval thread pool.
+        
+        Args:
+            queries: Query texts
+            top_k: Number of results to return in total
             
-            # Format results
-            context_items = []
-            for result in results:
-                context_items.append({
-                    "text": result["content"],  # Map content to text for compatibility
-                    "metadata": result["metadata"]
-                })
+        Returns:
+            List of context items
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._retrieval_pool, self.retrieve_many, queries, top_k)
+    
+    def _search_and_rerank(self, query: str, query_embedding: List[float], top_k: int) -> List[Dict[str, Any]]:
+        # Search, over-fetching candidates for the reranker
+        results = self._search([query], [query_embedding], self._candidates(top_k))[0]
+        return self._rerank(query, self._to_context_items(results), top_k)
+    
+    def search_many(self, queries: List[str], top_k: int = TOP_K) -> List[List[Dict[str, Any]]]:
+        """Retrieve context for several queries with one encode and one Milvus request.
+        
+        Args:
+            queries: Query texts
+            top_k: Number of results to return per query
             
-            return context_items
+        Returns:
+            One list of context items per query, in the order of ``queries``
+        """
+        try:
+            query_embeddings = self.embedding_service.embed(queries)
+            results = self._search(queries, query_embeddings, top_k)
+            return [self._to_context_items(query_results) for query_results in results]
         except Exception as e:
             logger.error(f"Failed to retrieve context: {str(e)}")
             raise
+    
+    def retrieve_many(self, queries: List[str], top_k: int = TOP_K) -> List[Dict[str, Any]]:
+        """Retrieve context for a query and its rephrasings as one deduplicated list.
+        
+        The per-query hit lists are interleaved rank by rank, so every query contributes
+        its best chunks before any query contributes its weaker ones.
+        
+        Args:
+            queries: Query texts
+            top_k: Number of results to return in total
+            
+        Returns:
+            List of context items
+        """
+        candidates = self._candidates(top_k)
+        per_query = self.search_many(queries, candidates)
+        context_items, seen = [], set()
+        for rank in range(candidates):
+            for items in per_query:
+                if rank < len(items) and items[rank]["id"] not in seen:
+                    seen.add(items[rank]["id"])
+                    context_items.append(items[rank])
+        return self._rerank(queries[0], context_items[:candidates], top_k)
+    
+    def _candidates(self, top_k: int) -> int:
+        """Number of results fetched from the vector store for ``top_k`` final results."""
+        return max(top_k, RERANK_CANDIDATES) if self.reranker else top_k
+    
+    def _rerank(self, query: str, items: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        if not self.reranker:
+            return items[:top_k]
+        return self.reranker.rerank(query, items, top_k)
+    
+    def _hybrid_enabled(self) -> bool:
+        if self.retrieval_mode != "hybrid":
+            return False
+        if not self.vector_store.supports_field(SPARSE_FIELD):
+            logger.debug(f"Collection {self.collection_name} has no {SPARSE_FIELD} field, using dense search")
+            return False
+        return True
+    
+    def _search(self, queries: List[str], query_embeddings: List[Any],
+                top_k: int) -> List[List[Dict[str, Any]]]:
+        """Dense search, or dense and keyword search run concurrently and fused with RRF."""
+        if not self._hybrid_enabled():
+            return self.vector_store.search_many(query_embeddings, top_k=top_k)
+        
+        candidates = max(top_k, HYBRID_CANDIDATES)
+        dense = self._search_pool.submit(
+            self.vector_store.search_many, query_embeddings, candidates
+        )
+        # Queries made only of stopwords have no keyword vector and rely on dense search alone
+        sparse_vectors = [SparseQueryEncoder.encode(query) for query in queries]
+        keyword_positions = [i for i, vector in enumerate(sparse_vectors) if vector]
+        sparse_results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        if keyword_positions:
+            keyword_hits = self.vector_store.search_many(
+                [sparse_vectors[i] for i in keyword_positions],
+                top_k=candidates, search_field=SPARSE_FIELD
+            )
+            for i, hits in zip(keyword_positions, keyword_hits):
+                sparse_results[i] = hits
+        dense_results = dense.result()
+        
+        return [
+            reciprocal_rank_fusion([dense_hits, sparse_hits], [HYBRID_DENSE_WEIGHT, HYBRID_SPARSE_WEIGHT], top_k)
+            for dense_hits, sparse_hits in zip(dense_results, sparse_results)
+        ]
+    
+    @staticmethod
+    def _to_context_items(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Map content to text for compatibility
+        return [
+            {"id": result["id"], "text": result["content"], "metadata": result["metadata"]}
+            for result in results
+        ]
 
-# Initialize the context retriever
-context_retriever = ContextRetriever()
+# Created on first use (or by the app's lifespan handler), never at import time
+_context_retriever: Optional[ContextRetriever] = None
+_context_retriever_lock = threading.Lock()
 
-@tool
-def retrieve_context(query: str) -> List[Document]:
+def get_context_retriever() -> ContextRetriever:
+    """Get the process-wide context retriever, creating it on first use.
+    
+    Returns:
+        Context retriever
+    """
+    global _context_retriever
+    if _context_retriever is None:
+        with _context_retriever_lock:
+            if _context_retriever is None:
+                _context_retriever = ContextRetriever()
+    return _context_retriever
+
+def close_context_retriever() -> None:
+    """Release the context retriever's resources if it was created."""
+    global _context_retriever
+    with _context_retriever_lock:
+        if _context_retriever is not None:
+            _context_retriever.close()
+            _context_retriever = None
+
+def _to_documents(context_items: List[Dict[str, Any]]) -> List[Document]:
+    """Convert context items to Document objects."""
+    return [
+        Document(page_content=item["text"], metadata=item["metadata"])
+        for item in context_items
+    ]
+
+def _pack_context(context_retriever: ContextRetriever, context_items: List[Dict[str, Any]]) -> Tuple[str, List[Document]]:
+    """Pack context items for the prompt and keep the full documents as the tool artifact."""
+    documents = _to_documents(context_items)
+    # The baseline is how the document list used to be rendered into the tool message
+    context = context_retriever.context_packer.pack(context_items, baseline=lambda items: str(documents))
+    return context, documents
+
+def _retrieve_context(query: str, alternative_queries: Optional[List[str]] = None) -> Tuple[str, List[Document]]:
     """Retrieve relevant context about DataNinja from the knowledge base. The knowledge base is a Milvus vector store.  Any queries about DataNinja should be answered using this tool.
     
     Args:
         query: The search query.
+        alternative_queries: Optional rephrasings or sub-questions of the query, searched together with it.
         
     Returns:
-        List of the content of the relevant documents with their content and metadata.
+        The relevant passages, numbered and labelled with their source and section, and the
+        retrieved documents with their content and metadata.
     """
     top_k = TOP_K
     try:
         # Get context from the retriever
-        context_items = context_retriever.retrieve(query, top_k)
-        
-        # Convert to Document objects
-        documents = []
-        for item in context_items:
-            documents.append(
-                Document(
-                    page_content=item["text"],
-                    metadata=item["metadata"]
-                )
-            )
+        context_retriever = get_context_retriever()
+        if alternative_queries:
+            context_items = context_retriever.retrieve_many([query, *alternative_queries], top_k)
+        else:
+            context_items = context_retriever.retrieve(query, top_k)
+        
+        return _pack_context(context_retriever, context_items)
+    except Exception as e:
+        logger.error(f"Error retrieving context: {str(e)}")
+        return "", []
+
+async def _aretrieve_context(query: str, alternative_queries: Optional[List[str]] = None) -> Tuple[str, List[Document]]:
+    """Async variant of ``_retrieve_context`` with a per-call timeout of ``RETRIEVAL_TIMEOUT_SECONDS``."""
+    top_k = TOP_K
+    try:
+        # Creating the retriever loads models, so it never runs on the event loop
+        context_retriever = await asyncio.to_thread(get_context_retriever)
+        if alternative_queries:
+            retrieval = context_retriever.aretrieve_many([query, *alternative_queries], top_k)
+        else:
+            retrieval = context_retriever.aretrieve(query, top_k)
+        context_items = await asyncio.wait_for(retrieval, timeout=RETRIEVAL_TIMEOUT_SECONDS)
         
-        return documents
+        return await asyncio.to_thread(_pack_context, context_retriever, context_items)
+    except asyncio.TimeoutError:
+        logger.error(f"Retrieving context timed out after {RETRIEVAL_TIMEOUT_SECONDS}s")
+        metrics.increment("retrieval.timeouts")
+        return "", []
     except Exception as e:
         logger.error(f"Error retrieving context: {str(e)}")
-        return []
+        return "", []
+
+# Sync callers (graph.invoke) use func; async callers (graph.ainvoke / astream) await coroutine.
+# The model only sees the packed context; the documents travel as the ToolMessage artifact.
+retrieve_context = StructuredTool.from_function(
+    func=_retrieve_context,
+    coroutine=_aretrieve_context,
+    name="retrieve_context",
+    response_format="content_and_artifact"
+)
 
 @tool
 def multiply(a: int, b: int) -> int:
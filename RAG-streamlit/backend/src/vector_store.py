@@ -0,0 +1,248 @@
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional
+import os
+import json
+import mmap
+import threading
+import time
+import logging
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # HNSW is optional; exact search works without it
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+class VectorStore(ABC):
+    """Interface the context retriever searches through."""
+
+    @abstractmethod
+    def search_many(self, query_embeddings: List[Any], top_k: int, search_field: str = "embedding",
+                    output_fields: List[str] = None) -> List[List[Dict[str, Any]]]:
+        """Search for several query vectors at once.
+
+        Args:
+            query_embeddings: Query vectors
+            top_k: Number of results to return per query
+            search_field: Vector field to search
+            output_fields: Fields to return in results
+
+        Returns:
+            One list of results with "id", "score", "content" and "metadata" per query
+        """
+
+    @abstractmethod
+    def supports_field(self, field_name: str) -> bool:
+        """Whether ``search_many`` can search a vector field.
+
+        Args:
+            field_name: Name of the vector field
+
+        Returns:
+            True if the field can be searched
+        """
+
+    def warm(self) -> None:
+        """Load the store into memory ahead of the first search."""
+
+    def close(self) -> None:
+        """Release the store."""
+
+class MilvusVectorStore(VectorStore):
+    """Searches one Milvus collection through a ``MilvusService``."""
+
+    def __init__(self, milvus_service: Any, collection_name: str):
+        """Initialize the Milvus store.
+
+        Args:
+            milvus_service: Connected MilvusService
+            collection_name: Name or alias of the collection
+        """
+        self.milvus_service = milvus_service
+        self.collection_name = collection_name
+
+    def search_many(self, query_embeddings: List[Any], top_k: int, search_field: str = "embedding",
+                    output_fields: List[str] = None) -> List[List[Dict[str, Any]]]:
+        return self.milvus_service.search_many(self.collection_name, query_embeddings, top_k,
+                                               search_field, output_fields)
+
+    def supports_field(self, field_name: str) -> bool:
+        return self.milvus_service.collection_manager(self.collection_name).has_field(field_name)
+
+    def warm(self) -> None:
+        self.milvus_service.warm(self.collection_name)
+
+    def close(self) -> None:
+        self.milvus_service.disconnect()
+
+class EmbeddedVectorStore(VectorStore):
+    """Searches the memory-mapped vector store written by the ingestion pipeline.
+
+    Reads the directory layout of ``EmbeddedVectorStore`` in pipelines/vector_store.py.
+    Queries use the store's HNSW graph when it has one and hnswlib is installed, and an
+    exact NumPy scan otherwise. The manifest is re-checked at most every
+    ``refresh_interval`` seconds and the files are remapped when the pipeline committed.
+    """
+
+    MANIFEST_FILE = "manifest.json"
+    VECTORS_FILE = "vectors.f32"
+    IDS_FILE = "ids.i64"
+    OFFSETS_FILE = "offsets.i64"
+    PAYLOADS_FILE = "payloads.jsonl"
+    HNSW_FILE = "hnsw.bin"
+
+    def __init__(self, path: str, vector_field: str = "embedding", ef: int = 64,
+                 refresh_interval: float = 30):
+        """Initialize the embedded store.
+
+        Args:
+            path: Directory written by the pipeline
+            vector_field: Name the dense vectors are searched under
+            ef: HNSW candidate list size; raised to ``top_k`` when smaller
+            refresh_interval: Seconds between checks for new commits
+        """
+        self.path = path
+        self.vector_field = vector_field
+        self.ef = ef
+        self.refresh_interval = refresh_interval
+        self.generation = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._state: Optional[Dict[str, Any]] = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _open(self, manifest: Dict[str, Any]) -> Dict[str, Any]:
+        """Map the files of one committed generation."""
+        rows, capacity, dim = manifest["rows"], manifest["capacity"], manifest["dim"]
+        vectors = np.memmap(self._file(self.VECTORS_FILE), dtype=np.float32, mode="r", shape=(capacity, dim))[:rows]
+        ids = np.memmap(self._file(self.IDS_FILE), dtype=np.int64, mode="r", shape=(capacity,))[:rows]
+        offsets = np.memmap(self._file(self.OFFSETS_FILE), dtype=np.int64, mode="r", shape=(capacity, 2))[:rows]
+        with open(self._file(self.PAYLOADS_FILE), "rb") as f:
+            payloads = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+        index = None
+        if manifest.get("hnsw") and manifest.get("hnsw_rows"):
+            if hnswlib is None:
+                logger.warning("Vector store has an HNSW graph but hnswlib is not installed, using exact search")
+            else:
+                space = {"COSINE": "ip", "IP": "ip", "L2": "l2"}[manifest["metric_type"]]
+                index = hnswlib.Index(space=space, dim=dim)
+                index.load_index(self._file(self.HNSW_FILE))
+                index.set_ef(self.ef)
+
+        state = {
+            "metric_type": manifest["metric_type"],
+            "dim": dim,
+            "vectors": vectors,
+            "ids": ids,
+            "offsets": offsets,
+            "payloads": payloads,
+            "index": index,
+            "indexed_rows": manifest.get("hnsw_rows", 0) if index is not None else 0,
+            "live_rows": int(np.count_nonzero(ids >= 0)),
+        }
+        if manifest["metric_type"] == "L2":
+            state["norms"] = np.einsum("ij,ij->i", vectors, vectors)
+        logger.info(f"Opened embedded vector store at {self.path}: {state['live_rows']} rows, "
+                    f"generation {manifest['generation']}, {'HNSW' if index is not None else 'exact'} search")
+        return state
+
+    def _get_state(self) -> Dict[str, Any]:
+        """Current mapping, reopened if the pipeline committed since it was made."""
+        now = time.monotonic()
+        if self._state is not None and now - self._last_check < self.refresh_interval:
+            return self._state
+        with self._lock:
+            if self._state is None or now - self._last_check >= self.refresh_interval:
+                self._last_check = now
+                try:
+                    with open(self._file(self.MANIFEST_FILE), "r", encoding="utf-8") as f:
+                        manifest = json.load(f)
+                except FileNotFoundError:
+                    raise ValueError(f"No vector store at {self.path}; run the pipeline with vector_store.type: embedded")
+                if manifest["generation"] != self.generation:
+                    self._state = self._open(manifest)
+                    self.generation = manifest["generation"]
+            return self._state
+
+    def _payload(self, state: Dict[str, Any], row: int) -> Dict[str, Any]:
+        start, length = state["offsets"][row]
+        return json.loads(state["payloads"][int(start):int(start) + int(length)].decode("utf-8"))
+
+    def search_many(self, query_embeddings: List[Any], top_k: int, search_field: str = "embedding",
+                    output_fields: List[str] = None) -> List[List[Dict[str, Any]]]:
+        if not self.supports_field(search_field):
+            raise ValueError(f"Embedded vector store cannot search field {search_field}")
+        if not len(query_embeddings):
+            return []
+        state = self._get_state()
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, state["dim"])
+        if state["metric_type"] == "COSINE":
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        k = min(top_k, state["live_rows"])
+        if k <= 0:
+            return [[] for _ in queries]
+
+        if state["index"] is not None and state["indexed_rows"] == len(state["ids"]):
+            rows, scores = self._search_hnsw(state, queries, k)
+        else:
+            rows, scores = self._search_exact(state, queries, k)
+
+        fields = output_fields or ["content", "metadata"]
+        results = []
+        for query_rows, query_scores in zip(rows, scores):
+            hits = []
+            for row, score in zip(query_rows, query_scores):
+                row_id = int(state["ids"][row])
+                # Rows deleted since the graph was saved are skipped
+                if row_id < 0:
+                    continue
+                payload = self._payload(state, row)
+                hit = {"id": row_id, "score": float(score)}
+                hit.update({field: payload.get(field, {} if field == "metadata" else "") for field in fields})
+                hits.append(hit)
+            results.append(hits[:k])
+        return results
+
+    def _search_hnsw(self, state: Dict[str, Any], queries: np.ndarray, k: int):
+        index = state["index"]
+        # Over-fetch to make up for rows the pipeline deleted after the graph was loaded
+        fetch = min(2 * k, state["live_rows"])
+        index.set_ef(max(self.ef, fetch))
+        labels, distances = index.knn_query(queries, k=fetch)
+        if state["metric_type"] == "L2":
+            return labels, distances
+        # hnswlib's inner-product distance is 1 - similarity
+        return labels, 1.0 - distances
+
+    def _search_exact(self, state: Dict[str, Any], queries: np.ndarray, k: int):
+        vectors = state["vectors"]
+        if state["metric_type"] == "L2":
+            scores = -(state["norms"][None, :] - 2 * queries @ vectors.T
+                       + np.einsum("ij,ij->i", queries, queries)[:, None])
+        else:
+            scores = queries @ vectors.T
+        scores[:, state["ids"] < 0] = -np.inf
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        # Milvus reports L2 as a distance, smaller is closer
+        return top, (-top_scores if state["metric_type"] == "L2" else top_scores)
+
+    def supports_field(self, field_name: str) -> bool:
+        return field_name == self.vector_field
+
+    def warm(self) -> None:
+        state = self._get_state()
+        if state["live_rows"]:
+            self.search_many([np.ones(state["dim"], dtype=np.float32)], 1)
+        logger.info(f"Warmed embedded vector store at {self.path}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._state = None
+            self.generation = None
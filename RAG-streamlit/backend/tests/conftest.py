@@ -0,0 +1,13 @@
+import os
+
+# Settings the backend modules read at import time; the services behind them are mocked in the tests
+for name, value in {
+    "MILVUS_HOST": "localhost",
+    "MILVUS_PORT": "19530",
+    "OLLAMA_HOST": "http://localhost:11434",
+    "OLLAMA_MODEL": "qwen2:7b",
+    "MAX_TOKENS": "256",
+    "TEMPERATURE": "0",
+    "CONTEXT_TOKENIZER": "",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,78 @@
+import pytest # type: ignore
+import asyncio
+from admission import AdmissionController, AdmissionRejected
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_admits_up_to_the_concurrency_limit_then_queues_in_order():
+    """Test that queued requests get freed slots in FIFO order."""
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, max_queue=4, queue_timeout=5)
+        running = controller.enqueue()
+        queued = [controller.enqueue() for _ in range(3)]
+        assert running.admitted and not any(ticket.admitted for ticket in queued)
+        assert controller.queue_depth == 3
+        assert [controller.position(ticket) for ticket in [running, *queued]] == [0, 1, 2, 3]
+
+        admitted = []
+        async def wait(name, ticket):
+            await controller.wait(ticket)
+            admitted.append(name)
+        waiters = [asyncio.create_task(wait(name, ticket)) for name, ticket in zip("abc", queued)]
+        await asyncio.sleep(0)
+
+        # Finishing hands the slot straight to the oldest waiter
+        for ticket in [running, *queued[:2]]:
+            controller.finish(ticket)
+            await asyncio.sleep(0)
+        await asyncio.gather(*waiters)
+        assert admitted == ["a", "b", "c"]
+        assert controller._active == 1 and controller.queue_depth == 0
+
+        controller.finish(queued[2])
+        controller.finish(queued[2])
+        assert controller._active == 0
+    run(scenario())
+
+def test_cancelled_waiter_leaves_the_queue():
+    """Test that a request finished while queued frees its place and never takes a slot."""
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, max_queue=4, queue_timeout=5)
+        running = controller.enqueue()
+        abandoned, next_in_line = controller.enqueue(), controller.enqueue()
+        waiter = asyncio.create_task(controller.wait(abandoned))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        controller.finish(abandoned)
+        assert controller.queue_depth == 1
+
+        controller.finish(running)
+        await controller.wait(next_in_line)
+        assert next_in_line.admitted and not abandoned.admitted
+        assert controller._active == 1
+    run(scenario())
+
+def test_full_queue_is_rejected_with_429():
+    """Test that a request beyond the queue is rejected at once."""
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, max_queue=1, retry_after=7)
+        controller.enqueue()
+        controller.enqueue()
+        with pytest.raises(AdmissionRejected) as rejected:
+            controller.enqueue()
+        assert rejected.value.status_code == 429 and rejected.value.retry_after == 7
+    run(scenario())
+
+def test_queue_timeout_is_rejected_with_503():
+    """Test that a request still queued after the timeout is rejected and leaves the queue."""
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, max_queue=2, queue_timeout=0.01)
+        controller.enqueue()
+        queued = controller.enqueue()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.wait(queued)
+        assert rejected.value.status_code == 503
+        assert controller.queue_depth == 0
+    run(scenario())
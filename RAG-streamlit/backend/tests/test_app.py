@@ -0,0 +1,171 @@
+import pytest # type: ignore
+import asyncio
+import json
+import httpx
+from unittest.mock import Mock, AsyncMock, patch
+from metrics import metrics
+from admission import AdmissionController
+from app import app, settings, readiness, warm_up_retrieval, admission, chat_stream, ChatRequest
+
+def request(method, url, **kwargs):
+    # The ASGI transport does not run the lifespan (graph compilation and warm-up)
+    async def send():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, url, **kwargs)
+    return asyncio.run(send())
+
+@pytest.fixture(autouse=True)
+def reset_readiness():
+    readiness.ready, readiness.error, readiness.warmup_seconds = False, None, None
+    yield
+    readiness.ready, readiness.error, readiness.warmup_seconds = False, None, None
+
+def test_readiness_fails_until_warmed_up():
+    """Test that liveness always succeeds and readiness returns 503 until warm-up finishes."""
+    assert request("GET", "/health").json()["live"] is True
+    response = request("GET", "/health/ready")
+    assert response.status_code == 503
+    assert response.json()["detail"] == "Retrieval is warming up"
+
+    readiness.ready, readiness.warmup_seconds = True, 1.5
+    response = request("GET", "/health/ready")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready", "warmup_seconds": 1.5}
+
+def test_warm_up_retries_until_retrieval_is_available():
+    """Test that a failed warm-up is reported and retried until it succeeds."""
+    retriever = Mock()
+    retriever.warm.side_effect = [ConnectionError("Milvus is down"), None]
+    errors = []
+
+    async def sleep(seconds):
+        errors.append(readiness.error)
+
+    with patch("app.get_context_retriever", return_value=retriever), patch("app.asyncio.sleep", sleep):
+        asyncio.run(warm_up_retrieval())
+
+    assert errors == ["Milvus is down"]
+    assert readiness.ready is True and readiness.error is None
+    assert retriever.warm.call_count == 2
+
+def sse_events(response):
+    return [line[len("data: "):] for line in response.text.split("\n") if line.startswith("data: ")]
+
+def test_chat_stream_forwards_agent_events():
+    """Test that tokens and tool events are sent as SSE events, ending with the done marker."""
+    async def run(graph, prompt):
+        yield {"event": "tool_start", "tool": "retrieve_context", "input": {"query": prompt}}
+        yield {"content": "Hello"}
+
+    with patch("app.run_agent_graph_streaming", run):
+        response = request("POST", "/chat/stream", json={"user_prompt": "hi"})
+
+    assert response.status_code == 200
+    events = sse_events(response)
+    assert [json.loads(event) for event in events[:-1]] == [
+        {"event": "tool_start", "tool": "retrieve_context", "input": {"query": "hi"}},
+        {"content": "Hello"}
+    ]
+    assert events[-1] == "[DONE]"
+
+def test_chat_stream_cancels_generation_on_disconnect():
+    """Test that a client disconnect cancels the agent task and frees its admission slot."""
+    cancelled = asyncio.Event()
+
+    async def run(graph, prompt):
+        try:
+            yield {"content": "partial"}
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    http_request = Mock()
+    http_request.is_disconnected = AsyncMock(return_value=True)
+
+    async def consume():
+        response = await chat_stream(ChatRequest(user_prompt="hi"), http_request)
+        chunks = [chunk async for chunk in response.body_iterator]
+        return chunks, cancelled.is_set()
+
+    cancelled_before = metrics.counter("chat_stream.cancelled")
+    with patch("app.run_agent_graph_streaming", run), patch("app.DISCONNECT_POLL_SECONDS", 0.01):
+        chunks, was_cancelled = asyncio.run(consume())
+
+    assert chunks == ['data: {"content": "partial"}\n\n']
+    assert was_cancelled
+    assert metrics.counter("chat_stream.cancelled") == cancelled_before + 1
+    assert admission._active == 0 and admission.queue_depth == 0
+
+@pytest.fixture
+def busy_admission():
+    # One request already holds the only LLM slot
+    controller = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=0.05, retry_after=3)
+    controller._active = 1
+    with patch("app.admission", controller):
+        yield controller
+
+def test_chat_stream_rejects_full_queue_with_429(busy_admission):
+    """Test that a stream is rejected with 429 before it starts when the queue is full."""
+    busy_admission.max_queue = 0
+    response = request("POST", "/chat/stream", json={"user_prompt": "hi"})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
+
+def test_chat_stream_reports_queue_position_then_times_out(busy_admission):
+    """Test that a queued stream gets heartbeats with its position and an in-band 503 on timeout."""
+    busy_admission.queue_timeout = 0.3
+    with patch("app.DISCONNECT_POLL_SECONDS", 0.01), patch.object(settings, "SSE_HEARTBEAT_SECONDS", 0.1):
+        response = request("POST", "/chat/stream", json={"user_prompt": "hi"})
+
+    assert response.status_code == 200
+    events = sse_events(response)
+    heartbeats = [json.loads(event) for event in events[:-2]]
+    assert len(heartbeats) >= 2
+    assert all(heartbeat == {"event": "heartbeat", "queue_depth": 1, "position": 1} for heartbeat in heartbeats)
+    error = json.loads(events[-2])
+    assert error["status"] == 503 and error["retry_after"] == 3
+    assert events[-1] == "[DONE]"
+    assert busy_admission.queue_depth == 0 and busy_admission._active == 1
+
+def test_chat_stream_runs_once_admitted_from_the_queue(busy_admission):
+    """Test that a queued stream starts generating when the running request frees its slot."""
+    async def run(graph, prompt):
+        yield {"content": "Hello"}
+
+    async def consume():
+        http_request = Mock()
+        http_request.is_disconnected = AsyncMock(return_value=False)
+        response = await chat_stream(ChatRequest(user_prompt="hi"), http_request)
+        chunks = response.body_iterator
+        first = await chunks.__anext__()
+        # The running request ends and hands its slot to the queued one
+        busy_admission.finish(Mock(finished=False, admitted=True))
+        return first, [chunk async for chunk in chunks]
+
+    with patch("app.run_agent_graph_streaming", run), patch("app.DISCONNECT_POLL_SECONDS", 0.01):
+        first, rest = asyncio.run(consume())
+
+    assert json.loads(first[len("data: "):]) == {"event": "heartbeat", "queue_depth": 1, "position": 1}
+    assert rest == ['data: {"content": "Hello"}\n\n', "data: [DONE]\n\n"]
+    assert busy_admission._active == 0 and busy_admission.queue_depth == 0
+
+def test_chat_stream_gives_up_its_place_when_client_leaves_the_queue(busy_admission):
+    """Test that a client disconnecting while queued leaves the queue without taking a slot."""
+    busy_admission.queue_timeout = 5
+    http_request = Mock()
+    http_request.is_disconnected = AsyncMock(return_value=True)
+
+    async def consume():
+        response = await chat_stream(ChatRequest(user_prompt="hi"), http_request)
+        return [chunk async for chunk in response.body_iterator]
+
+    abandoned_before = metrics.counter("admission.abandoned")
+    with patch("app.DISCONNECT_POLL_SECONDS", 0.01):
+        chunks = asyncio.run(consume())
+
+    assert [json.loads(chunk[len("data: "):])["event"] for chunk in chunks] == ["heartbeat"]
+    assert busy_admission.queue_depth == 0 and busy_admission._active == 1
+    assert metrics.counter("admission.abandoned") == abandoned_before + 1
@@ -0,0 +1,65 @@
+import pytest # type: ignore
+from metrics import metrics
+from context_packer import ContextPacker
+
+def chunk(chunk_id, text, source="docs/guide.md", headers=None):
+    return {"id": chunk_id, "text": text, "metadata": {"source": source, "headers": headers or {"1": "Guide"}}}
+
+def test_deduplicate_drops_contained_chunks():
+    """Test that a chunk repeated inside a better-ranked one is dropped and distinct ones kept."""
+    packer = ContextPacker()
+    long = chunk(1, "Milvus stores the chunk embeddings and serves the vector search for the agent")
+    repeated = chunk(2, "Milvus stores the chunk embeddings and serves the vector search", source="docs/copy.md")
+    distinct = chunk(3, "Ollama runs the chat model that answers the question")
+
+    assert [item["id"] for item in packer.deduplicate([long, repeated, distinct])] == [1, 3]
+
+def test_merge_adjacent_joins_overlap_and_combines_headers():
+    """Test that continuing chunks of one source are merged once, with the headers of both parts."""
+    packer = ContextPacker()
+    first = chunk(4, "intro line\nshared line", headers={"1": "Guide", "2": "Setup"})
+    second = chunk(5, "shared line\nnext section", headers={"1": "Guide", "2": "Usage"})
+    other = chunk(5, "unrelated", source="docs/other.md")
+
+    merged = packer.merge_adjacent([second, other, first])
+
+    assert [item["text"] for item in merged] == ["intro line\nshared line\nnext section", "unrelated"]
+    assert merged[0]["metadata"]["headers"] == {"1": "Guide", "2": "Setup / Usage"}
+    assert ContextPacker.format_item(1, merged[0]).startswith("[1] guide.md > Guide > Setup / Usage\n")
+
+def test_merge_adjacent_needs_a_meaningful_overlap():
+    """Test that a shared code fence does not merge unrelated chunks but a long overlap does."""
+    packer = ContextPacker(min_merge_overlap=40)
+    fenced = chunk(2, "Install it:\n```\npip install milvus\n```")
+    unrelated = chunk(9, "```\ndocker compose up\n```")
+    assert len(packer.merge_adjacent([fenced, unrelated])) == 2
+
+    carried = "The agent retries the search once when the collection is reloaded"
+    first = chunk(2, f"Retries\n{carried}")
+    second = chunk(9, f"{carried}\nThen it gives up")
+    merged = packer.merge_adjacent([first, second])
+    assert [item["text"] for item in merged] == [f"Retries\n{carried}\nThen it gives up"]
+
+def test_pack_respects_the_token_budget():
+    """Test that blocks past the budget are skipped and an oversized best chunk is truncated."""
+    packer = ContextPacker(token_budget=30)
+    best = chunk(1, "alpha " * 10, source="a.md")
+    too_long = chunk(2, "beta " * 40, source="b.md")
+    fits = chunk(3, "gamma", source="c.md")
+
+    context = packer.pack([best, too_long, fits])
+    assert "beta" not in context and "[2] c.md > Guide\ngamma" in context
+    assert packer.count_tokens(context) <= 30 + 1
+
+    truncated = packer.pack([too_long])
+    assert truncated.startswith("[1] b.md") and packer.count_tokens(truncated) <= 30
+
+def test_pack_records_estimated_tokens_saved():
+    """Test that the tokens saved against the unpacked baseline are recorded."""
+    packer = ContextPacker(token_budget=100)
+    items = [chunk(1, "alpha beta"), chunk(2, "alpha beta", source="docs/copy.md")]
+    saved_before = metrics.counter("context_packing.tokens_saved")
+
+    context = packer.pack(items, baseline=lambda items: "x" * 400)
+    expected = 100 - ContextPacker.estimate_tokens(context)
+    assert metrics.counter("context_packing.tokens_saved") - saved_before == expected
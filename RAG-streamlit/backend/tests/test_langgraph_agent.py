@@ -0,0 +1,110 @@
+import pytest # type: ignore
+import asyncio
+import json
+from unittest.mock import patch
+from langchain_core.tools import tool
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langgraph_agent import GraphRegistry, create_agent_graph, run_agent_graph_streaming
+
+@tool
+def lookup(query: str) -> str:
+    """Look something up."""
+    return query
+
+@tool
+def add(a: int, b: int) -> int:
+    """Add two numbers."""
+    return a + b
+
+def test_graph_registry_compiles_each_configuration_once():
+    """Test that a configuration is compiled once and equivalent model names share its graph."""
+    registry = GraphRegistry()
+    graph = registry.get([lookup], "prompt", True, "qwen2:7b")
+
+    assert registry.get([lookup], "prompt", True, " qwen2:7b ") is graph
+    assert registry.get([lookup], "prompt", False, "qwen2:7b") is not graph
+    assert registry.get([lookup], "other prompt", True, "qwen2:7b") is not graph
+    assert registry.get([lookup, add], "prompt", True, "qwen2:7b") is not graph
+    assert registry.get([lookup], "prompt", True, "llama3") is not graph
+    assert registry.get([lookup], "prompt", True, None) is registry.get([lookup], "prompt", True, "")
+
+def test_graph_registry_evicts_least_recently_used():
+    """Test that the least recently used graph is dropped beyond the limit and clear empties it."""
+    registry = GraphRegistry(max_graphs=2)
+    with patch("langgraph_agent.create_agent_graph", side_effect=lambda *args: object()) as create:
+        first = registry.get([lookup], "prompt", False, "a")
+        registry.get([lookup], "prompt", False, "b")
+        assert registry.get([lookup], "prompt", False, "a") is first
+        registry.get([lookup], "prompt", False, "c")
+
+        assert registry.get([lookup], "prompt", False, "a") is first
+        assert create.call_count == 3
+        registry.get([lookup], "prompt", False, "b")
+        assert create.call_count == 4
+
+        registry.clear()
+        assert registry.get([lookup], "prompt", False, "a") is not first
+
+class FakeChatModel(GenericFakeChatModel):
+    """Fake chat model that can also stream a tool call."""
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        message = next(self.messages)
+        if message.tool_calls:
+            call = message.tool_calls[0]
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0}
+            ]))
+            return
+        for token in message.content.split(" "):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token + " "))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+class FakeClientPool:
+    """Hands out the same fake model for every node."""
+
+    def __init__(self, *messages):
+        self.model = FakeChatModel(messages=iter(messages))
+
+    def get(self, model_name=None):
+        return self.model
+
+    def get_with_tools(self, tools, model_name=None):
+        return self.model
+
+def stream(graph, prompt):
+    async def collect():
+        return [event async for event in run_agent_graph_streaming(graph, prompt)]
+    return asyncio.run(collect())
+
+def test_streaming_yields_direct_answer_tokens():
+    """Test that an answer without tool calls streams from the first model call."""
+    with patch("langgraph_agent.client_pool", FakeClientPool(AIMessage(content="Paris is the capital"))):
+        events = stream(create_agent_graph([lookup], "prompt", streaming=True), "capital of France?")
+
+    assert "".join(event["content"] for event in events) == "Paris is the capital "
+    assert len(events) == 4
+
+def test_streaming_reports_tool_calls_then_answer_tokens():
+    """Test that tool progress is reported and the final answer streams token by token."""
+    pool = FakeClientPool(
+        AIMessage(content="", tool_calls=[{"name": "lookup", "args": {"query": "milvus"}, "id": "call-1"}]),
+        AIMessage(content="Milvus stores vectors")
+    )
+    with patch("langgraph_agent.client_pool", pool):
+        events = stream(create_agent_graph([lookup], "prompt", streaming=True), "what is milvus?")
+
+    assert events[0] == {"event": "tool_start", "tool": "lookup", "input": {"query": "milvus"}}
+    assert events[1] == {"event": "tool_end", "tool": "lookup"}
+    assert [event["content"] for event in events[2:]] == ["Milvus ", "stores ", "vectors "]
+
+def test_streaming_reports_errors():
+    """Test that a failing model ends the stream with an error event."""
+    with patch("langgraph_agent.client_pool", FakeClientPool()):
+        events = stream(create_agent_graph([lookup], "prompt", streaming=True), "hi")
+
+    assert list(events[-1]) == ["error"]
@@ -0,0 +1,24 @@
+import pytest # type: ignore
+from metrics import Metrics
+
+def test_counters_and_summaries():
+    """Test that counters accumulate and summaries track count, sum, min, max and mean."""
+    registry = Metrics()
+    registry.increment("requests")
+    registry.increment("requests", 2)
+    for value in (4, 1, 7):
+        registry.observe("latency_ms", value)
+
+    snapshot = registry.snapshot()
+    assert registry.counter("requests") == 3
+    assert registry.counter("unknown") == 0
+    assert snapshot["summaries"]["latency_ms"] == {"count": 3, "sum": 12, "min": 1, "max": 7, "mean": 4}
+
+def test_gauges_and_failing_callbacks():
+    """Test that set and computed gauges are reported and a failing callback reports None."""
+    registry = Metrics()
+    registry.set_gauge("queue_depth", 5)
+    registry.register_gauge("entries", lambda: 3)
+    registry.register_gauge("broken", lambda: 1 / 0)
+
+    assert registry.snapshot()["gauges"] == {"queue_depth": 5, "entries": 3, "broken": None}
@@ -0,0 +1,97 @@
+import pytest # type: ignore
+import asyncio
+import json
+import httpx
+from unittest.mock import Mock, AsyncMock
+from langchain_core.tools import tool
+from models import OllamaSettings, OllamaModelFactory, OllamaClientPool, OllamaTransport
+
+@tool
+def lookup(query: str) -> str:
+    """Look something up."""
+    return query
+
+def make_pool(max_models=8):
+    settings = OllamaSettings(OLLAMA_HOST="http://ollama:11434", OLLAMA_MODEL="qwen2:7b",
+                              MAX_TOKENS=64, TEMPERATURE=0)
+    return OllamaClientPool(OllamaModelFactory(settings), max_models=max_models)
+
+def chat_response(request: httpx.Request) -> httpx.Response:
+    model = json.loads(request.content)["model"]
+    line = {"model": model, "created_at": "2024-01-01T00:00:00Z", "done": True, "done_reason": "stop",
+            "message": {"role": "assistant", "content": f"hello from {model}"}}
+    return httpx.Response(200, content=json.dumps(line) + "\n")
+
+def test_pool_reuses_clients_and_tool_bindings():
+    """Test that a configuration gets one client and one binding per tool set."""
+    pool = make_pool()
+    model = pool.get()
+
+    assert pool.get(" qwen2:7b ") is model
+    assert pool.get("qwen2:7b", format="json") is not model
+    assert pool.get_with_tools([lookup]) is pool.get_with_tools([lookup], "qwen2:7b")
+    assert pool.get_with_tools([lookup]).bound is model
+
+def test_pool_evicts_least_recently_used_models():
+    """Test that model names from requests cannot grow the pool past its limit."""
+    pool = make_pool(max_models=2)
+    first = pool.get("a")
+    bound = pool.get_with_tools([lookup], "a")
+    pool.get("b")
+    pool.get("a")
+    pool.get("c")
+
+    assert pool.get("a") is first and pool.get_with_tools([lookup], "a") is bound
+    assert len(pool._models) == 2
+    pool.get("b")
+    pool.get("c")
+    assert pool.get("a") is not first
+
+def test_pooled_clients_share_one_transport():
+    """Test that sync and async requests of every pooled client go through the pool's transport."""
+    pool = make_pool()
+    first, second = pool.get("a"), pool.get("b")
+    transport = pool._transport
+    transport._sync = httpx.MockTransport(chat_response)
+    transport._async = httpx.MockTransport(chat_response)
+
+    assert first.invoke("hi").content == "hello from a"
+    assert asyncio.run(second.ainvoke("hi")).content == "hello from b"
+
+    # A client closing does not close the connections the other clients use
+    first._client._client.close()
+    assert second.invoke("hi").content == "hello from b"
+
+def test_connection_limit_is_split_between_the_pools():
+    """Test that the sync and async pools together stay within OLLAMA_MAX_CONNECTIONS."""
+    settings = OllamaSettings(OLLAMA_HOST="http://ollama:11434", OLLAMA_MODEL="qwen2:7b",
+                              MAX_TOKENS=64, TEMPERATURE=0, OLLAMA_MAX_CONNECTIONS=8)
+    sync_limits, async_limits = OllamaModelFactory(settings).connection_limits()
+    assert (sync_limits.max_connections, async_limits.max_connections) == (2, 6)
+
+    settings.OLLAMA_MAX_CONNECTIONS = 2
+    assert [limits.max_connections for limits in OllamaModelFactory(settings).connection_limits()] == [1, 1]
+
+def test_unpooled_model_closes_its_own_connections():
+    """Test that a model created without the pool's transport closes its pools with its clients."""
+    factory = make_pool().factory
+    model = factory.create_model("a")
+    transport = model._client._client._transport
+    transport._sync, transport._async = Mock(), AsyncMock()
+
+    model._client._client.close()
+    asyncio.run(model._async_client._client.aclose())
+    transport._sync.close.assert_called_once()
+    transport._async.aclose.assert_awaited_once()
+
+def test_pool_aclose_shuts_down_its_transport():
+    """Test that aclose empties the pool and closes its connection pools."""
+    pool = make_pool()
+    model = pool.get()
+    transport = pool._transport
+    transport._sync, transport._async = Mock(), AsyncMock()
+
+    asyncio.run(pool.aclose())
+    transport._sync.close.assert_called_once()
+    transport._async.aclose.assert_awaited_once()
+    assert pool.get() is not model and pool._transport is not transport
@@ -0,0 +1,389 @@
+import pytest # type: ignore
+import asyncio
+import threading
+from unittest.mock import Mock, patch
+import numpy as np
+import tools
+from tools import (CollectionManager, QueryEmbeddingCache, EmbeddingService, EmbeddingExecutor,
+                   MilvusService, ContextRetriever, SparseQueryEncoder, Reranker, reciprocal_rank_fusion,
+                   get_context_retriever, close_context_retriever)
+
+def make_collection(collection_id=1, index_params=None):
+    collection = Mock()
+    collection.describe.return_value = {"collection_id": collection_id}
+    index = Mock(field_name="embedding", index_name="embedding_index",
+                 params=index_params or {"index_type": "HNSW", "metric_type": "COSINE"})
+    collection.indexes = [index]
+    return collection
+
+@pytest.fixture
+def mock_collections():
+    with patch("tools.utility") as mock_utility, patch("tools.Collection") as mock_collection:
+        mock_utility.has_collection.return_value = True
+        yield mock_collection
+
+def test_collection_manager_loads_once(mock_collections):
+    """Test that the collection is loaded on first use and reused within the refresh interval."""
+    collection = make_collection()
+    mock_collections.return_value = collection
+    manager = CollectionManager("docs", refresh_interval=3600)
+
+    assert manager.get() is collection
+    assert manager.get() is collection
+    assert manager.loads == 1
+    collection.load.assert_called_once()
+
+def test_collection_manager_reloads_when_reindexed(mock_collections):
+    """Test that only a changed collection id or index triggers a reload."""
+    original = make_collection()
+    mock_collections.return_value = original
+    manager = CollectionManager("docs", refresh_interval=0)
+    manager.get()
+
+    mock_collections.return_value = make_collection()
+    assert manager.get() is original and manager.loads == 1
+
+    reindexed = make_collection(index_params={"index_type": "IVF_FLAT", "metric_type": "L2"})
+    mock_collections.return_value = reindexed
+    assert manager.get() is reindexed and manager.loads == 2
+
+    realiased = make_collection(collection_id=2)
+    mock_collections.return_value = realiased
+    assert manager.get() is realiased and manager.loads == 3
+
+def test_collection_manager_missing_collection_and_release(mock_collections):
+    """Test that a missing collection raises and release drops the loaded handle."""
+    with patch("tools.utility.has_collection", return_value=False):
+        with pytest.raises(ValueError, match="does not exist"):
+            CollectionManager("missing").get()
+
+    collection = make_collection()
+    mock_collections.return_value = collection
+    manager = CollectionManager("docs")
+    manager.get()
+    manager.release()
+    collection.release.assert_called_once()
+    assert manager.collection is None
+
+def test_query_embedding_cache_lru_and_normalization():
+    """Test that queries are normalized, hits refresh recency and the oldest entry is evicted."""
+    cache = QueryEmbeddingCache(max_entries=2, ttl_seconds=60)
+    cache.put("model", "what  is\tmilvus", np.ones(4))
+    cache.put("model", "second query", np.zeros(4))
+
+    assert cache.get("model", " what is milvus ") is not None
+    assert cache.get("other-model", "what is milvus") is None
+    cache.put("model", "third query", np.zeros(4))
+
+    assert cache.get("model", "second query") is None
+    assert cache.get("model", "what is milvus").dtype == np.float32
+    assert cache.nbytes == 2 * 4 * 4
+    assert cache.hit_rate() == pytest.approx(2 / 4)
+
+def test_query_embedding_cache_ttl_and_disabled():
+    """Test that expired entries are dropped and a zero-sized cache stores nothing."""
+    cache = QueryEmbeddingCache(max_entries=4, ttl_seconds=10)
+    with patch("tools.time.monotonic", return_value=100):
+        cache.put("model", "query", np.ones(4))
+    with patch("tools.time.monotonic", return_value=111):
+        assert cache.get("model", "query") is None
+    assert cache.nbytes == 0
+
+    disabled = QueryEmbeddingCache(max_entries=0)
+    disabled.put("model", "query", np.ones(4))
+    assert disabled.get("model", "query") is None
+
+def test_embedding_service_encodes_only_misses():
+    """Test that cached and duplicate queries are not encoded again."""
+    with patch("tools.SentenceTransformer") as mock_model:
+        mock_model.return_value.encode.side_effect = lambda texts: np.ones((len(texts), 4))
+        service = EmbeddingService("model", cache=QueryEmbeddingCache(max_entries=8))
+
+        service.embed(["first", "first ", "second"])
+        service.embed(["second", "third"])
+
+    encoded = [call.args[0] for call in mock_model.return_value.encode.call_args_list]
+    assert encoded == [["first", "second"], ["third"]]
+
+def make_executor(encode, **kwargs):
+    service = Mock(model_name="model", cache=QueryEmbeddingCache(max_entries=0))
+    service.encode.side_effect = encode
+    return service, EmbeddingExecutor(service, **kwargs)
+
+def test_embedding_executor_batches_concurrent_queries():
+    """Test that queries submitted within the window are encoded in one call."""
+    service, executor = make_executor(lambda texts: np.arange(len(texts))[:, None] * np.ones(4),
+                                      window_ms=500, max_batch_size=3)
+    futures = [executor.submit(text) for text in ("first", "second", " first")]
+
+    results = [future.result(timeout=5) for future in futures]
+    service.encode.assert_called_once_with(["first", "second"])
+    assert results[0][0] == 0 and results[1][0] == 1 and results[2][0] == 0
+    executor.close()
+
+def test_embedding_executor_propagates_errors_and_survives():
+    """Test that an encode error fails its batch only and the worker keeps serving."""
+    calls = []
+    def encode(texts):
+        calls.append(texts)
+        if len(calls) == 1:
+            raise RuntimeError("model failed")
+        return np.ones((len(texts), 4))
+    _, executor = make_executor(encode, window_ms=0)
+
+    with pytest.raises(RuntimeError, match="model failed"):
+        executor.embed("first", timeout=5)
+    assert executor.embed("second", timeout=5).shape == (4,)
+    executor.close()
+
+def test_embedding_executor_skips_cancelled_queries():
+    """Test that a cancelled query is not encoded while the rest of its batch resolves."""
+    service, executor = make_executor(lambda texts: np.ones((len(texts), 4)),
+                                      window_ms=300, max_batch_size=2)
+    cancelled, kept = executor.submit("cancelled"), executor.submit("kept")
+    assert cancelled.cancel()
+
+    assert kept.result(timeout=5).shape == (4,)
+    service.encode.assert_called_once_with(["kept"])
+    executor.close()
+
+def test_embedding_executor_close():
+    """Test that close stops the worker, fails queued queries and rejects new ones."""
+    started, release = threading.Event(), threading.Event()
+    def encode(texts):
+        started.set()
+        release.wait(5)
+        return np.ones((len(texts), 4))
+    _, executor = make_executor(encode, window_ms=0)
+    running = executor.submit("running")
+    started.wait(5)
+    queued = executor.submit("queued")
+
+    closer = threading.Thread(target=executor.close)
+    closer.start()
+    release.set()
+    closer.join(5)
+
+    assert running.result(timeout=5).shape == (4,)
+    with pytest.raises(RuntimeError, match="closed"):
+        queued.result(timeout=5)
+    with pytest.raises(RuntimeError, match="closed"):
+        executor.submit("late")
+
+def make_hit(hit_id, score):
+    return Mock(id=hit_id, score=score, content=f"chunk {hit_id}", metadata={"source": "doc.md"})
+
+@patch("tools.connections")
+def test_milvus_search_many_single_request(mock_connections, mock_collections):
+    """Test that several queries are sent to Milvus in one search and split back per query."""
+    collection = make_collection()
+    collection.search.return_value = [[make_hit(1, 0.9), make_hit(2, 0.5)], [make_hit(3, 0.7)]]
+    mock_collections.return_value = collection
+    service = MilvusService()
+
+    results = service.search_many("docs", [np.ones(4), [0, 1, 0, 1]], top_k=2)
+
+    collection.search.assert_called_once()
+    kwargs = collection.search.call_args.kwargs
+    assert kwargs["data"] == [[1.0] * 4, [0.0, 1.0, 0.0, 1.0]]
+    assert kwargs["limit"] == 2
+    assert kwargs["param"] == {"metric_type": "COSINE", "params": {"ef": 64}}
+    assert [[hit["id"] for hit in hits] for hits in results] == [[1, 2], [3]]
+    assert results[0][0] == {"id": 1, "score": 0.9, "content": "chunk 1", "metadata": {"source": "doc.md"}}
+    assert service.search_many("docs", []) == []
+    assert collection.search.call_count == 1
+
+@patch("tools.connections")
+def test_milvus_search_reloads_released_collection_once(mock_connections, mock_collections):
+    """Test that a not-loaded error reloads the collection and retries, and other errors raise."""
+    stale = make_collection()
+    stale.search.side_effect = Exception("collection not loaded")
+    mock_collections.return_value = stale
+    service = MilvusService()
+    manager = service.collection_manager("docs")
+    manager.refresh_interval = 3600
+    manager.get()
+
+    reloaded = make_collection()
+    reloaded.search.return_value = [[make_hit(1, 0.9)]]
+    mock_collections.return_value = reloaded
+    results = service.search_many("docs", [np.ones(4)], top_k=1)
+
+    assert [hit["id"] for hit in results[0]] == [1]
+    assert manager.loads == 2 and manager.collection is reloaded
+
+    reloaded.search.side_effect = Exception("rate limited")
+    with pytest.raises(Exception, match="rate limited"):
+        service.search_many("docs", [np.ones(4)], top_k=1)
+    assert manager.loads == 2
+
+    reloaded.search.side_effect = Exception("index not found")
+    with pytest.raises(Exception, match="index not found"):
+        service.search_many("docs", [np.ones(4)], top_k=1)
+    assert manager.loads == 3
+
+def test_context_retriever_search_many_encodes_once():
+    """Test that a query and its rephrasings share one encode and one vector store call."""
+    store = Mock()
+    store.search_many.return_value = [[{"id": 1, "score": 0.9, "content": "a", "metadata": {}}],
+                                      [{"id": 2, "score": 0.8, "content": "b", "metadata": {}}]]
+    with patch("tools.SentenceTransformer") as mock_model:
+        mock_model.return_value.encode.side_effect = lambda texts: np.ones((len(texts), 4))
+        retriever = ContextRetriever(retrieval_mode="dense", rerank_model="", vector_store=store)
+        results = retriever.search_many(["first", "second"], top_k=1)
+
+    mock_model.return_value.encode.assert_called_once_with(["first", "second"])
+    store.search_many.assert_called_once()
+    assert results == [[{"id": 1, "text": "a", "metadata": {}}], [{"id": 2, "text": "b", "metadata": {}}]]
+    retriever.close()
+
+def test_reciprocal_rank_fusion():
+    """Test that results found by both searches rank first and weights shift the order."""
+    dense = [{"id": 1, "content": "a"}, {"id": 2, "content": "b"}, {"id": 3, "content": "c"}]
+    sparse = [{"id": 3, "content": "c"}, {"id": 4, "content": "d"}]
+
+    fused = reciprocal_rank_fusion([dense, sparse], [1.0, 1.0], top_k=3, k=60)
+    assert [result["id"] for result in fused] == [3, 1, 2]
+    assert fused[0]["score"] == pytest.approx(1 / 63 + 1 / 61)
+
+    keyword_only = reciprocal_rank_fusion([dense, sparse], [0.0, 1.0], top_k=2, k=60)
+    assert [result["id"] for result in keyword_only] == [3, 4]
+
+def test_sparse_query_encoder():
+    """Test that stopwords are dropped, codes stay whole and repeated terms add up."""
+    assert SparseQueryEncoder.tokenize("What is the ERR-42 code in v1.2?") == ["err-42", "code", "v1.2"]
+    vector = SparseQueryEncoder.encode("milvus index milvus")
+    assert vector == {SparseQueryEncoder.token_id("milvus"): 2.0, SparseQueryEncoder.token_id("index"): 1.0}
+    assert SparseQueryEncoder.encode("what is it") == {}
+
+# Also asserted for SparseEncoder in pipelines/tests/test_pipeline.py; ingest and query
+# vectors only match while both encoders produce these dimensions.
+SPARSE_PARITY_TEXT = "Restart Milvus after ERR-1042 in v2.5 of snake_case"
+SPARSE_PARITY_IDS = {
+    "restart": 1846618126, "milvus": 2110922686, "after": 53734573,
+    "err-1042": 1352077437, "v2.5": 1887635492, "snake_case": 1961520350,
+}
+
+def test_sparse_query_encoder_matches_pipeline_token_ids():
+    """Test that tokens and dimensions match the ones pinned for the pipeline's document encoder."""
+    tokens = SparseQueryEncoder.tokenize(SPARSE_PARITY_TEXT)
+    assert tokens == list(SPARSE_PARITY_IDS)
+    assert {token: SparseQueryEncoder.token_id(token) for token in tokens} == SPARSE_PARITY_IDS
+    assert set(SparseQueryEncoder.encode(SPARSE_PARITY_TEXT)) == set(SPARSE_PARITY_IDS.values())
+
+def test_hybrid_search_fuses_dense_and_keyword_results():
+    """Test that hybrid retrieval fuses both searches and stopword-only queries use dense alone."""
+    store = Mock()
+    store.supports_field.return_value = True
+    def search_many(vectors, top_k, search_field="embedding"):
+        if search_field == "embedding":
+            return [[{"id": 1}, {"id": 2}] for _ in vectors]
+        return [[{"id": 2}, {"id": 3}] for _ in vectors]
+    store.search_many.side_effect = search_many
+    with patch("tools.SentenceTransformer"):
+        retriever = ContextRetriever(retrieval_mode="hybrid", rerank_model="", vector_store=store)
+
+    results = retriever._search(["milvus index", "what is it"], [[0.0], [0.0]], top_k=2)
+
+    sparse_call = [call for call in store.search_many.call_args_list if call.kwargs.get("search_field")]
+    assert len(sparse_call) == 1 and len(sparse_call[0].args[0]) == 1
+    assert [result["id"] for result in results[0]] == [2, 1]
+    assert [result["id"] for result in results[1]] == [1, 2]
+    retriever.close()
+
+class FakeCrossEncoder:
+    """Scores a pair by the number in its text and takes ``pair_ms`` of a fake clock per pair."""
+
+    def __init__(self, clock, pair_ms=10, fail_on_call=None):
+        self.clock = clock
+        self.pair_ms = pair_ms
+        self.fail_on_call = fail_on_call
+        self.batches = []
+
+    def predict(self, pairs, batch_size):
+        self.batches.append([text for _, text in pairs])
+        if len(self.batches) == self.fail_on_call:
+            raise RuntimeError("model failed")
+        self.clock[0] += self.pair_ms * len(pairs) / 1000
+        return [float(text.split()[-1]) for _, text in pairs]
+
+def rerank_items(scores):
+    return [{"id": i, "text": f"chunk {score}"} for i, score in enumerate(scores)]
+
+@pytest.fixture
+def fake_clock():
+    clock = [0.0]
+    with patch("tools.time.monotonic", side_effect=lambda: clock[0]):
+        yield clock
+
+def test_reranker_orders_by_score_and_probes_first(fake_clock):
+    """Test that the first batch is a small probe and later batches are sized from its cost."""
+    reranker = Reranker("model", batch_size=4, budget_ms=1000)
+    reranker.model = FakeCrossEncoder(fake_clock)
+
+    results = reranker.rerank("query", rerank_items([1, 5, 3, 4, 2, 6]), top_k=3)
+
+    assert [len(batch) for batch in reranker.model.batches] == [Reranker.PROBE_SIZE, 4]
+    assert [result["id"] for result in results] == [5, 1, 3]
+    assert results[0]["rerank_score"] == 6
+    assert reranker.pair_ms == pytest.approx(10)
+
+def test_reranker_keeps_partial_scores_within_budget(fake_clock):
+    """Test that no batch starts past the budget and the scored candidates still rank first."""
+    reranker = Reranker("model", batch_size=8, budget_ms=45)
+    reranker.model = FakeCrossEncoder(fake_clock)
+    items = rerank_items([1, 3, 2, 5, 9, 8])
+
+    results = reranker.rerank("query", items, top_k=6)
+
+    assert [len(batch) for batch in reranker.model.batches] == [2, 2]
+    assert [result["id"] for result in results] == [3, 1, 2, 0, 4, 5]
+    assert "rerank_score" not in results[4]
+
+    # Scores of the first call are cached, so the next call only scores the rest
+    reranker.budget_ms = 1000
+    assert [result["id"] for result in reranker.rerank("query ", items, top_k=2)] == [4, 5]
+    assert reranker.model.batches[2:] == [["chunk 9", "chunk 8"]]
+
+def test_reranker_keeps_scores_when_the_model_fails(fake_clock):
+    """Test that a model error keeps the scores computed before it."""
+    reranker = Reranker("model", batch_size=2, budget_ms=1000)
+    reranker.model = FakeCrossEncoder(fake_clock, fail_on_call=2)
+
+    results = reranker.rerank("query", rerank_items([1, 2, 3, 4]), top_k=4)
+    assert [result["id"] for result in results] == [1, 0, 2, 3]
+
+def test_context_retriever_is_created_lazily():
+    """Test that the retriever is created on first use, shared, and released on close."""
+    with patch("tools.ContextRetriever") as mock_retriever:
+        assert tools._context_retriever is None
+        retriever = get_context_retriever()
+        assert get_context_retriever() is retriever
+        mock_retriever.assert_called_once()
+
+        close_context_retriever()
+        retriever.close.assert_called_once()
+        assert tools._context_retriever is None
+        close_context_retriever()
+
+def test_embedding_executor_survives_cancelled_async_waiters():
+    """Test that timing out one async waiter of a batch leaves the others and the worker intact."""
+    release = threading.Event()
+    def encode(texts):
+        release.wait(5)
+        return np.ones((len(texts), 4))
+    _, executor = make_executor(encode, window_ms=100, max_batch_size=4)
+
+    async def retrieve():
+        # One query times out while its batch is still collecting, one while it is being encoded
+        early = asyncio.wait_for(asyncio.wrap_future(executor.submit("early")), 0.01)
+        late = asyncio.wait_for(asyncio.wrap_future(executor.submit("late")), 0.3)
+        kept = asyncio.wrap_future(executor.submit("kept"))
+        asyncio.get_running_loop().call_later(0.5, release.set)
+        return await asyncio.gather(early, late, kept, return_exceptions=True)
+
+    early, late, kept = asyncio.run(retrieve())
+    assert isinstance(early, asyncio.TimeoutError) and isinstance(late, asyncio.TimeoutError)
+    assert kept.shape == (4,)
+    assert executor.embed("next", timeout=5).shape == (4,)
+    executor.close()
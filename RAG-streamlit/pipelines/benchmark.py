@@ -0,0 +1,202 @@
+import argparse
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, connections, utility
+from pymilvus.exceptions import MilvusException
+
+from pipeline import (
+    ConfigError,
+    MilvusError,
+    ModelRegistry,
+    load_config,
+    parse_index_config,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Index configurations compared when config.yaml has no benchmark section
+DEFAULT_CONFIGURATIONS = [
+    {"type": "HNSW", "params": {"M": 16, "efConstruction": 200}, "search_params": {"ef": 64}},
+    {"type": "IVF_FLAT", "params": {"nlist": 1024}, "search_params": {"nprobe": 16}},
+    {"type": "IVF_SQ8", "params": {"nlist": 1024}, "search_params": {"nprobe": 16}},
+    {"type": "IVF_PQ", "params": {"nlist": 1024, "m": 48, "nbits": 8}, "search_params": {"nprobe": 16}},
+    {"type": "DISKANN", "params": {}, "search_params": {"search_list": 100}},
+]
+
+def brute_force_top_k(corpus: np.ndarray, queries: np.ndarray, k: int, metric_type: str) -> np.ndarray:
+    """Exact top-k corpus row indices for every query under the given metric."""
+    corpus = corpus.astype(np.float32)
+    queries = queries.astype(np.float32)
+    if metric_type == "COSINE":
+        corpus = corpus / np.maximum(np.linalg.norm(corpus, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    if metric_type == "L2":
+        # Smaller distance is better; ||c||^2 - 2 q.c ranks like ||q - c||^2
+        scores = -(np.sum(corpus ** 2, axis=1)[None, :] - 2 * queries @ corpus.T)
+    else:
+        scores = queries @ corpus.T
+    k = min(k, corpus.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+def recall_at_k(results: List[List[int]], ground_truth: np.ndarray, k: int) -> float:
+    """Mean fraction of the exact top-k neighbours found in each result list."""
+    if not results:
+        return 0.0
+    hits = sum(len(set(found[:k]) & set(truth[:k].tolist())) for found, truth in zip(results, ground_truth))
+    return hits / (len(results) * min(k, ground_truth.shape[1]))
+
+def percentile_ms(latencies: List[float], percentile: float) -> float:
+    return float(np.percentile(np.array(latencies) * 1000, percentile)) if latencies else 0.0
+
+def load_corpus(collection_name: str, field_name: str, limit: Optional[int]) -> np.ndarray:
+    """Read the embeddings of the real corpus out of the ingested collection."""
+    collection = Collection(name=collection_name)
+    collection.load()
+    iterator = collection.query_iterator(batch_size=1000, limit=limit or -1, output_fields=[field_name])
+    vectors = []
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            vectors.extend(row[field_name] for row in batch)
+    finally:
+        iterator.close()
+    return np.asarray(vectors, dtype=np.float32)
+
+def create_bench_collection(name: str, field_name: str, corpus: np.ndarray) -> Collection:
+    """Copy the corpus into a scratch collection whose IDs are the corpus row numbers."""
+    if utility.has_collection(name):
+        utility.drop_collection(name)
+    schema = CollectionSchema(fields=[
+        FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=False),
+        FieldSchema(name=field_name, dtype=DataType.FLOAT_VECTOR, dim=corpus.shape[1]),
+    ], description="Scratch collection for index benchmarks")
+    collection = Collection(name=name, schema=schema)
+    for start in range(0, len(corpus), 5000):
+        rows = corpus[start:start + 5000]
+        collection.insert([list(range(start, start + len(rows))), rows.tolist()])
+    collection.flush()
+    return collection
+
+def benchmark_configuration(collection: Collection, field_name: str, index: Dict[str, Any],
+                            queries: np.ndarray, ground_truth: np.ndarray, k: int,
+                            warmup: int = 10) -> Dict[str, Any]:
+    """Build one index configuration and measure recall@k and per-query latency."""
+    collection.release()
+    if collection.has_index():
+        collection.drop_index()
+    start = time.perf_counter()
+    collection.create_index(field_name=field_name, index_params={
+        "index_type": index["type"], "metric_type": index["metric_type"], "params": index["params"]
+    })
+    utility.wait_for_index_building_complete(collection.name)
+    build_seconds = time.perf_counter() - start
+    collection.load()
+
+    search_params = {"metric_type": index["metric_type"], "params": index["search_params"]}
+    for query in queries[:warmup]:
+        collection.search(data=[query.tolist()], anns_field=field_name, param=search_params, limit=k)
+
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = collection.search(data=[query.tolist()], anns_field=field_name,
+                                 param=search_params, limit=k)
+        latencies.append(time.perf_counter() - start)
+        results.append([hit.id for hit in hits[0]])
+
+    return {
+        "index": index["type"],
+        "params": index["params"],
+        "search_params": index["search_params"],
+        "build_seconds": round(build_seconds, 2),
+        f"recall@{k}": round(recall_at_k(results, ground_truth, k), 4),
+        "p50_ms": round(percentile_ms(latencies, 50), 2),
+        "p99_ms": round(percentile_ms(latencies, 99), 2),
+    }
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compare Milvus index configurations on the ingested corpus.")
+    parser.add_argument("--config", default="config.yaml", help="Path to the pipeline config file")
+    parser.add_argument("--k", type=int, default=10, help="Number of neighbours per query")
+    parser.add_argument("--queries", type=int, default=500,
+                        help="Number of corpus chunks sampled as queries")
+    parser.add_argument("--query-file", default=None,
+                        help="Text file with one real question per line, embedded with the pipeline model")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Only benchmark the first N vectors of the corpus")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for sampling queries")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    bench_collection = None
+    try:
+        config = load_config(args.config)
+        connections.connect("default", host=config.milvus_host, port=config.milvus_port)
+        field_name = config.index["field"]
+
+        corpus = load_corpus(config.collection_name, field_name, args.limit)
+        if not len(corpus):
+            raise MilvusError(f"Collection {config.collection_name} is empty; run the pipeline first")
+        logger.info(f"Loaded {len(corpus)} vectors from {config.collection_name}")
+
+        if args.query_file:
+            with open(args.query_file, "r", encoding="utf-8") as f:
+                questions = [line.strip() for line in f if line.strip()]
+            model = ModelRegistry().sentence_transformer(config.embedding_model, config.device)
+            queries = np.asarray(model.encode(questions, convert_to_numpy=True), dtype=np.float32)
+        else:
+            rng = np.random.default_rng(args.seed)
+            sample = rng.choice(len(corpus), size=min(args.queries, len(corpus)), replace=False)
+            queries = corpus[sample]
+
+        bench_collection = create_bench_collection(f"{config.collection_name}_bench", field_name, corpus)
+        configurations = config.benchmark_configurations or DEFAULT_CONFIGURATIONS
+        ground_truth: Dict[str, np.ndarray] = {}
+        rows = []
+        for configuration in configurations:
+            # Every configuration is compared under the metric the collection is served with
+            index = parse_index_config({"metric_type": config.index["metric_type"], **configuration})
+            metric = index["metric_type"]
+            if metric not in ground_truth:
+                ground_truth[metric] = brute_force_top_k(corpus, queries, args.k, metric)
+            try:
+                row = benchmark_configuration(bench_collection, field_name, index, queries,
+                                              ground_truth[metric], args.k)
+            except MilvusException as e:
+                logger.error(f"Benchmark of {index['type']} failed: {str(e)}")
+                continue
+            logger.info(f"{row}")
+            rows.append(row)
+
+        print(f"\n{'index':<10} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p99 ms':>8} "
+              f"{'build s':>8}  params / search_params")
+        for row in rows:
+            print(f"{row['index']:<10} {row[f'recall@{args.k}']:>10.4f} {row['p50_ms']:>8.2f} "
+                  f"{row['p99_ms']:>8.2f} {row['build_seconds']:>8.2f}  "
+                  f"{row['params']} / {row['search_params']}")
+    except ConfigError as e:
+        logger.error(f"Configuration error: {str(e)}")
+        exit(1)
+    except (MilvusError, MilvusException) as e:
+        logger.error(f"Milvus error: {str(e)}")
+        exit(1)
+    finally:
+        try:
+            if bench_collection is not None:
+                utility.drop_collection(bench_collection.name)
+            connections.disconnect("default")
+        except:
+            pass
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,20 @@
 import yaml
 import os
+import json
+import hashlib
+import argparse
+import resource
+import threading
+import time
+import multiprocessing
+from collections import deque
+from contextlib import contextmanager
+from queue import Queue, Empty, Full
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Callable, Optional, Iterable, Iterator, Tuple, Union
 from pymilvus import connections, Collection, utility, FieldSchema, CollectionSchema, DataType
 from pymilvus.exceptions import MilvusException
 from sentence_transformers import SentenceTransformer
@@ -12,9 +24,11 @@ import markdown
 import frontmatter
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 import re
+import numpy as np
+from vector_store import EmbeddedVectorStore, VectorStoreError
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -32,6 +46,79 @@ class ModelError(Exception):
     """Custom exception for model-related errors."""
     pass
 
+SUPPORTED_INDEX_TYPES = ("HNSW", "IVF_FLAT", "IVF_SQ8", "IVF_PQ", "DISKANN")
+SUPPORTED_METRIC_TYPES = ("L2", "IP", "COSINE")
+
+# Used when config.yaml has no index section; matches what the pipeline always built before
+DEFAULT_INDEX = {
+    "field": "embedding",
+    "type": "IVF_FLAT",
+    "metric_type": "L2",
+    "params": {"nlist": 128},
+    "search_params": {"nprobe": 10},
+}
+
+# Used when config.yaml has a sparse section without some of these keys
+DEFAULT_SPARSE = {
+    "field": "sparse_embedding",
+    "k1": 1.2,
+    "b": 0.75,
+    "avg_doc_length": 80,
+    "index_type": "SPARSE_INVERTED_INDEX",
+    "keyword_boost": 1.0,
+}
+
+def parse_sparse_config(sparse_dict: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Validate a ``sparse`` config section; returns None when keyword vectors are disabled."""
+    if not sparse_dict:
+        return None
+    sparse = {**DEFAULT_SPARSE, **sparse_dict}
+    for key in ("k1", "avg_doc_length"):
+        if not isinstance(sparse[key], (int, float)) or sparse[key] <= 0:
+            raise ConfigError(f"sparse {key} must be a positive number")
+    if not isinstance(sparse["b"], (int, float)) or not 0 <= sparse["b"] <= 1:
+        raise ConfigError("sparse b must be between 0 and 1")
+    if not isinstance(sparse["keyword_boost"], (int, float)) or sparse["keyword_boost"] < 0:
+        raise ConfigError("sparse keyword_boost must be a non-negative number")
+    sparse["index_type"] = str(sparse["index_type"]).upper()
+    if sparse["index_type"] not in ("SPARSE_INVERTED_INDEX", "SPARSE_WAND"):
+        raise ConfigError("sparse index_type must be SPARSE_INVERTED_INDEX or SPARSE_WAND")
+    return sparse
+
+SUPPORTED_VECTOR_STORES = ("milvus", "embedded")
+
+def parse_vector_store_config(store_dict: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Validate a ``vector_store`` config section; Milvus is used when it is missing."""
+    store = {"type": "milvus", **(store_dict or {})}
+    store["type"] = str(store["type"]).lower()
+    if store["type"] not in SUPPORTED_VECTOR_STORES:
+        raise ConfigError(f"vector_store type must be one of {', '.join(SUPPORTED_VECTOR_STORES)}")
+    if store["type"] == "embedded":
+        if not store.get("path"):
+            raise ConfigError("vector_store path is required for the embedded store")
+        if store.get("hnsw") is not None and not isinstance(store["hnsw"], dict):
+            raise ConfigError("vector_store hnsw must be a mapping")
+    return store
+
+def parse_index_config(index_dict: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Validate an ``index`` config section and fill in defaults."""
+    index = dict(DEFAULT_INDEX)
+    if index_dict:
+        index.update(index_dict)
+    index["type"] = str(index["type"]).upper()
+    index["metric_type"] = str(index["metric_type"]).upper()
+    # Parameters of the default index type do not apply to another type
+    if index_dict and index["type"] != DEFAULT_INDEX["type"]:
+        index["params"] = index_dict.get("params", {})
+        index["search_params"] = index_dict.get("search_params", {})
+    if index["type"] not in SUPPORTED_INDEX_TYPES:
+        raise ConfigError(f"index type must be one of {', '.join(SUPPORTED_INDEX_TYPES)}")
+    if index["metric_type"] not in SUPPORTED_METRIC_TYPES:
+        raise ConfigError(f"index metric_type must be one of {', '.join(SUPPORTED_METRIC_TYPES)}")
+    if not isinstance(index["params"], dict) or not isinstance(index["search_params"], dict):
+        raise ConfigError("index params and search_params must be mappings")
+    return index
+
 @dataclass
 class Config:
     """Configuration class with validation."""
@@ -44,6 +131,23 @@ class Config:
     milvus_port: str
     collection_name: str
     collection_schema: Dict[str, Any]
+    manifest_path: Optional[str] = None
+    embedding_batch_size: int = 256
+    workers: int = 1
+    ordered_results: bool = True
+    device: Optional[str] = None
+    queue_size: int = 4
+    insert_batch_rows: int = 5000
+    insert_batch_bytes: int = 64 * 1024 * 1024
+    flush_interval_seconds: Optional[float] = None
+    compact_threshold_rows: Optional[int] = 100000
+    embedding_cache_dir: Optional[str] = None
+    embedding_cache_max_entries: int = 1000000
+    embedding_cache_dtype: str = "float32"
+    index: Dict[str, Any] = field(default_factory=lambda: dict(DEFAULT_INDEX))
+    benchmark_configurations: List[Dict[str, Any]] = field(default_factory=list)
+    sparse: Optional[Dict[str, Any]] = None
+    vector_store: Dict[str, Any] = field(default_factory=lambda: {"type": "milvus"})
 
     @classmethod
     def from_dict(cls, config_dict: Dict[str, Any]) -> 'Config':
@@ -63,6 +167,36 @@ class Config:
                 raise ConfigError("chunk_size must be a positive integer")
             if not isinstance(config_dict['chunk_overlap'], int) or config_dict['chunk_overlap'] < 0:
                 raise ConfigError("chunk_overlap must be a non-negative integer")
+            if config_dict['chunk_overlap'] >= config_dict['chunk_size']:
+                raise ConfigError("chunk_overlap must be smaller than chunk_size")
+            embedding_batch_size = config_dict.get('embedding_batch_size', 256)
+            if not isinstance(embedding_batch_size, int) or embedding_batch_size <= 0:
+                raise ConfigError("embedding_batch_size must be a positive integer")
+            queue_size = config_dict.get('queue_size', 4)
+            if not isinstance(queue_size, int) or queue_size <= 0:
+                raise ConfigError("queue_size must be a positive integer")
+            insert_batch_rows = config_dict.get('insert_batch_rows', 5000)
+            if not isinstance(insert_batch_rows, int) or insert_batch_rows <= 0:
+                raise ConfigError("insert_batch_rows must be a positive integer")
+            insert_batch_bytes = config_dict.get('insert_batch_bytes', 64 * 1024 * 1024)
+            if not isinstance(insert_batch_bytes, int) or insert_batch_bytes <= 0:
+                raise ConfigError("insert_batch_bytes must be a positive integer")
+            flush_interval_seconds = config_dict.get('flush_interval_seconds')
+            if flush_interval_seconds is not None and (
+                    not isinstance(flush_interval_seconds, (int, float)) or flush_interval_seconds <= 0):
+                raise ConfigError("flush_interval_seconds must be a positive number")
+            embedding_cache_max_entries = config_dict.get('embedding_cache_max_entries', 1000000)
+            if not isinstance(embedding_cache_max_entries, int) or embedding_cache_max_entries <= 0:
+                raise ConfigError("embedding_cache_max_entries must be a positive integer")
+            embedding_cache_dtype = config_dict.get('embedding_cache_dtype', 'float32')
+            if embedding_cache_dtype not in ('float32', 'float16'):
+                raise ConfigError("embedding_cache_dtype must be float32 or float16")
+            benchmark_configurations = (config_dict.get('benchmark') or {}).get('configurations', [])
+            for configuration in benchmark_configurations:
+                parse_index_config(configuration)
+            workers = config_dict.get('workers', 1)
+            if not isinstance(workers, int) or workers <= 0:
+                raise ConfigError("workers must be a positive integer")
 
             # Validate markdown folder exists
             if not os.path.exists(config_dict['markdown_folder']):
@@ -71,6 +205,13 @@ class Config:
             # Validate collection schema
             if 'schema' not in config_dict['collection']:
                 raise ConfigError("collection schema is missing")
+            sparse = parse_sparse_config(config_dict.get('sparse'))
+            if sparse and not any(
+                    field_config.get('name') == sparse['field']
+                    and field_config.get('data_type') == 'SPARSE_FLOAT_VECTOR'
+                    for field_config in config_dict['collection']['schema'].get('fields', [])):
+                raise ConfigError(f"sparse field {sparse['field']} must be a SPARSE_FLOAT_VECTOR "
+                                  f"field of the collection schema")
 
             return cls(
                 embedding_model=config_dict['embedding_model'],
@@ -81,25 +222,509 @@ class Config:
                 milvus_host=config_dict['milvus']['host'],
                 milvus_port=str(config_dict['milvus']['port']),
                 collection_name=config_dict['collection']['name'],
-                collection_schema=config_dict['collection']['schema']
+                collection_schema=config_dict['collection']['schema'],
+                manifest_path=config_dict.get('manifest_path'),
+                embedding_batch_size=embedding_batch_size,
+                workers=workers,
+                ordered_results=bool(config_dict.get('ordered_results', True)),
+                device=config_dict.get('device'),
+                queue_size=queue_size,
+                insert_batch_rows=insert_batch_rows,
+                insert_batch_bytes=insert_batch_bytes,
+                flush_interval_seconds=flush_interval_seconds,
+                compact_threshold_rows=config_dict.get('compact_threshold_rows', 100000),
+                embedding_cache_dir=config_dict.get('embedding_cache_dir'),
+                embedding_cache_max_entries=embedding_cache_max_entries,
+                embedding_cache_dtype=embedding_cache_dtype,
+                index=parse_index_config(config_dict.get('index')),
+                benchmark_configurations=benchmark_configurations,
+                sparse=sparse,
+                vector_store=parse_vector_store_config(config_dict.get('vector_store'))
             )
         except Exception as e:
             raise ConfigError(f"Invalid configuration: {str(e)}")
 
+@dataclass
+class IngestStats:
+    """Per-run counters reported by process_documents."""
+    added: int = 0
+    updated: int = 0
+    deleted: int = 0
+    skipped: int = 0
+    failed: int = 0
+    stages: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    embedding_cache: Dict[str, Any] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        return (f"added={self.added} updated={self.updated} deleted={self.deleted} "
+                f"skipped={self.skipped} failed={self.failed}")
+
+class IngestManifest:
+    """Persisted record of ingested files, their content hashes and Milvus chunk IDs."""
+
+    def __init__(self, path: str, entries: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.path = path
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, path: str) -> 'IngestManifest':
+        """Load the manifest from disk, starting empty if it does not exist yet."""
+        if not os.path.exists(path):
+            logger.info(f"No manifest found at {path}, starting a new one")
+            return cls(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(path, json.load(f).get("files", {}))
+        except Exception as e:
+            raise ConfigError(f"Failed to load manifest {path}: {str(e)}")
+
+    def save(self) -> None:
+        """Atomically write the manifest so an interrupted run never leaves it truncated."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def hash_file(file_path: str) -> str:
+        """Return the SHA-256 hex digest of a file's contents."""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def get(self, source: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(source)
+
+    def set(self, source: str, content_hash: str, chunk_ids: List[int]) -> None:
+        self.entries[source] = {"hash": content_hash, "chunk_ids": list(chunk_ids)}
+
+    def remove(self, source: str) -> None:
+        self.entries.pop(source, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def sources(self) -> List[str]:
+        return list(self.entries)
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB (ru_maxrss is KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class ModelRegistry:
+    """Loads each SentenceTransformer once per (name, device) and hands out the shared instance."""
+
+    MODEL_PREFIX = "sentence-transformers/"
+
+    def __init__(self):
+        self._models: Dict[Tuple[str, Optional[str]], SentenceTransformer] = {}
+
+    @classmethod
+    def canonical_name(cls, name: str) -> str:
+        # "all-MiniLM-L6-v2" and "sentence-transformers/all-MiniLM-L6-v2" resolve to the same weights
+        name = name.strip()
+        return name[len(cls.MODEL_PREFIX):] if name.startswith(cls.MODEL_PREFIX) else name
+
+    def sentence_transformer(self, name: str, device: Optional[str] = None) -> SentenceTransformer:
+        key = (self.canonical_name(name), device)
+        if key in self._models:
+            logger.info(f"Reusing loaded model {key[0]} (device={device})")
+            return self._models[key]
+
+        rss_before = _peak_rss_mb()
+        start = time.perf_counter()
+        model = SentenceTransformer(name, device=device)
+        logger.info(
+            f"Loaded model {key[0]} (device={device}) in {time.perf_counter() - start:.2f}s, "
+            f"peak RSS {rss_before:.0f} -> {_peak_rss_mb():.0f} MiB"
+        )
+        self._models[key] = model
+        return model
+
+    def keybert(self, name: str, device: Optional[str] = None) -> KeyBERT:
+        """KeyBERT backed by the shared SentenceTransformer of the same name."""
+        return KeyBERT(model=self.sentence_transformer(name, device))
+
+class EmbeddingCache:
+    """Content-addressed on-disk cache of chunk embeddings for one embedding model.
+
+    Vectors live in a memory-mapped float32 (or float16) array file and are addressed
+    through a compact index of 16-byte keys derived from the model name and chunk text,
+    so a cache hit is a view into the mapped file rather than a copy. The cache holds at
+    most ``max_entries`` vectors; when it is full the least recently used ones are evicted.
+    """
+
+    INDEX_FILE = "index.npz"
+    VECTORS_FILE = "vectors.bin"
+    KEY_BYTES = 16
+
+    def __init__(self, directory: str, model_name: str, max_entries: int = 1000000,
+                 dtype: str = "float32"):
+        if dtype not in ("float32", "float16"):
+            raise ConfigError("embedding cache dtype must be float32 or float16")
+        self.model_name = model_name
+        self.directory = os.path.join(directory, re.sub(r'[^A-Za-z0-9_.-]', '_', model_name))
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._slots: Dict[bytes, int] = {}
+        self._keys = np.zeros((0, self.KEY_BYTES), dtype=np.uint8)
+        self._last_used = np.zeros(0, dtype=np.int64)
+        self._free: List[int] = []
+        self._next_slot = 0
+        self._clock = 0
+        self._vectors: Optional[np.memmap] = None
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, self.INDEX_FILE)
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.directory, self.VECTORS_FILE)
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).digest()[:self.KEY_BYTES]
+
+    def _load(self) -> None:
+        if not os.path.exists(self._index_path):
+            return
+        try:
+            with np.load(self._index_path) as index:
+                if str(index["dtype"]) != self.dtype.name:
+                    logger.warning(f"Embedding cache at {self.directory} uses {index['dtype']}, "
+                                   f"not {self.dtype.name}; starting a new cache")
+                    return
+                self.dim = int(index["dim"])
+                self._keys = index["keys"]
+                self._last_used = index["last_used"]
+                self._clock = int(index["clock"])
+                self._next_slot = int(index["next_slot"])
+            self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r+",
+                                      shape=(len(self._keys), self.dim))
+        except Exception as e:
+            logger.warning(f"Failed to load embedding cache at {self.directory}, "
+                           f"starting a new one: {str(e)}")
+            self.dim, self._vectors, self._next_slot = None, None, 0
+            self._keys = np.zeros((0, self.KEY_BYTES), dtype=np.uint8)
+            self._last_used = np.zeros(0, dtype=np.int64)
+            return
+        for slot in range(self._next_slot):
+            if self._last_used[slot] >= 0:
+                self._slots[self._keys[slot].tobytes()] = slot
+            else:
+                self._free.append(slot)
+        logger.info(f"Loaded embedding cache with {len(self._slots)} vectors from {self.directory}")
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Return the cached vector as a read-only view into the mapped file, if present."""
+        return self.get_many([text])[0]
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        self._clock += 1
+        results: List[Optional[np.ndarray]] = []
+        for text in texts:
+            slot = self._slots.get(self._key(text))
+            if slot is None:
+                self.misses += 1
+                results.append(None)
+                continue
+            self.hits += 1
+            self._last_used[slot] = self._clock
+            vector = self._vectors[slot]
+            vector.flags.writeable = False
+            results.append(vector)
+        return results
+
+    def _grow(self, needed: int) -> None:
+        """Make room for ``needed`` more slots, up to max_entries."""
+        capacity = len(self._keys)
+        if self._next_slot + needed <= capacity:
+            return
+        new_capacity = min(self.max_entries, max(1024, capacity * 2, self._next_slot + needed))
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * self.dtype.itemsize)
+        self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r+",
+                                  shape=(new_capacity, self.dim))
+        self._keys = np.concatenate(
+            [self._keys, np.zeros((new_capacity - capacity, self.KEY_BYTES), dtype=np.uint8)])
+        self._last_used = np.concatenate(
+            [self._last_used, np.full(new_capacity - capacity, -1, dtype=np.int64)])
+
+    def _evict(self, needed: int) -> None:
+        """Free the least recently used slots so ``needed`` new vectors fit."""
+        overflow = len(self._slots) + needed - self.max_entries
+        if overflow <= 0:
+            return
+        # Evict a little extra so a full cache does not evict on every batch
+        count = min(len(self._slots), overflow + self.max_entries // 10)
+        if count <= 0:
+            return
+        occupied = np.flatnonzero(self._last_used[:self._next_slot] >= 0)
+        victims = occupied[np.argpartition(self._last_used[occupied], count - 1)[:count]]
+        for slot in victims:
+            del self._slots[self._keys[slot].tobytes()]
+            self._last_used[slot] = -1
+            self._free.append(int(slot))
+        self.evictions += len(victims)
+
+    def put_many(self, texts: List[str], vectors: np.ndarray) -> None:
+        """Store vectors for texts; only the last ``max_entries`` are kept if more are given."""
+        texts, vectors = texts[-self.max_entries:], vectors[-self.max_entries:]
+        if not texts:
+            return
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+        elif vectors.shape[1] != self.dim:
+            raise ModelError(f"Embedding cache expects {self.dim}-dim vectors, got {vectors.shape[1]}")
+
+        self._clock += 1
+        keys = [self._key(text) for text in texts]
+        new_keys = len({key for key in keys if key not in self._slots})
+        self._evict(new_keys)
+        self._grow(max(0, new_keys - len(self._free)))
+        for key, vector in zip(keys, vectors):
+            slot = self._slots.get(key)
+            if slot is None:
+                if self._free:
+                    slot = self._free.pop()
+                else:
+                    slot = self._next_slot
+                    self._next_slot += 1
+                self._slots[key] = slot
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+            self._vectors[slot] = vector
+            self._last_used[slot] = self._clock
+
+    def save(self) -> None:
+        """Flush the vectors and atomically rewrite the index."""
+        if self._vectors is None:
+            return
+        self._vectors.flush()
+        tmp_path = os.path.join(self.directory, "index.tmp.npz")
+        np.savez(tmp_path, keys=self._keys, last_used=self._last_used, dim=self.dim,
+                 dtype=self.dtype.name, clock=self._clock, next_slot=self._next_slot)
+        os.replace(tmp_path, self._index_path)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._slots),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+class BatchEmbedder:
+    """Embeds chunks gathered from many files in large, length-sorted batches.
+
+    With an ``EmbeddingCache`` only chunks missing from the cache are encoded.
+    """
+
+    def __init__(self, model: SentenceTransformer, batch_size: int = 256,
+                 cache: Optional[EmbeddingCache] = None):
+        self.model = model
+        self.batch_size = batch_size
+        self.cache = cache
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        # Sorting by length keeps similarly sized chunks together and cuts padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = None
+        for start in range(0, len(order), self.batch_size):
+            batch_ids = order[start:start + self.batch_size]
+            encoded = np.asarray(self.model.encode(
+                [texts[i] for i in batch_ids],
+                batch_size=self.batch_size,
+                convert_to_numpy=True
+            ), dtype=np.float32)
+            if vectors is None:
+                vectors = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+            vectors[batch_ids] = encoded
+        return vectors
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Return one embedding row per text, in the order the texts were given."""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        if self.cache is None:
+            return self._encode(texts)
+
+        cached = self.cache.get_many(texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        encoded = self._encode([texts[i] for i in missing]) if missing else None
+        dim = encoded.shape[1] if encoded is not None else cached[0].shape[0]
+        vectors = np.empty((len(texts), dim), dtype=np.float32)
+        for i, vector in enumerate(cached):
+            if vector is not None:
+                vectors[i] = vector
+        if missing:
+            vectors[missing] = encoded
+            self.cache.put_many([texts[i] for i in missing], encoded)
+        return vectors
+
+    def embed_files(self, files: List[List[str]]) -> List[np.ndarray]:
+        """Embed the chunks of many files in one pass and split the vectors back per file."""
+        texts = [chunk for chunks in files for chunk in chunks]
+        vectors = self.embed(texts)
+        result, offset = [], 0
+        for chunks in files:
+            result.append(vectors[offset:offset + len(chunks)])
+            offset += len(chunks)
+        return result
+
+class KeywordExtractor:
+    """Extracts KeyBERT keywords for whole batches of chunks.
+
+    KeyBERT fits one vocabulary over the batch and embeds all candidate n-grams in a
+    single call. When the keyword model is the embedding model, the chunk embeddings
+    that were already computed are passed in as document embeddings instead of being
+    encoded a second time.
+    """
+
+    def __init__(self, model: KeyBERT, keyphrase_ngram_range: Tuple[int, int] = (1, 3),
+                 reuse_embeddings: bool = True):
+        self.model = model
+        self.keyphrase_ngram_range = keyphrase_ngram_range
+        self.reuse_embeddings = reuse_embeddings
+
+    def extract(self, texts: List[str], embeddings: Optional[np.ndarray] = None) -> List[List[str]]:
+        """Return the keywords of each text, in the order the texts were given."""
+        if not texts:
+            return []
+        doc_embeddings = None
+        if self.reuse_embeddings and embeddings is not None:
+            doc_embeddings = np.asarray(embeddings, dtype=np.float32)
+        results = self.model.extract_keywords(
+            texts,
+            keyphrase_ngram_range=self.keyphrase_ngram_range,
+            doc_embeddings=doc_embeddings
+        )
+        # KeyBERT unwraps single-document results and returns [] when the batch has no vocabulary
+        if not results:
+            return [[] for _ in texts]
+        if len(texts) == 1:
+            results = [results]
+        return [[keyword for keyword, _ in keywords] for keywords in results]
+
+class SparseEncoder:
+    """Builds TF-saturated, hashed sparse keyword vectors for hybrid retrieval.
+
+    Tokens are hashed into sparse dimensions, so no vocabulary has to be kept in sync
+    between ingestion and the backend. Document weights use BM25's term-frequency
+    saturation and length normalization but no IDF, since that would need corpus-wide
+    document frequencies; KeyBERT keywords add ``keyword_boost`` to the frequency of
+    their tokens. The backend's query encoder in tools.py must use the same tokenizer
+    and hash; both test suites pin the dimensions of the same sample text.
+    """
+
+    TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._\-][a-z0-9]+)*")
+    STOPWORDS = frozenset((
+        "a an and are as at be but by for from has have how i if in into is it its of on or "
+        "that the their then there these this to was we what when where which who will with "
+        "you your"
+    ).split())
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, avg_doc_length: float = 80,
+                 keyword_boost: float = 1.0):
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = avg_doc_length
+        self.keyword_boost = keyword_boost
+
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        """Lowercase word tokens; dotted, dashed and underscored codes stay whole."""
+        return [token for token in cls.TOKEN_PATTERN.findall(text.lower()) if token not in cls.STOPWORDS]
+
+    @staticmethod
+    def token_id(token: str) -> int:
+        """Sparse dimension of a token."""
+        return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(),
+                              "little") & 0x7FFFFFFF
+
+    def encode_document(self, text: str, keywords: Iterable[str] = ()) -> Dict[int, float]:
+        """Sparse vector of one chunk."""
+        tokens = self.tokenize(text)
+        frequencies: Dict[int, float] = {}
+        for token in tokens:
+            dim = self.token_id(token)
+            frequencies[dim] = frequencies.get(dim, 0.0) + 1.0
+        for keyword in keywords:
+            for token in self.tokenize(keyword):
+                dim = self.token_id(token)
+                frequencies[dim] = frequencies.get(dim, 0.0) + self.keyword_boost
+        norm = self.k1 * (1 - self.b + self.b * len(tokens) / self.avg_doc_length)
+        return {dim: tf * (self.k1 + 1) / (tf + norm) for dim, tf in frequencies.items() if tf > 0}
+
+    def encode_documents(self, texts: List[str],
+                         keywords_list: Optional[List[List[str]]] = None) -> List[Dict[int, float]]:
+        keywords_list = keywords_list or [[] for _ in texts]
+        return [self.encode_document(text, keywords) for text, keywords in zip(texts, keywords_list)]
+
 class MilvusConnector:
-    def __init__(self, config: Config):
+    """Loads the models and writes to the vector store selected by ``config.vector_store``.
+
+    The store is a Milvus collection by default, or an ``EmbeddedVectorStore`` directory
+    when ``vector_store.type`` is ``embedded``.
+    """
+
+    def __init__(self, config: Config, model_registry: Optional[ModelRegistry] = None):
         self.config = config
+        self.model_registry = model_registry or ModelRegistry()
         try:
             # Initialize models
             logger.info(f"Loading embedding model: {config.embedding_model}")
-            self.embedding_model = SentenceTransformer(config.embedding_model)
+            self.embedding_model = self.model_registry.sentence_transformer(
+                config.embedding_model, config.device
+            )
             
             logger.info(f"Loading keyword model: {config.keyword_model}")
-            self.keyword_model = KeyBERT(config.keyword_model)
+            self.keyword_model = self.model_registry.keybert(config.keyword_model, config.device)
+
+            embedding_cache = None
+            if config.embedding_cache_dir:
+                embedding_cache = EmbeddingCache(
+                    config.embedding_cache_dir,
+                    ModelRegistry.canonical_name(config.embedding_model),
+                    max_entries=config.embedding_cache_max_entries,
+                    dtype=config.embedding_cache_dtype
+                )
+            self.embedder = BatchEmbedder(self.embedding_model, config.embedding_batch_size,
+                                          cache=embedding_cache)
+            self.keyword_extractor = KeywordExtractor(
+                self.keyword_model,
+                reuse_embeddings=(ModelRegistry.canonical_name(config.keyword_model)
+                                  == ModelRegistry.canonical_name(config.embedding_model))
+            )
+            self.sparse_encoder = None
+            if config.sparse:
+                self.sparse_encoder = SparseEncoder(
+                    k1=config.sparse["k1"], b=config.sparse["b"],
+                    avg_doc_length=config.sparse["avg_doc_length"],
+                    keyword_boost=config.sparse["keyword_boost"]
+                )
             
-            # Connect to Milvus
-            logger.info(f"Connecting to Milvus at {config.milvus_host}:{config.milvus_port}")
-            connections.connect("default", host=config.milvus_host, port=config.milvus_port)
+            # The embedded store is opened by ensure_collection_exists
+            self.vector_store: Optional[EmbeddedVectorStore] = None
+            if not self.embedded:
+                # Connect to Milvus
+                logger.info(f"Connecting to Milvus at {config.milvus_host}:{config.milvus_port}")
+                connections.connect("default", host=config.milvus_host, port=config.milvus_port)
         except Exception as e:
             raise ModelError(f"Failed to initialize models or connect to Milvus: {str(e)}")
 
@@ -145,13 +770,89 @@ class MilvusConnector:
         except Exception as e:
             raise ConfigError(f"Invalid collection schema: {str(e)}")
 
-    def ensure_collection_exists(self) -> None:
-        """Ensure collection exists with correct schema."""
+    def index_params(self) -> Dict[str, Any]:
+        """Milvus index parameters built from the ``index`` section of the config."""
+        return {
+            "index_type": self.config.index["type"],
+            "metric_type": self.config.index["metric_type"],
+            "params": self.config.index["params"],
+        }
+
+    def _ensure_index(self, collection: Collection) -> None:
+        """Build the configured vector index, replacing an index built with other settings."""
+        field_name = self.config.index["field"]
+        wanted = self.index_params()
+        for index in collection.indexes:
+            if index.field_name != field_name:
+                continue
+            existing = dict(index.params)
+            existing_params = existing.get("params", {})
+            if isinstance(existing_params, str):
+                existing_params = json.loads(existing_params)
+            if (existing.get("index_type") == wanted["index_type"]
+                    and existing.get("metric_type") == wanted["metric_type"]
+                    and {k: str(v) for k, v in existing_params.items()}
+                    == {k: str(v) for k, v in wanted["params"].items()}):
+                return
+            logger.warning(f"Index on {field_name} is {existing}, rebuilding as {wanted}")
+            collection.release()
+            collection.drop_index()
+            break
+        logger.info(f"Creating {wanted['index_type']} index on {field_name} "
+                    f"with metric {wanted['metric_type']}")
+        collection.create_index(field_name=field_name, index_params=wanted)
+
+    def _ensure_sparse_index(self, collection: Collection) -> None:
+        """Build the inverted index searched by hybrid retrieval on the sparse field."""
+        if not self.config.sparse:
+            return
+        field_name = self.config.sparse["field"]
+        if any(index.field_name == field_name for index in collection.indexes):
+            return
+        logger.info(f"Creating {self.config.sparse['index_type']} index on {field_name}")
+        collection.create_index(field_name=field_name, index_params={
+            "index_type": self.config.sparse["index_type"],
+            "metric_type": "IP",
+            "params": {"drop_ratio_build": 0.0},
+        })
+
+    @property
+    def embedded(self) -> bool:
+        return self.config.vector_store["type"] == "embedded"
+
+    def _open_vector_store(self) -> EmbeddedVectorStore:
+        """Open (or create) the embedded store for the configured embedding field."""
+        if self.vector_store is None:
+            field_name = self.config.index["field"]
+            dims = [field_config.get("dim") for field_config in self.config.collection_schema["fields"]
+                    if field_config["name"] == field_name]
+            if not dims or not dims[0]:
+                raise ConfigError(f"collection schema has no dimension for vector field {field_name}")
+            try:
+                self.vector_store = EmbeddedVectorStore(
+                    self.config.vector_store["path"], dims[0],
+                    metric_type=self.config.index["metric_type"],
+                    hnsw=self.config.vector_store.get("hnsw")
+                )
+            except (VectorStoreError, OSError) as e:
+                raise MilvusError(f"Failed to open vector store: {str(e)}")
+            logger.info(f"Opened embedded vector store at {self.config.vector_store['path']} "
+                        f"with {self.vector_store.live_rows} rows")
+        return self.vector_store
+
+    def ensure_collection_exists(self) -> bool:
+        """Ensure collection exists with correct schema and vector index.
+
+        Returns:
+            True if the collection was created or recreated empty (for the embedded store:
+            if it holds no rows), so nothing previously ingested is in it any more
+        """
+        if self.embedded:
+            return self._open_vector_store().live_rows == 0
         try:
             if utility.has_collection(self.config.collection_name):
                 logger.info(f"Collection {self.config.collection_name} exists, checking schema...")
                 collection = Collection(name=self.config.collection_name)
-                collection.load()
                 
                 existing_schema = collection.schema
                 new_schema = self._create_collection_schema()
@@ -160,54 +861,397 @@ class MilvusConnector:
                     logger.warning(f"Collection {self.config.collection_name} has different schema. Recreating...")
                     utility.drop_collection(self.config.collection_name)
                     collection = Collection(name=self.config.collection_name, schema=new_schema)
-                    collection.create_index(field_name="embedding", index_type="IVF_FLAT", metric_type="L2")
+                    recreated = True
+                else:
+                    recreated = False
+                self._ensure_index(collection)
+                self._ensure_sparse_index(collection)
+                collection.load()
+                return recreated
             else:
                 logger.info(f"Creating new collection: {self.config.collection_name}")
                 schema = self._create_collection_schema()
                 collection = Collection(name=self.config.collection_name, schema=schema)
-                collection.create_index(field_name="embedding", index_type="IVF_FLAT", metric_type="L2")
+                self._ensure_index(collection)
+                self._ensure_sparse_index(collection)
+                return True
         except MilvusException as e:
             raise MilvusError(f"Failed to manage collection: {str(e)}")
 
-    def insert_data(self, chunks: List[str], metadata_list: List[Dict]) -> None:
-        """Insert data into Milvus collection."""
+    def _primary_field(self) -> str:
+        """Name of the primary key field declared in the collection schema."""
+        for field_config in self.config.collection_schema["fields"]:
+            if field_config.get("is_primary", False):
+                return field_config["name"]
+        raise ConfigError("collection schema has no primary key field")
+
+    def delete_chunks(self, chunk_ids: List[int]) -> None:
+        """Delete previously inserted chunks by primary key."""
+        if not chunk_ids:
+            return
+        if self.embedded:
+            store = self._open_vector_store()
+            store.delete(chunk_ids)
+            store.commit()
+            return
         try:
             collection = Collection(name=self.config.collection_name)
-            collection.load()
-            
+            collection.delete(expr=_id_filter(self._primary_field(), chunk_ids))
+            logger.info(f"Deleted {len(chunk_ids)} stale entries from {self.config.collection_name}")
+        except MilvusException as e:
+            raise MilvusError(f"Failed to delete data from Milvus: {str(e)}")
+
+    @staticmethod
+    def build_entities(chunks: List[str], metadata_list: List[Dict], embeddings: List[List[float]],
+                       keywords_list: List[List[str]],
+                       sparse_vectors: Optional[List[Dict[int, float]]] = None,
+                       sparse_field: str = DEFAULT_SPARSE["field"]) -> List[Dict[str, Any]]:
+        """Assemble the rows inserted into the collection."""
+        entities = []
+        for i in range(len(chunks)):
+            entity = {
+                "embedding": embeddings[i],
+                "content": chunks[i],
+                "metadata": metadata_list[i],
+                "keywords": keywords_list[i],
+                "created_at": datetime.now().isoformat()
+            }
+            if sparse_vectors is not None:
+                entity[sparse_field] = sparse_vectors[i]
+            entities.append(entity)
+        return entities
+
+    def encode_sparse(self, chunks: List[str],
+                      keywords_list: List[List[str]]) -> Optional[List[Dict[int, float]]]:
+        """Sparse keyword vectors of the chunks, or None when hybrid retrieval is disabled."""
+        if self.sparse_encoder is None:
+            return None
+        return self.sparse_encoder.encode_documents(chunks, keywords_list)
+
+    @property
+    def sparse_field(self) -> str:
+        return (self.config.sparse or DEFAULT_SPARSE)["field"]
+
+    def create_writer(self) -> 'MilvusWriter':
+        """Create a buffered writer for bulk ingest into the configured collection."""
+        if self.embedded:
+            return EmbeddedWriter(
+                self._open_vector_store(),
+                vector_field=self.config.index["field"],
+                sparse_field=self.sparse_field,
+                max_rows=self.config.insert_batch_rows,
+                max_bytes=self.config.insert_batch_bytes,
+                flush_interval_seconds=self.config.flush_interval_seconds,
+                compact_threshold_rows=self.config.compact_threshold_rows
+            )
+        return MilvusWriter(
+            Collection(name=self.config.collection_name),
+            primary_field=self._primary_field(),
+            max_rows=self.config.insert_batch_rows,
+            max_bytes=self.config.insert_batch_bytes,
+            flush_interval_seconds=self.config.flush_interval_seconds,
+            compact_threshold_rows=self.config.compact_threshold_rows
+        )
+
+    def insert_data(self, chunks: List[str], metadata_list: List[Dict],
+                    embeddings: Optional[np.ndarray] = None,
+                    keywords_list: Optional[List[List[str]]] = None) -> List[int]:
+        """Insert data into Milvus collection and return the generated primary keys.
+
+        Embeddings and keywords computed ahead of time (e.g. by BatchEmbedder and
+        KeywordExtractor) can be passed in to avoid computing them again.
+        """
+        try:
             # Generate embeddings
-            logger.info("Generating embeddings...")
-            embeddings = self.embedding_model.encode(chunks).tolist()
+            if embeddings is None:
+                logger.info("Generating embeddings...")
+                embeddings = self.embedding_model.encode(chunks)
+            embeddings = np.asarray(embeddings).tolist()
             
             # Generate keywords
-            logger.info("Generating keywords...")
-            keywords_list = []
-            for chunk in chunks:
-                keywords = self.keyword_model.extract_keywords(chunk, keyphrase_ngram_range=(1, 3))
-                keywords_list.append([k[0] for k in keywords])
+            if keywords_list is None:
+                logger.info("Generating keywords...")
+                keywords_list = []
+                for chunk in chunks:
+                    keywords = self.keyword_model.extract_keywords(chunk, keyphrase_ngram_range=(1, 3))
+                    keywords_list.append([k[0] for k in keywords])
             
             # Prepare entities
-            entities = []
-            for i in range(len(chunks)):
-                entity = {
-                    "embedding": embeddings[i],
-                    "content": chunks[i],
-                    "metadata": metadata_list[i],
-                    "keywords": keywords_list[i],
-                    "created_at": datetime.now().isoformat()
-                }
-                entities.append(entity)
+            entities = self.build_entities(chunks, metadata_list, embeddings, keywords_list,
+                                           self.encode_sparse(chunks, keywords_list), self.sparse_field)
             
             # Insert data
             logger.info(f"Inserting {len(entities)} entities...")
-            collection.insert(entities)
-            collection.flush()
+            if self.embedded:
+                writer = self.create_writer()
+                primary_keys: List[int] = []
+                writer.add(entities, primary_keys.extend)
+                writer.finish()
+            else:
+                collection = Collection(name=self.config.collection_name)
+                collection.load()
+                primary_keys = list(collection.insert(entities).primary_keys)
+                collection.flush()
             logger.info(f"Successfully inserted {len(entities)} entries into {self.config.collection_name}")
+            return primary_keys
+        except MilvusError:
+            raise
         except MilvusException as e:
             raise MilvusError(f"Failed to insert data into Milvus: {str(e)}")
         except Exception as e:
             raise ModelError(f"Failed to process data: {str(e)}")
 
+def _id_filter(primary_field: str, ids: List[int]) -> str:
+    """Milvus boolean expression selecting rows by primary key."""
+    return f"{primary_field} in [{', '.join(str(i) for i in ids)}]"
+
+class MilvusWriter:
+    """Buffers entities and writes them to Milvus in large batches.
+
+    Buffered rows are inserted once ``max_rows`` rows or an estimated ``max_bytes`` bytes
+    have accumulated. The collection is flushed once when the writer finishes, or every
+    ``flush_interval_seconds`` if set, instead of after every file, which keeps Milvus from
+    sealing thousands of tiny segments. Runs that insert or delete at least
+    ``compact_threshold_rows`` rows trigger a compaction at the end.
+    """
+
+    def __init__(self, collection: Collection, primary_field: str = "id", max_rows: int = 5000,
+                 max_bytes: int = 64 * 1024 * 1024, flush_interval_seconds: Optional[float] = None,
+                 compact_threshold_rows: Optional[int] = 100000):
+        self.collection = collection
+        self.primary_field = primary_field
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.flush_interval_seconds = flush_interval_seconds
+        self.compact_threshold_rows = compact_threshold_rows
+        self._buffer: List[Dict[str, Any]] = []
+        self._buffer_bytes = 0
+        # Per add() call: (number of rows, success callback, failure callback)
+        self._pending: List[Tuple[int, Callable[[List[int]], None],
+                                  Optional[Callable[[Exception], None]]]] = []
+        self._last_flush = time.monotonic()
+        self.rows_inserted = 0
+        self.rows_deleted = 0
+        self.insert_calls = 0
+        self.flush_calls = 0
+
+    @staticmethod
+    def _estimate_bytes(entity: Dict[str, Any]) -> int:
+        return (4 * len(entity["embedding"])
+                + len(entity["content"].encode("utf-8"))
+                + len(json.dumps(entity["metadata"]))
+                + sum(len(keyword) for keyword in entity["keywords"])
+                + len(entity["created_at"]))
+
+    def add(self, entities: List[Dict[str, Any]], on_inserted: Callable[[List[int]], None],
+            on_failed: Optional[Callable[[Exception], None]] = None) -> None:
+        """Buffer the entities of one file.
+
+        ``on_inserted`` receives their primary keys once they are written; ``on_failed``
+        is called instead if the insert carrying them fails.
+        """
+        self._buffer.extend(entities)
+        self._buffer_bytes += sum(self._estimate_bytes(entity) for entity in entities)
+        self._pending.append((len(entities), on_inserted, on_failed))
+        if len(self._buffer) >= self.max_rows or self._buffer_bytes >= self.max_bytes:
+            self._insert_buffer()
+
+    def delete(self, ids: List[int]) -> None:
+        """Delete rows by primary key."""
+        if not ids:
+            return
+        try:
+            self.collection.delete(expr=_id_filter(self.primary_field, ids))
+            self.rows_deleted += len(ids)
+        except MilvusException as e:
+            raise MilvusError(f"Failed to delete data from Milvus: {str(e)}")
+
+    def _write(self, entities: List[Dict[str, Any]]) -> List[int]:
+        """Insert rows and return their primary keys."""
+        try:
+            return list(self.collection.insert(entities).primary_keys)
+        except MilvusException as e:
+            raise MilvusError(f"Failed to insert data into Milvus: {str(e)}")
+
+    def _insert_buffer(self) -> None:
+        if not self._pending:
+            return
+        buffer, pending = self._buffer, self._pending
+        self._buffer, self._buffer_bytes, self._pending = [], 0, []
+
+        primary_keys: List[int] = []
+        if buffer:
+            try:
+                logger.info(f"Inserting {len(buffer)} entities...")
+                primary_keys = self._write(buffer)
+                self.insert_calls += 1
+                self.rows_inserted += len(buffer)
+            except MilvusError as e:
+                for _, _, on_failed in pending:
+                    if on_failed:
+                        on_failed(e)
+                raise
+
+        offset = 0
+        for count, on_inserted, _ in pending:
+            on_inserted(primary_keys[offset:offset + count])
+            offset += count
+
+        if (self.flush_interval_seconds is not None
+                and time.monotonic() - self._last_flush >= self.flush_interval_seconds):
+            self.flush()
+
+    def flush(self) -> None:
+        try:
+            self.collection.flush()
+            self.flush_calls += 1
+            self._last_flush = time.monotonic()
+        except MilvusException as e:
+            raise MilvusError(f"Failed to flush Milvus collection: {str(e)}")
+
+    def finish(self) -> None:
+        """Insert whatever is still buffered, flush once and compact after large runs."""
+        self._insert_buffer()
+        self.flush()
+        logger.info(f"Wrote {self.rows_inserted} entities in {self.insert_calls} inserts "
+                    f"and {self.flush_calls} flushes, deleted {self.rows_deleted}")
+        changed_rows = self.rows_inserted + self.rows_deleted
+        if self.compact_threshold_rows is not None and changed_rows >= self.compact_threshold_rows:
+            try:
+                logger.info(f"Triggering compaction after {changed_rows} changed rows")
+                self.compact()
+            except MilvusError as e:
+                # Compaction only improves segment layout; the data is already safely written
+                logger.warning(f"Failed to trigger compaction: {str(e)}")
+
+    def compact(self) -> None:
+        try:
+            self.collection.compact()
+        except MilvusException as e:
+            raise MilvusError(f"Failed to compact Milvus collection: {str(e)}")
+
+class EmbeddedWriter(MilvusWriter):
+    """Buffers entities and writes them to an ``EmbeddedVectorStore``.
+
+    Every bulk insert is committed right away, so rows reported to ``on_inserted`` are
+    durable, as they are for Milvus. ``flush`` commits pending deletions.
+    """
+
+    def __init__(self, store: EmbeddedVectorStore, vector_field: str = "embedding",
+                 sparse_field: Optional[str] = None, **kwargs):
+        super().__init__(collection=None, **kwargs)
+        self.store = store
+        self.vector_field = vector_field
+        self.sparse_field = sparse_field
+
+    def _write(self, entities: List[Dict[str, Any]]) -> List[int]:
+        vectors = np.asarray([entity[self.vector_field] for entity in entities], dtype=np.float32)
+        # Keyword vectors are only searched in Milvus; the embedded store serves dense search
+        payloads = [{key: value for key, value in entity.items()
+                     if key not in (self.vector_field, self.sparse_field)}
+                    for entity in entities]
+        try:
+            primary_keys = self.store.add(vectors, payloads)
+            self.store.commit()
+            return primary_keys
+        except (VectorStoreError, OSError) as e:
+            raise MilvusError(f"Failed to insert data into vector store: {str(e)}")
+
+    def delete(self, ids: List[int]) -> None:
+        """Delete rows by primary key."""
+        if not ids:
+            return
+        self.rows_deleted += self.store.delete(ids)
+
+    def flush(self) -> None:
+        try:
+            self.store.commit()
+            self.flush_calls += 1
+            self._last_flush = time.monotonic()
+        except (VectorStoreError, OSError) as e:
+            raise MilvusError(f"Failed to commit vector store: {str(e)}")
+
+    def compact(self) -> None:
+        try:
+            self.store.compact()
+        except (VectorStoreError, OSError) as e:
+            raise MilvusError(f"Failed to compact vector store: {str(e)}")
+
+HEADER_PATTERN = re.compile(r'^(#{1,6})\s+(.+)$')
+
+class HeaderChunker:
+    """Line-based chunker that tracks the markdown header hierarchy.
+
+    Header lines are not included in chunk content; they update the ``headers``
+    metadata attached to the chunks that follow. Chunk length is tracked incrementally,
+    so chunking is linear in the size of the input, and the last lines of each chunk
+    (up to ``chunk_overlap`` characters) are carried over into the next one.
+    """
+
+    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 100):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def _make_chunk(self, lines: deque, source: str, headers: Dict[str, str]) -> Optional[Dict]:
+        chunk_text = '\n'.join(lines).strip()
+        if not chunk_text:
+            return None
+        return {
+            'content': chunk_text,
+            'metadata': {
+                'source': source,
+                'headers': headers.copy()  # Include current header hierarchy
+            }
+        }
+
+    def _overlap_tail(self, lines: deque) -> Tuple[deque, int]:
+        """Trailing lines of a finished chunk that fit within chunk_overlap."""
+        tail: deque = deque()
+        length = 0
+        # Never carry the whole chunk over, otherwise chunking could not make progress
+        for line in islice(reversed(lines), len(lines) - 1):
+            added = len(line) + (1 if tail else 0)
+            if length + added > self.chunk_overlap:
+                break
+            tail.appendleft(line)
+            length += added
+        return tail, length
+
+    def iter_chunks(self, lines: Iterable[str], source: str) -> Iterator[Dict]:
+        """Yield chunks with ``source`` and ``headers`` metadata from an iterable of lines."""
+        current_chunk: deque = deque()
+        current_length = 0  # Length of '\n'.join(current_chunk)
+        fresh_lines = 0  # Lines added since the last chunk was emitted
+        current_headers: Dict[str, str] = {}  # Track current header hierarchy
+
+        for line in lines:
+            # Check for headers
+            header_match = HEADER_PATTERN.match(line)
+            if header_match:
+                level = len(header_match.group(1))
+                title = header_match.group(2).strip()
+                current_headers[str(level)] = title
+                # Remove lower level headers when we encounter a higher level
+                current_headers = {k: v for k, v in current_headers.items() if int(k) <= level}
+                continue
+
+            current_length += len(line) + (1 if current_chunk else 0)
+            current_chunk.append(line)
+            fresh_lines += 1
+
+            if current_length >= self.chunk_size:
+                chunk = self._make_chunk(current_chunk, source, current_headers)
+                if chunk:
+                    yield chunk
+                current_chunk, current_length = self._overlap_tail(current_chunk)
+                fresh_lines = 0
+
+        # Add the last chunk unless it would only repeat the overlap of the previous one
+        if fresh_lines:
+            chunk = self._make_chunk(current_chunk, source, current_headers)
+            if chunk:
+                yield chunk
+
 class MarkdownProcessor:
     def __init__(self, chunk_size: int = 500, chunk_overlap: int = 100):
         self.chunk_size = chunk_size
@@ -244,58 +1288,19 @@ class MarkdownProcessor:
         except Exception as e:
             raise ModelError(f"Failed to chunk text: {str(e)}")
 
+    def iter_markdown(self, file_path: str) -> Iterator[Dict]:
+        """Stream chunks of a markdown file, reading it line by line.
+
+        Only the lines of the chunk being built are kept in memory, so very large
+        files never have to be loaded whole.
+        """
+        chunker = HeaderChunker(self.chunk_size, self.chunk_overlap)
+        with open(file_path, 'r', encoding='utf-8') as f:
+            yield from chunker.iter_chunks((line.rstrip('\n') for line in f), file_path)
+
     def process_markdown(self, file_path: str) -> List[Dict]:
         """Process a markdown file and return chunks with metadata."""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Split content into lines for processing
-        lines = content.split('\n')
-        chunks = []
-        current_chunk = []
-        current_headers = {}  # Track current header hierarchy
-        current_level = 0
-        
-        for line in lines:
-            # Check for headers
-            header_match = re.match(r'^(#{1,6})\s+(.+)$', line)
-            if header_match:
-                level = len(header_match.group(1))
-                title = header_match.group(2).strip()
-                current_headers[str(level)] = title
-                # Remove lower level headers when we encounter a higher level
-                current_headers = {k: v for k, v in current_headers.items() if int(k) <= level}
-                continue
-            
-            # Add line to current chunk
-            current_chunk.append(line)
-            
-            # Check if we should create a new chunk
-            if len('\n'.join(current_chunk)) >= self.chunk_size:
-                chunk_text = '\n'.join(current_chunk).strip()
-                if chunk_text:
-                    chunks.append({
-                        'content': chunk_text,
-                        'metadata': {
-                            'source': file_path,
-                            'headers': current_headers.copy()  # Include current header hierarchy
-                        }
-                    })
-                current_chunk = []
-        
-        # Add the last chunk if it exists
-        if current_chunk:
-            chunk_text = '\n'.join(current_chunk).strip()
-            if chunk_text:
-                chunks.append({
-                    'content': chunk_text,
-                    'metadata': {
-                        'source': file_path,
-                        'headers': current_headers.copy()  # Include current header hierarchy
-                    }
-                })
-        
-        return chunks
+        return list(self.iter_markdown(file_path))
 
 def load_config(config_path="config.yaml") -> Config:
     """Load and validate configuration."""
@@ -306,45 +1311,460 @@ def load_config(config_path="config.yaml") -> Config:
     except Exception as e:
         raise ConfigError(f"Failed to load config file: {str(e)}")
 
-def process_documents(config: Config, milvus_client: MilvusConnector) -> None:
-    """Process markdown documents and insert them into Milvus."""
+ParseOutcome = Union[Tuple[Optional[str], Optional[List[Dict]]], Exception]
+
+def _parse_file(source: str, chunk_size: int, chunk_overlap: int,
+                known_hash: Optional[str], compute_hash: bool) -> Tuple[Optional[str], Optional[List[Dict]]]:
+    """Hash and chunk a single file; runs in worker processes when ``workers > 1``.
+
+    Returns the content hash and the chunks, or ``None`` chunks when the hash matches
+    ``known_hash`` and the file does not need to be re-ingested.
+    """
+    content_hash = IngestManifest.hash_file(source) if compute_hash else None
+    if known_hash is not None and content_hash == known_hash:
+        return content_hash, None
+    processor = MarkdownProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return content_hash, processor.process_markdown(source)
+
+def iter_parsed_files(sources: List[str], chunk_size: int, chunk_overlap: int,
+                      known_hashes: Dict[str, str], compute_hash: bool,
+                      workers: int = 1, ordered: bool = True) -> Iterator[Tuple[str, ParseOutcome]]:
+    """Yield ``(source, outcome)`` for every file, parsing across a process pool if requested.
+
+    The outcome is either ``(content_hash, chunks)`` or the exception raised while parsing.
+    Chunks and metadata only depend on the file itself, so ``ordered=False`` merely lets
+    fast files overtake slow ones on their way to the embedding stage.
+    """
+    if workers <= 1:
+        for source in sources:
+            try:
+                yield source, _parse_file(source, chunk_size, chunk_overlap,
+                                          known_hashes.get(source), compute_hash)
+            except Exception as e:
+                yield source, e
+        return
+
+    # Bound the number of in-flight files so results stream back instead of piling up
+    window = workers * 4
+    # Spawn rather than fork: the pool is started from the ingest-parse thread while the
+    # embedding threads run torch and tokenizers, and a forked child can inherit their
+    # locks in a held state and deadlock. Workers import this module and run _parse_file.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        pending_sources: Dict[Future, str] = {}
+
+        def submit(source: str) -> Future:
+            future = executor.submit(_parse_file, source, chunk_size, chunk_overlap,
+                                     known_hashes.get(source), compute_hash)
+            pending_sources[future] = source
+            return future
+
+        def outcome(future: Future) -> Tuple[str, ParseOutcome]:
+            source = pending_sources.pop(future)
+            try:
+                return source, future.result()
+            except Exception as e:
+                return source, e
+
+        remaining = iter(sources)
+        if ordered:
+            in_flight = deque(submit(source) for source, _ in zip(remaining, range(window)))
+            while in_flight:
+                yield outcome(in_flight.popleft())
+                for source in remaining:
+                    in_flight.append(submit(source))
+                    break
+        else:
+            in_flight = {submit(source) for source, _ in zip(remaining, range(window))}
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield outcome(future)
+                    for source in remaining:
+                        in_flight.add(submit(source))
+                        break
+
+@dataclass
+class ParsedFile:
+    """A chunked markdown file waiting to be embedded and written."""
+    source: str
+    content_hash: Optional[str]
+    previous: Optional[Dict[str, Any]]
+    chunks: List[Dict]
+
+@dataclass
+class IngestBatch:
+    """A group of parsed files travelling through the embed, keyword and insert stages."""
+    files: List[ParsedFile]
+    vectors: Optional[List[np.ndarray]] = None
+    keywords: Optional[List[List[str]]] = None
+    error: Optional[Exception] = None
+
+    @property
+    def texts(self) -> List[str]:
+        return [chunk['content'] for parsed in self.files for chunk in parsed.chunks]
+
+class StageMonitor:
+    """Tracks busy time, processed items and input queue depth of one pipeline stage."""
+
+    def __init__(self, name: str, inbox: Optional[Queue] = None):
+        self.name = name
+        self.inbox = inbox
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.depth_total = 0
+        self.depth_samples = 0
+        self.depth_max = 0
+
+    def sample_queue(self) -> None:
+        if self.inbox is None:
+            return
+        depth = self.inbox.qsize()
+        self.depth_total += depth
+        self.depth_samples += 1
+        self.depth_max = max(self.depth_max, depth)
+
+    @contextmanager
+    def busy(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.busy_seconds += time.perf_counter() - start
+            self.items += 1
+
+    def report(self, wall_seconds: float) -> Dict[str, Any]:
+        report = {
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "utilization": round(self.busy_seconds / wall_seconds, 3) if wall_seconds else 0.0,
+        }
+        if self.inbox is not None:
+            report["queue_capacity"] = self.inbox.maxsize
+            report["queue_depth_avg"] = (round(self.depth_total / self.depth_samples, 2)
+                                         if self.depth_samples else 0.0)
+            report["queue_depth_max"] = self.depth_max
+        return report
+
+_END_OF_STREAM = object()
+
+# Seconds to wait for a stage thread to finish its current batch once the run is stopped
+STAGE_JOIN_TIMEOUT_SECONDS = 60
+
+def _queue_put(queue: Queue, item: Any, stop: threading.Event) -> bool:
+    """Put with backpressure, giving up if the pipeline is being torn down."""
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            continue
+    return False
+
+def _queue_get(queue: Queue, stop: threading.Event) -> Any:
+    while not stop.is_set():
+        try:
+            return queue.get(timeout=0.1)
+        except Empty:
+            continue
+    return _END_OF_STREAM
+
+def _run_stage(monitor: StageMonitor, work, inbox: Queue, outbox: Queue,
+               stop: threading.Event) -> None:
+    """Apply ``work`` to every batch from ``inbox`` and pass it on to ``outbox``.
+
+    Batches that already failed upstream are forwarded untouched so the insert
+    stage can account for them.
+    """
+    try:
+        while True:
+            batch = _queue_get(inbox, stop)
+            if batch is _END_OF_STREAM:
+                break
+            monitor.sample_queue()
+            if batch.error is None:
+                with monitor.busy():
+                    try:
+                        work(batch)
+                    except Exception as e:
+                        logger.error(f"Stage {monitor.name} failed for a batch of "
+                                     f"{len(batch.files)} files: {str(e)}")
+                        batch.error = e
+            if not _queue_put(outbox, batch, stop):
+                break
+    finally:
+        _queue_put(outbox, _END_OF_STREAM, stop)
+
+def _produce_batches(parsed_stream: Iterator[Tuple[str, ParseOutcome]], batch_size: int,
+                     manifest: Optional[IngestManifest], monitor: StageMonitor, outbox: Queue,
+                     parse_stats: IngestStats, stop: threading.Event) -> None:
+    """Parse stage: group parsed files into batches of roughly ``batch_size`` chunks."""
+    try:
+        pending: List[ParsedFile] = []
+        pending_chunks = 0
+        while not stop.is_set():
+            with monitor.busy():
+                item = next(parsed_stream, None)
+            if item is None:
+                break
+            source, outcome = item
+            if isinstance(outcome, Exception):
+                logger.error(f"Failed to process file {source}: {str(outcome)}")
+                parse_stats.failed += 1
+                continue
+
+            content_hash, chunks = outcome
+            if chunks is None:
+                logger.debug(f"Skipping unchanged file {source}")
+                parse_stats.skipped += 1
+                continue
+
+            logger.info(f"Processed {source} into {len(chunks)} chunks")
+            previous = manifest.get(source) if manifest else None
+            pending.append(ParsedFile(source, content_hash, previous, chunks))
+            pending_chunks += len(chunks)
+
+            if pending_chunks >= batch_size:
+                if not _queue_put(outbox, IngestBatch(pending), stop):
+                    return
+                pending, pending_chunks = [], 0
+
+        if pending:
+            _queue_put(outbox, IngestBatch(pending), stop)
+    except Exception as e:
+        logger.error(f"Parse stage failed: {str(e)}")
+        parse_stats.failed += 1
+    finally:
+        # Shuts down the worker pool if parsing stopped early
+        parsed_stream.close()
+        _queue_put(outbox, _END_OF_STREAM, stop)
+
+def _insert_batch(batch: IngestBatch, milvus_client: MilvusConnector, writer: MilvusWriter,
+                  manifest: Optional[IngestManifest], stats: IngestStats) -> None:
+    """Insert stage: hand each file of a batch to the writer.
+
+    A file only counts as ingested, and its old chunks are only deleted, once the
+    writer has actually inserted its new chunks.
+    """
+    if batch.error is not None:
+        stats.failed += len(batch.files)
+        return
+
+    def on_failed(parsed: ParsedFile, error: Exception) -> None:
+        logger.error(f"Failed to insert {parsed.source}: {str(error)}")
+        stats.failed += 1
+
+    def on_inserted(parsed: ParsedFile, chunk_ids: List[int]) -> None:
+        try:
+            # Only drop the old chunks once their replacements are in place
+            if parsed.previous:
+                writer.delete(parsed.previous["chunk_ids"])
+                stats.updated += 1
+            else:
+                stats.added += 1
+            if manifest:
+                manifest.set(parsed.source, parsed.content_hash, chunk_ids)
+        except Exception as e:
+            logger.error(f"Failed to replace old chunks of {parsed.source}: {str(e)}")
+            stats.failed += 1
+
+    offset = 0
+    for parsed, file_vectors in zip(batch.files, batch.vectors):
+        file_keywords = batch.keywords[offset:offset + len(parsed.chunks)]
+        offset += len(parsed.chunks)
+        texts = [chunk['content'] for chunk in parsed.chunks]
+        entities = milvus_client.build_entities(
+            texts,
+            [chunk['metadata'] for chunk in parsed.chunks],
+            np.asarray(file_vectors).tolist(),
+            file_keywords,
+            milvus_client.encode_sparse(texts, file_keywords),
+            milvus_client.sparse_field
+        )
+        try:
+            writer.add(entities,
+                       lambda chunk_ids, parsed=parsed: on_inserted(parsed, chunk_ids),
+                       lambda error, parsed=parsed: on_failed(parsed, error))
+        except MilvusError:
+            # The files buffered for the failed insert were counted by on_failed
+            continue
+
+def process_documents(config: Config, milvus_client: MilvusConnector, full_refresh: bool = False) -> IngestStats:
+    """Process markdown documents and insert them into Milvus.
+
+    Ingest runs as four concurrent stages connected by bounded queues of
+    ``config.queue_size`` batches: parse (``iter_parsed_files``, across ``config.workers``
+    processes when more than one is configured), embed, keyword extraction and insert,
+    which hands rows to a ``MilvusWriter`` that inserts in bulk and flushes once at the end.
+    Parsed files are grouped into batches of about ``config.embedding_batch_size`` chunks.
+    A full queue blocks the stage feeding it, and each stage's utilization and input queue
+    depth are logged and returned in ``IngestStats.stages``.
+
+    When ``config.manifest_path`` is set the run is incremental: files whose content hash
+    matches the manifest are skipped, modified files have their previous chunks replaced and
+    files that disappeared from ``markdown_folder`` have their chunks purged. When the
+    collection had to be (re)created, e.g. after a schema change, the manifest is cleared
+    so every file is ingested again.
+    """
+    stats = IngestStats()
     try:
         # Ensure collection exists with correct schema
-        milvus_client.ensure_collection_exists()
-        
+        recreated = milvus_client.ensure_collection_exists()
+
+        manifest = IngestManifest.load(config.manifest_path) if config.manifest_path else None
+        if manifest and recreated and manifest.entries:
+            logger.warning(f"Collection {config.collection_name} was recreated empty, "
+                           f"re-ingesting all {len(manifest.entries)} files of the manifest")
+            manifest.clear()
+
         # Process markdown files
         markdown_files = list(Path(config.markdown_folder).rglob("*.md"))
-        if not markdown_files:
+        if not markdown_files and manifest is None:
             logger.warning(f"No markdown files found in {config.markdown_folder}")
-            return
+            return stats
+
+        seen_sources = {str(file) for file in markdown_files}
+        known_hashes = {}
+        if manifest and not full_refresh:
+            known_hashes = {source: entry["hash"] for source, entry in manifest.entries.items()}
+
+        to_embed, to_keyword, to_insert = (Queue(maxsize=config.queue_size) for _ in range(3))
+        monitors = [
+            StageMonitor("parse"),
+            StageMonitor("embed", to_embed),
+            StageMonitor("keyword", to_keyword),
+            StageMonitor("insert", to_insert),
+        ]
+        parse_monitor, embed_monitor, keyword_monitor, insert_monitor = monitors
+        parse_stats = IngestStats()
+        stop = threading.Event()
+        writer = milvus_client.create_writer()
+
+        def embed(batch: IngestBatch) -> None:
+            batch.vectors = milvus_client.embedder.embed_files(
+                [[chunk['content'] for chunk in parsed.chunks] for parsed in batch.files]
+            )
 
-        # Initialize MarkdownProcessor with config values
-        markdown_processor = MarkdownProcessor(
+        def extract_keywords(batch: IngestBatch) -> None:
+            texts = batch.texts
+            batch.keywords = milvus_client.keyword_extractor.extract(
+                texts, np.vstack(batch.vectors) if texts else None
+            )
+
+        parsed_stream = iter_parsed_files(
+            [str(file) for file in markdown_files],
             chunk_size=config.chunk_size,
-            chunk_overlap=config.chunk_overlap
+            chunk_overlap=config.chunk_overlap,
+            known_hashes=known_hashes,
+            compute_hash=manifest is not None,
+            workers=config.workers,
+            ordered=config.ordered_results
         )
+        threads = [
+            threading.Thread(target=_produce_batches, name="ingest-parse", daemon=True,
+                             args=(parsed_stream, config.embedding_batch_size, manifest,
+                                   parse_monitor, to_embed, parse_stats, stop)),
+            threading.Thread(target=_run_stage, name="ingest-embed", daemon=True,
+                             args=(embed_monitor, embed, to_embed, to_keyword, stop)),
+            threading.Thread(target=_run_stage, name="ingest-keyword", daemon=True,
+                             args=(keyword_monitor, extract_keywords, to_keyword, to_insert, stop)),
+        ]
+
+        started = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+
+            # The insert stage runs on the calling thread, which also owns stats and the manifest
+            while True:
+                batch = _queue_get(to_insert, stop)
+                if batch is _END_OF_STREAM:
+                    break
+                insert_monitor.sample_queue()
+                with insert_monitor.busy():
+                    _insert_batch(batch, milvus_client, writer, manifest, stats)
+
+            for thread in threads:
+                thread.join()
+            stats.skipped += parse_stats.skipped
+            stats.failed += parse_stats.failed
+
+            if manifest:
+                for source in manifest.sources():
+                    if source in seen_sources:
+                        continue
+                    try:
+                        logger.info(f"Purging chunks of deleted file {source}")
+                        writer.delete(manifest.get(source)["chunk_ids"])
+                        manifest.remove(source)
+                        stats.deleted += 1
+                    except Exception as e:
+                        logger.error(f"Failed to purge deleted file {source}: {str(e)}")
+                        stats.failed += 1
 
-        for file in markdown_files:
             try:
-                logger.info(f"Processing {file}...")
-                chunks = markdown_processor.process_markdown(str(file))
-                milvus_client.insert_data([chunk['content'] for chunk in chunks], [chunk['metadata'] for chunk in chunks])
-            except Exception as e:
-                logger.error(f"Failed to process file {file}: {str(e)}")
-                continue
+                writer.finish()
+            except MilvusError as e:
+                # Files lost with the final insert were counted by on_failed
+                logger.error(f"Failed to finish writing to Milvus: {str(e)}")
+        finally:
+            # Unblock the stage threads if the insert stage bailed out early, and let the
+            # batch they are working on finish so nothing writes to the cache while it is saved
+            stop.set()
+            still_running = []
+            for thread in threads:
+                if thread.is_alive():
+                    thread.join(STAGE_JOIN_TIMEOUT_SECONDS)
+                if thread.is_alive():
+                    still_running.append(thread.name)
+            # Persist progress even if the run is interrupted part-way through
+            if manifest:
+                manifest.save()
+            embedding_cache = milvus_client.embedder.cache
+            if embedding_cache is not None and still_running:
+                logger.error(f"Not saving the embedding cache, {', '.join(still_running)} did not stop "
+                             f"within {STAGE_JOIN_TIMEOUT_SECONDS}s")
+            elif embedding_cache is not None:
+                embedding_cache.save()
+                stats.embedding_cache = embedding_cache.stats()
+                logger.info(f"Embedding cache: {stats.embedding_cache}")
+
+        wall_seconds = time.perf_counter() - started
+        for monitor in monitors:
+            stats.stages[monitor.name] = monitor.report(wall_seconds)
+            logger.info(f"Stage {monitor.name}: {stats.stages[monitor.name]}")
+        logger.info(f"Ingest finished: {stats.summary()}")
+        return stats
     except Exception as e:
         raise MilvusError(f"Failed to process documents: {str(e)}")
 
-def main():
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Ingest markdown documents into Milvus.")
+    parser.add_argument("--config", default="config.yaml", help="Path to the pipeline config file")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="Re-ingest every file even if the manifest says it is unchanged")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of processes used to read and chunk files (overrides config)")
+    parser.add_argument("--unordered", action="store_true",
+                        help="Hand parsed files to the embedding stage as soon as they are ready")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
     try:
         # Load and validate config
-        config = load_config()
+        config = load_config(args.config)
+        if args.workers is not None:
+            if args.workers <= 0:
+                raise ConfigError("--workers must be a positive integer")
+            config.workers = args.workers
+        if args.unordered:
+            config.ordered_results = False
         
         # Initialize Milvus connector
         milvus_client = MilvusConnector(config)
         
         # Process documents
-        process_documents(config, milvus_client)
+        process_documents(config, milvus_client, full_refresh=args.full_refresh)
         
     except ConfigError as e:
         logger.error(f"Configuration error: {str(e)}")
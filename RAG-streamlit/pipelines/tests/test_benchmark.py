@@ -0,0 +1,35 @@
+import numpy as np
+import pytest # type: ignore
+from benchmark import brute_force_top_k, recall_at_k, percentile_ms
+
+@pytest.mark.parametrize("metric_type", ["L2", "IP", "COSINE"])
+def test_brute_force_top_k_matches_naive_ranking(metric_type):
+    """Test exact ground truth against a naive per-query ranking."""
+    rng = np.random.default_rng(0)
+    corpus = rng.normal(size=(50, 8)).astype(np.float32)
+    queries = rng.normal(size=(5, 8)).astype(np.float32)
+
+    top = brute_force_top_k(corpus, queries, 5, metric_type)
+
+    for query, found in zip(queries, top):
+        if metric_type == "L2":
+            expected = np.argsort(np.linalg.norm(corpus - query, axis=1))[:5]
+        elif metric_type == "IP":
+            expected = np.argsort(-(corpus @ query))[:5]
+        else:
+            cosine = (corpus @ query) / (np.linalg.norm(corpus, axis=1) * np.linalg.norm(query))
+            expected = np.argsort(-cosine)[:5]
+        assert found.tolist() == expected.tolist()
+
+def test_recall_at_k():
+    """Test recall against exact neighbours."""
+    ground_truth = np.array([[1, 2, 3], [4, 5, 6]])
+    assert recall_at_k([[1, 2, 3], [4, 5, 6]], ground_truth, 3) == 1.0
+    assert recall_at_k([[3, 9, 1], [7, 8, 9]], ground_truth, 3) == pytest.approx(2 / 6)
+    assert recall_at_k([], ground_truth, 3) == 0.0
+
+def test_percentile_ms():
+    """Test latency percentiles are reported in milliseconds."""
+    latencies = [0.001] * 99 + [0.1]
+    assert percentile_ms(latencies, 50) == pytest.approx(1.0)
+    assert percentile_ms(latencies, 99) > 1.0
@@ -1,19 +1,34 @@
 import pytest # type: ignore
 import os
+import threading
+import time
 from pathlib import Path
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import Mock, patch, MagicMock, call
 import yaml
 import numpy as np
+from keybert import KeyBERT
+from pymilvus.exceptions import MilvusException
+from keybert.backend import BaseEmbedder
 from pipeline import (
     Config,
     ConfigError,
     MilvusError,
     ModelError,
     MilvusConnector,
+    MilvusWriter,
+    ModelRegistry,
+    BatchEmbedder,
+    EmbeddingCache,
+    KeywordExtractor,
+    SparseEncoder,
+    IngestManifest,
+    HeaderChunker,
+    iter_parsed_files,
     MarkdownProcessor,
     load_config,
     process_documents
 )
+from vector_store import EmbeddedVectorStore
 
 # Test data
 SAMPLE_CONFIG = {
@@ -92,13 +107,19 @@ def mock_models():
          patch('pipeline.KeyBERT') as mock_kb:
         # Create a mock for the SentenceTransformer instance
         mock_st_instance = MagicMock()
-        # Configure encode to return a numpy array with shape (2, 384) for two chunks
-        mock_st_instance.encode.return_value = np.array([[0.1] * 384, [0.2] * 384])
+        # Configure encode to return one 384-dim row per input chunk
+        mock_st_instance.encode.side_effect = lambda texts, **kwargs: np.array(
+            [[0.1 * (i + 1)] * 384 for i in range(len(texts))]
+        )
         mock_st.return_value = mock_st_instance
         
         # Create a mock for the KeyBERT instance
         mock_kb_instance = MagicMock()
-        mock_kb_instance.extract_keywords.return_value = [('test', 0.5)]
+        # Like KeyBERT, return a flat list for a single document and one list per document otherwise
+        mock_kb_instance.extract_keywords.side_effect = lambda docs, **kwargs: (
+            [('test', 0.5)] if isinstance(docs, str) or len(docs) == 1
+            else [[('test', 0.5)] for _ in docs]
+        )
         mock_kb.return_value = mock_kb_instance
         
         yield mock_st, mock_kb
@@ -123,6 +144,12 @@ def test_config_validation():
     with pytest.raises(ConfigError, match="chunk_overlap must be a non-negative integer"):
         Config.from_dict(invalid_config)
 
+    # Test overlap that would prevent chunking from making progress
+    invalid_config = SAMPLE_CONFIG.copy()
+    invalid_config['chunk_overlap'] = invalid_config['chunk_size']
+    with pytest.raises(ConfigError, match="chunk_overlap must be smaller than chunk_size"):
+        Config.from_dict(invalid_config)
+
 def test_milvus_connector_initialization(config, mock_milvus, mock_models):
     """Test MilvusConnector initialization."""
     connector = MilvusConnector(config)
@@ -131,6 +158,108 @@ def test_milvus_connector_initialization(config, mock_milvus, mock_models):
         "default", host=config.milvus_host, port=config.milvus_port
     )
 
+def test_model_registry_shares_one_model(config, mock_milvus, mock_models):
+    """Test that embedding and keyword models sharing a name load the weights once."""
+    config.keyword_model = 'sentence-transformers/' + config.embedding_model
+    connector = MilvusConnector(config)
+
+    mock_models[0].assert_called_once_with(config.embedding_model, device=None)
+    mock_models[1].assert_called_once_with(model=connector.embedding_model)
+    assert connector.keyword_extractor.reuse_embeddings
+
+    # A different device is a different model instance
+    registry = connector.model_registry
+    registry.sentence_transformer(config.embedding_model, device='cuda')
+    assert mock_models[0].call_count == 2
+
+def test_index_config_defaults_and_validation():
+    """Test the index section of the config."""
+    config = Config.from_dict(SAMPLE_CONFIG)
+    assert config.index["type"] == "IVF_FLAT" and config.index["metric_type"] == "L2"
+
+    config = Config.from_dict({**SAMPLE_CONFIG, 'index': {
+        'type': 'hnsw', 'metric_type': 'cosine', 'params': {'M': 8}, 'search_params': {'ef': 32}
+    }})
+    assert config.index == {'field': 'embedding', 'type': 'HNSW', 'metric_type': 'COSINE',
+                            'params': {'M': 8}, 'search_params': {'ef': 32}}
+
+    # The type is compared case-insensitively, so the default type keeps its default parameters
+    config = Config.from_dict({**SAMPLE_CONFIG, 'index': {'type': 'ivf_flat'}})
+    assert config.index["type"] == "IVF_FLAT"
+    assert config.index["params"] == Config.from_dict(SAMPLE_CONFIG).index["params"]
+
+    with pytest.raises(ConfigError, match="index type must be one of"):
+        Config.from_dict({**SAMPLE_CONFIG, 'index': {'type': 'FLAT_ISH'}})
+    with pytest.raises(ConfigError, match="index metric_type must be one of"):
+        Config.from_dict({**SAMPLE_CONFIG, 'index': {'metric_type': 'HAMMING'}})
+
+def test_sparse_config_requires_schema_field():
+    """Test that hybrid retrieval is off by default and needs a sparse schema field."""
+    assert Config.from_dict(SAMPLE_CONFIG).sparse is None
+    with pytest.raises(ConfigError, match="must be a SPARSE_FLOAT_VECTOR field"):
+        Config.from_dict({**SAMPLE_CONFIG, 'sparse': {'k1': 1.5}})
+
+    fields = SAMPLE_CONFIG['collection']['schema']['fields'] + [
+        {'name': 'sparse_embedding', 'data_type': 'SPARSE_FLOAT_VECTOR', 'description': 'Keywords'}
+    ]
+    config = Config.from_dict({**SAMPLE_CONFIG, 'sparse': {'k1': 1.5},
+                               'collection': {'name': 'test_collection', 'schema': {'fields': fields}}})
+    assert config.sparse['k1'] == 1.5 and config.sparse['field'] == 'sparse_embedding'
+
+# Also asserted for SparseQueryEncoder in backend/tests/test_tools.py; ingest and query
+# vectors only match while both encoders produce these dimensions.
+SPARSE_PARITY_TEXT = "Restart Milvus after ERR-1042 in v2.5 of snake_case"
+SPARSE_PARITY_IDS = {
+    'restart': 1846618126, 'milvus': 2110922686, 'after': 53734573,
+    'err-1042': 1352077437, 'v2.5': 1887635492, 'snake_case': 1961520350,
+}
+
+def test_sparse_encoder_matches_backend_token_ids():
+    """Test that tokens and dimensions match the ones pinned for the backend query encoder."""
+    tokens = SparseEncoder.tokenize(SPARSE_PARITY_TEXT)
+    assert tokens == list(SPARSE_PARITY_IDS)
+    assert {token: SparseEncoder.token_id(token) for token in tokens} == SPARSE_PARITY_IDS
+
+def test_sparse_encoder_weights():
+    """Test tokenization, term-frequency saturation and keyword boosting."""
+    encoder = SparseEncoder(k1=1.2, b=0.75, avg_doc_length=10)
+    assert SparseEncoder.tokenize("The ERR-1042 in v2.5 of DataNinja_API") == [
+        'err-1042', 'v2.5', 'dataninja_api'
+    ]
+
+    vector = encoder.encode_document("retry retry retry timeout")
+    retry, timeout = SparseEncoder.token_id('retry'), SparseEncoder.token_id('timeout')
+    assert set(vector) == {retry, timeout}
+    # Repeated terms weigh more, but saturate below k1 + 1
+    assert vector[timeout] < vector[retry] < 2.2
+
+    boosted = encoder.encode_document("retry retry retry timeout", keywords=["timeout"])
+    assert boosted[timeout] > vector[timeout]
+    assert encoder.encode_document("the of and") == {}
+
+def test_ensure_index_rebuilds_mismatched_index(config, mock_milvus, mock_models):
+    """Test that an index built with other settings is replaced by the configured one."""
+    config.index = {**config.index, 'type': 'HNSW', 'metric_type': 'COSINE',
+                    'params': {'M': 16, 'efConstruction': 200}}
+    connector = MilvusConnector(config)
+    collection = MagicMock()
+    existing = MagicMock(field_name='embedding',
+                         params={'index_type': 'IVF_FLAT', 'metric_type': 'L2', 'params': {'nlist': 128}})
+    collection.indexes = [existing]
+
+    connector._ensure_index(collection)
+    collection.drop_index.assert_called_once()
+    collection.create_index.assert_called_once_with(field_name='embedding', index_params={
+        'index_type': 'HNSW', 'metric_type': 'COSINE', 'params': {'M': 16, 'efConstruction': 200}
+    })
+
+    # An index matching the config is left alone
+    collection.reset_mock()
+    existing.params = {'index_type': 'HNSW', 'metric_type': 'COSINE',
+                       'params': '{"M": "16", "efConstruction": "200"}'}
+    connector._ensure_index(collection)
+    collection.create_index.assert_not_called()
+
 def test_milvus_connector_collection_creation(config, mock_milvus):
     """Test collection creation in MilvusConnector."""
     connector = MilvusConnector(config)
@@ -157,6 +286,52 @@ def test_milvus_connector_data_insertion(config, mock_milvus, mock_models):
     collection.insert.assert_called_once()
     collection.flush.assert_called_once()
 
+def test_batch_embedder_maps_vectors_back_to_files():
+    """Test that length-sorted batching preserves per-file vector order."""
+    model = MagicMock()
+    # Encode each text as a vector filled with its own length
+    model.encode.side_effect = lambda texts, **kwargs: np.array([[len(t)] * 4 for t in texts])
+    embedder = BatchEmbedder(model, batch_size=2)
+
+    files = [["ccc", "a"], ["bbbbb"], ["dd"]]
+    vectors = embedder.embed_files(files)
+
+    assert model.encode.call_count == 2
+    # The first batch holds the two shortest chunks regardless of file order
+    assert model.encode.call_args_list[0][0][0] == ["a", "dd"]
+    for chunks, file_vectors in zip(files, vectors):
+        assert [int(v[0]) for v in file_vectors] == [len(c) for c in chunks]
+
+class HashingBackend(BaseEmbedder):
+    """Deterministic KeyBERT backend that embeds texts as bags of character trigrams."""
+
+    def embed(self, documents, verbose=False):
+        vectors = np.zeros((len(documents), 64))
+        for row, text in enumerate(documents):
+            for i in range(len(text) - 2):
+                vectors[row, sum(map(ord, text[i:i + 3])) % 64] += 1
+        return vectors
+
+def test_keyword_extractor_matches_per_chunk_results():
+    """Test that batched extraction with precomputed embeddings matches per-chunk KeyBERT."""
+    backend = HashingBackend()
+    keybert = KeyBERT(model=backend)
+    texts = [
+        "Milvus stores dense vectors for semantic search over the documentation.",
+        "Error code E1042 means the ingest worker lost its connection to Milvus.",
+        "the and of",  # Only stop words, so no keyword candidates
+    ]
+    expected = []
+    for text in texts:
+        keywords = keybert.extract_keywords(text, keyphrase_ngram_range=(1, 3))
+        expected.append([k[0] for k in keywords])
+
+    spy = MagicMock(wraps=keybert)
+    extractor = KeywordExtractor(spy)
+    assert extractor.extract(texts, backend.embed(texts)) == expected
+    spy.extract_keywords.assert_called_once()
+    assert spy.extract_keywords.call_args.kwargs['doc_embeddings'] is not None
+
 def test_markdown_processor():
     """Test MarkdownProcessor functionality."""
     # Create test markdown file
@@ -188,6 +363,30 @@ This is a test document.
         test_file.unlink()
         test_file.parent.rmdir()
 
+def test_header_chunker_tracks_headers_and_overlap():
+    """Test header hierarchy metadata and chunk_overlap handling."""
+    lines = ["# Guide", "## Install", "aaaa", "bbbb", "cccc", "## Usage", "dddd", "eeee"]
+    chunks = list(HeaderChunker(chunk_size=9, chunk_overlap=4).iter_chunks(lines, "doc.md"))
+
+    assert [c['content'] for c in chunks] == ["aaaa\nbbbb", "bbbb\ncccc", "cccc\ndddd", "dddd\neeee"]
+    assert chunks[0]['metadata'] == {'source': 'doc.md', 'headers': {'1': 'Guide', '2': 'Install'}}
+    assert chunks[-1]['metadata']['headers'] == {'1': 'Guide', '2': 'Usage'}
+
+    # Without overlap every line lands in exactly one chunk
+    chunks = list(HeaderChunker(chunk_size=9, chunk_overlap=0).iter_chunks(lines, "doc.md"))
+    assert [c['content'] for c in chunks] == ["aaaa\nbbbb", "cccc\ndddd", "eeee"]
+
+def test_markdown_processor_streams_file(tmp_path):
+    """Test that iter_markdown yields the same chunks as process_markdown."""
+    file_path = tmp_path / "big.md"
+    file_path.write_text("# Reference\n" + "\n".join(f"entry {i}" for i in range(1000)))
+    processor = MarkdownProcessor(chunk_size=200, chunk_overlap=50)
+
+    stream = processor.iter_markdown(str(file_path))
+    first = next(stream)
+    assert first['metadata']['headers'] == {'1': 'Reference'}
+    assert [first] + list(stream) == processor.process_markdown(str(file_path))
+
 def test_load_config(tmp_path):
     """Test configuration loading."""
     # Create test config file
@@ -221,12 +420,55 @@ def test_process_documents(config, mock_milvus, mock_models, tmp_path):
     connector = MilvusConnector(config)
     process_documents(config, connector)
     
+    # Chunks from both documents are embedded in a single batch
+    assert mock_models[0].return_value.encode.call_count == 1
+
     # Verify collection operations
     collection = mock_milvus[1].return_value
-    # Each document is processed and inserted separately
-    assert collection.insert.call_count == len(test_files)
-    # Flush is called after each document insertion
-    assert collection.flush.call_count == len(test_files)
+    # Both documents are buffered into a single bulk insert
+    assert collection.insert.call_count == 1
+    assert len(collection.insert.call_args[0][0]) == len(test_files)
+    # The collection is flushed once at the end of the run
+    assert collection.flush.call_count == 1
+
+def test_process_documents_embedded_store(config, mock_milvus, mock_models, tmp_path):
+    """Test that the embedded vector store replaces Milvus end to end."""
+    docs_dir = tmp_path / "test_docs"
+    docs_dir.mkdir()
+    (docs_dir / "doc1.md").write_text("---\ntitle: doc1\n---\n\nTest document 1")
+    (docs_dir / "doc2.md").write_text("---\ntitle: doc2\n---\n\nTest document 2")
+    config.markdown_folder = str(docs_dir)
+    config.manifest_path = str(tmp_path / "manifest.json")
+    config.vector_store = {'type': 'embedded', 'path': str(tmp_path / "store")}
+
+    connector = MilvusConnector(config)
+    stats = process_documents(config, connector)
+    assert stats.added == 2
+    # Milvus is never contacted
+    mock_milvus[0].connect.assert_not_called()
+    mock_milvus[1].assert_not_called()
+
+    hits = connector.vector_store.search(np.full((1, 384), 0.1), top_k=5)[0]
+    contents = sorted(payload['content'] for _, _, payload in hits)
+    assert len(contents) == 2
+    assert contents[0].endswith('Test document 1') and contents[1].endswith('Test document 2')
+
+    # Editing a file replaces its rows in the store
+    (docs_dir / "doc1.md").write_text("---\ntitle: doc1\n---\n\nTest document 1, edited")
+    stats = process_documents(config, MilvusConnector(config))
+    assert stats.updated == 1 and stats.skipped == 1
+    hits = EmbeddedVectorStore(str(tmp_path / "store"), 384, "L2").search(np.full((1, 384), 0.1), top_k=5)[0]
+    contents = sorted(payload['content'] for _, _, payload in hits)
+    assert len(contents) == 2
+    assert contents[0].endswith('Test document 1, edited') and contents[1].endswith('Test document 2')
+
+def test_vector_store_config_validation():
+    """Test the vector_store section of the config."""
+    assert Config.from_dict(SAMPLE_CONFIG).vector_store == {'type': 'milvus'}
+    with pytest.raises(ConfigError, match="vector_store type must be one of"):
+        Config.from_dict({**SAMPLE_CONFIG, 'vector_store': {'type': 'faiss'}})
+    with pytest.raises(ConfigError, match="vector_store path is required"):
+        Config.from_dict({**SAMPLE_CONFIG, 'vector_store': {'type': 'embedded'}})
 
 def test_error_handling():
     """Test error handling in various components."""
@@ -244,4 +486,233 @@ def test_error_handling():
     with patch('pipeline.SentenceTransformer') as mock_st:
         mock_st.side_effect = Exception("Model loading failed")
         with pytest.raises(ModelError):
-            MilvusConnector(Config.from_dict(SAMPLE_CONFIG)) 
\ No newline at end of file
+            MilvusConnector(Config.from_dict(SAMPLE_CONFIG)) 
+
+def test_process_documents_incremental(config, mock_milvus, mock_models, tmp_path):
+    """Test that the manifest drives skip/update/delete decisions across runs."""
+    docs_dir = tmp_path / "test_docs"
+    docs_dir.mkdir()
+    (docs_dir / "keep.md").write_text("Unchanged document")
+    (docs_dir / "edit.md").write_text("Original document")
+    (docs_dir / "gone.md").write_text("Soon to be deleted")
+
+    config.markdown_folder = str(docs_dir)
+    config.manifest_path = str(tmp_path / "manifest.json")
+    collection = mock_milvus[1].return_value
+    next_ids = iter(range(1, 100))
+    collection.insert.side_effect = lambda entities: MagicMock(
+        primary_keys=[next(next_ids) for _ in entities]
+    )
+
+    connector = MilvusConnector(config)
+    stats = process_documents(config, connector)
+    assert (stats.added, stats.updated, stats.deleted, stats.skipped) == (3, 0, 0, 0)
+    assert collection.insert.call_count == 1
+    manifest = IngestManifest.load(config.manifest_path)
+    assert sorted(i for s in manifest.sources() for i in manifest.get(s)["chunk_ids"]) == [1, 2, 3]
+    edit_ids = manifest.get(str(docs_dir / "edit.md"))["chunk_ids"]
+
+    # The collection now exists with the configured schema
+    mock_milvus[2].has_collection.return_value = True
+    collection.schema = connector._create_collection_schema()
+    (docs_dir / "edit.md").write_text("Edited document")
+    (docs_dir / "gone.md").unlink()
+    collection.reset_mock()
+
+    stats = process_documents(config, connector)
+    assert (stats.added, stats.updated, stats.deleted, stats.skipped) == (0, 1, 1, 1)
+    assert collection.insert.call_count == 1
+    # Old chunks of the edited file and all chunks of the deleted file are removed
+    assert collection.delete.call_count == 2
+    assert call(expr=f"id in [{edit_ids[0]}]") in collection.delete.call_args_list
+    assert IngestManifest.load(config.manifest_path).get(str(docs_dir / "edit.md"))["chunk_ids"] == [4]
+
+def test_process_documents_reingests_after_collection_is_recreated(config, mock_milvus, mock_models, tmp_path):
+    """Test that a collection recreated for a schema change is refilled instead of left empty."""
+    docs_dir = tmp_path / "test_docs"
+    docs_dir.mkdir()
+    (docs_dir / "one.md").write_text("First document")
+    (docs_dir / "two.md").write_text("Second document")
+    config.markdown_folder = str(docs_dir)
+    config.manifest_path = str(tmp_path / "manifest.json")
+    collection = mock_milvus[1].return_value
+    next_ids = iter(range(1, 100))
+    collection.insert.side_effect = lambda entities: MagicMock(
+        primary_keys=[next(next_ids) for _ in entities]
+    )
+
+    connector = MilvusConnector(config)
+    assert process_documents(config, connector).added == 2
+
+    # The existing collection was created with an older schema, so it is dropped
+    mock_milvus[2].has_collection.return_value = True
+    collection.schema = "schema without the sparse field"
+    collection.reset_mock()
+
+    stats = process_documents(config, connector)
+    mock_milvus[2].drop_collection.assert_called_once_with(config.collection_name)
+    assert (stats.added, stats.skipped, stats.deleted) == (2, 0, 0)
+    assert len(collection.insert.call_args[0][0]) == 2
+    collection.delete.assert_not_called()
+    manifest = IngestManifest.load(config.manifest_path)
+    assert sorted(i for s in manifest.sources() for i in manifest.get(s)["chunk_ids"]) == [3, 4]
+
+def test_process_documents_saves_cache_after_stages_stop(config, mock_milvus, mock_models, tmp_path):
+    """Test that a failed insert stage waits for the embed stage before saving the cache."""
+    docs_dir = tmp_path / "test_docs"
+    docs_dir.mkdir()
+    (docs_dir / "one.md").write_text("First document")
+    (docs_dir / "two.md").write_text("Second document")
+    config.markdown_folder = str(docs_dir)
+    config.embedding_batch_size = 1
+
+    connector = MilvusConnector(config)
+    embedding = threading.Event()
+    def embed_files(files):
+        embedding.set()
+        time.sleep(0.3)
+        embedding.clear()
+        return [np.full((len(chunks), 384), 0.1) for chunks in files]
+    connector.embedder.embed_files = embed_files
+    connector.embedder.cache = MagicMock()
+    saved_while_embedding = []
+    connector.embedder.cache.save.side_effect = lambda: saved_while_embedding.append(embedding.is_set())
+
+    with patch('pipeline._insert_batch', side_effect=RuntimeError("insert failed")):
+        with pytest.raises(MilvusError, match="insert failed"):
+            process_documents(config, connector)
+    assert saved_while_embedding == [False]
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_iter_parsed_files_with_workers_matches_serial(tmp_path, ordered):
+    """Test that parallel parsing yields the same chunks and metadata as serial parsing."""
+    sources = []
+    for i in range(6):
+        file_path = tmp_path / f"doc{i}.md"
+        file_path.write_text(f"# Title {i}\n\n" + "\n".join(f"line {j} of doc {i}" for j in range(50)))
+        sources.append(str(file_path))
+
+    serial = dict(iter_parsed_files(sources, 200, 0, {}, compute_hash=True))
+    parallel = list(iter_parsed_files(sources, 200, 0, {}, compute_hash=True,
+                                      workers=2, ordered=ordered))
+
+    if ordered:
+        assert [source for source, _ in parallel] == sources
+    assert dict(parallel) == serial
+
+def test_iter_parsed_files_skips_known_hashes(tmp_path):
+    """Test that files whose hash matches the manifest are not chunked again."""
+    file_path = tmp_path / "doc.md"
+    file_path.write_text("Unchanged content")
+    known = {str(file_path): IngestManifest.hash_file(str(file_path))}
+
+    [(source, (content_hash, chunks))] = iter_parsed_files([str(file_path)], 500, 0, known, True)
+    assert content_hash == known[source]
+    assert chunks is None
+
+def test_process_documents_reports_stages_and_isolates_failures(config, mock_milvus, mock_models, tmp_path):
+    """Test that a failing embed batch is counted without stalling the staged pipeline."""
+    docs_dir = tmp_path / "test_docs"
+    docs_dir.mkdir()
+    for i in range(5):
+        (docs_dir / f"doc{i}.md").write_text(f"Test document {i}")
+
+    config.markdown_folder = str(docs_dir)
+    config.embedding_batch_size = 1
+    config.queue_size = 1
+
+    encode = mock_models[0].return_value.encode
+    default_encode = encode.side_effect
+    def flaky_encode(texts, **kwargs):
+        if texts == ["Test document 2"]:
+            raise RuntimeError("boom")
+        return default_encode(texts, **kwargs)
+    encode.side_effect = flaky_encode
+
+    connector = MilvusConnector(config)
+    stats = process_documents(config, connector)
+
+    assert (stats.added, stats.failed) == (4, 1)
+    assert set(stats.stages) == {"parse", "embed", "keyword", "insert"}
+    assert stats.stages["embed"]["items"] == 5
+    assert stats.stages["insert"]["queue_capacity"] == 1
+    assert 0.0 <= stats.stages["embed"]["utilization"] <= 1.0
+
+def _entity(content, dim=4):
+    return {"embedding": [0.0] * dim, "content": content, "metadata": {}, "keywords": [],
+            "created_at": "2024-01-01T00:00:00"}
+
+def test_milvus_writer_buffers_and_maps_primary_keys():
+    """Test that the writer batches inserts by row budget and maps keys back per file."""
+    collection = MagicMock()
+    next_ids = iter(range(100))
+    collection.insert.side_effect = lambda entities: MagicMock(
+        primary_keys=[next(next_ids) for _ in entities]
+    )
+    writer = MilvusWriter(collection, max_rows=3, compact_threshold_rows=5)
+    received = {}
+
+    writer.add([_entity("a1"), _entity("a2")], lambda ids: received.setdefault("a", ids))
+    assert collection.insert.call_count == 0
+    writer.add([_entity("b1"), _entity("b2")], lambda ids: received.setdefault("b", ids))
+    assert collection.insert.call_count == 1
+    writer.add([], lambda ids: received.setdefault("empty", ids))
+    writer.add([_entity("c1")], lambda ids: received.setdefault("c", ids))
+    collection.flush.assert_not_called()
+
+    writer.finish()
+    assert received == {"a": [0, 1], "b": [2, 3], "empty": [], "c": [4]}
+    assert collection.insert.call_count == 2
+    collection.flush.assert_called_once()
+    collection.compact.assert_called_once()
+
+def test_milvus_writer_byte_budget_and_failures():
+    """Test the byte budget and that a failed insert reports every buffered file."""
+    collection = MagicMock()
+    collection.insert.side_effect = MilvusException(message="insert failed")
+    writer = MilvusWriter(collection, max_rows=100, max_bytes=150, compact_threshold_rows=None)
+    failed = []
+
+    writer.add([_entity("x" * 50)], lambda ids: None, lambda e: failed.append("x"))
+    assert collection.insert.call_count == 0
+    with pytest.raises(MilvusError):
+        writer.add([_entity("y" * 50)], lambda ids: None, lambda e: failed.append("y"))
+    assert failed == ["x", "y"]
+
+def test_embedding_cache_skips_encoding_cached_chunks(tmp_path):
+    """Test that a persisted cache serves repeated chunks without re-encoding them."""
+    model = MagicMock()
+    model.encode.side_effect = lambda texts, **kwargs: np.array(
+        [[float(len(t)), 1.0, 2.0] for t in texts]
+    )
+    texts = ["alpha", "beta", "gamma"]
+
+    cache = EmbeddingCache(str(tmp_path), "all-MiniLM-L6-v2")
+    first = BatchEmbedder(model, batch_size=2, cache=cache).embed(texts)
+    cache.save()
+    assert cache.stats()["misses"] == 3
+
+    model.encode.reset_mock()
+    reopened = EmbeddingCache(str(tmp_path), "all-MiniLM-L6-v2")
+    second = BatchEmbedder(model, batch_size=2, cache=reopened).embed(texts + ["delta"])
+    np.testing.assert_array_equal(second[:3], first)
+    model.encode.assert_called_once()
+    assert model.encode.call_args[0][0] == ["delta"]
+    assert reopened.stats()["hits"] == 3
+    assert not reopened.get("alpha").flags.writeable
+
+    # Another model never sees these vectors
+    assert EmbeddingCache(str(tmp_path), "other-model").get("alpha") is None
+
+def test_embedding_cache_evicts_least_recently_used(tmp_path):
+    """Test that the cache stays within max_entries and keeps recently used vectors."""
+    cache = EmbeddingCache(str(tmp_path), "model", max_entries=4, dtype="float16")
+    cache.put_many(["a", "b", "c", "d"], np.arange(8, dtype=np.float32).reshape(4, 2))
+    cache.get_many(["a", "b"])
+    cache.put_many(["e", "f"], np.ones((2, 2), dtype=np.float32))
+
+    assert len(cache) <= 4
+    assert cache.get("c") is None and cache.get("d") is None
+    assert cache.get("a") is not None and cache.get("f") is not None
+    assert cache.get("a").dtype == np.float16
+    assert cache.stats()["evictions"] >= 2
@@ -0,0 +1,69 @@
+import pytest # type: ignore
+import numpy as np
+from vector_store import EmbeddedVectorStore, VectorStoreError, hnswlib
+
+def random_vectors(count, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+
+def test_exact_search_matches_brute_force(tmp_path):
+    """Test that exact search returns the true nearest rows under each metric."""
+    vectors = random_vectors(50)
+    query = vectors[:3] + 0.01
+    for metric in ("COSINE", "IP", "L2"):
+        store = EmbeddedVectorStore(str(tmp_path / metric), 8, metric, initial_capacity=4)
+        ids = store.add(vectors, [{"content": str(i)} for i in range(50)])
+        store.commit()
+        assert ids == list(range(1, 51)) and store.capacity >= 50
+
+        if metric == "L2":
+            expected = np.argsort(((query[:, None, :] - vectors[None]) ** 2).sum(-1), axis=1)[:, :5]
+        else:
+            corpus = vectors
+            if metric == "COSINE":
+                corpus = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            expected = np.argsort(-(query @ corpus.T), axis=1)[:, :5]
+        results = store.search(query, top_k=5)
+        assert [[hit[0] - 1 for hit in hits] for hits in results] == expected.tolist()
+        assert results[0][0][2] == {"content": str(expected[0][0])}
+
+def test_delete_persistence_and_compaction(tmp_path):
+    """Test that deletions, reopening and compaction keep the surviving rows and keys."""
+    vectors = random_vectors(20)
+    store = EmbeddedVectorStore(str(tmp_path), 8, "COSINE")
+    store.add(vectors, [{"content": str(i)} for i in range(20)])
+    store.commit()
+    assert store.delete([1, 2, 999]) == 2
+    store.commit()
+    assert all(hit[0] not in (1, 2) for hit in store.search(vectors[:2], top_k=5)[0])
+
+    reopened = EmbeddedVectorStore(str(tmp_path), 8, "COSINE")
+    assert (reopened.rows, reopened.live_rows, reopened.next_id) == (20, 18, 21)
+    reopened.compact()
+    assert reopened.rows == 18
+    hits = reopened.search(vectors[5:6], top_k=1)[0]
+    assert hits[0][0] == 6 and hits[0][2] == {"content": "5"}
+    assert reopened.add(vectors[:1], [{"content": "new"}]) == [21]
+
+    with pytest.raises(VectorStoreError, match="expected 16-dim"):
+        EmbeddedVectorStore(str(tmp_path), 16, "COSINE")
+
+@pytest.mark.skipif(hnswlib is None, reason="hnswlib is not installed")
+def test_hnsw_graph_is_maintained_incrementally(tmp_path):
+    """Test that the HNSW graph covers rows added across commits and skips deleted ones."""
+    hnsw = {"M": 16, "ef_construction": 100}
+    vectors = random_vectors(200)
+    store = EmbeddedVectorStore(str(tmp_path), 8, "COSINE", hnsw=hnsw)
+    store.add(vectors[:100], [{}] * 100)
+    store.commit()
+    store = EmbeddedVectorStore(str(tmp_path), 8, "COSINE", hnsw=hnsw)
+    store.add(vectors[100:], [{}] * 100)
+    store.delete([1])
+    store.commit()
+
+    index = hnswlib.Index(space="ip", dim=8)
+    index.load_index(str(tmp_path / EmbeddedVectorStore.HNSW_FILE))
+    assert index.get_current_count() == 200
+    labels, _ = index.knn_query(vectors[150:151] / np.linalg.norm(vectors[150]), k=1)
+    assert labels[0][0] == 150
+    labels, _ = index.knn_query(vectors[:1] / np.linalg.norm(vectors[0]), k=1)
+    assert labels[0][0] != 0
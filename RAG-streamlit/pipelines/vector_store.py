@@ -0,0 +1,295 @@
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # HNSW is optional; exact search works without it
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+SUPPORTED_METRICS = ("COSINE", "IP", "L2")
+
+class VectorStoreError(Exception):
+    """Custom exception for embedded vector store errors."""
+    pass
+
+class EmbeddedVectorStore:
+    """In-process vector store persisted to memory-mapped files in one directory.
+
+    Layout of ``path``:
+
+    - ``vectors.f32``: float32 matrix of ``capacity`` x ``dim`` vectors (normalized for COSINE)
+    - ``ids.i64``: primary key of every row, -1 once the row is deleted
+    - ``offsets.i64``: (start, length) of every row's JSON payload in ``payloads.jsonl``
+    - ``payloads.jsonl``: the non-vector fields of every row, appended as written
+    - ``hnsw.bin``: optional HNSW graph over the row numbers, built with hnswlib
+    - ``manifest.json``: dimensions, metric, used rows and a generation counter
+
+    Rows are appended in place and only become visible to readers when ``commit()``
+    atomically rewrites the manifest. Growing the matrices writes new files that replace
+    the old ones, so readers holding the old mappings keep a consistent view. The backend
+    reads this format with its own ``EmbeddedVectorStore`` in backend/src/vector_store.py.
+    """
+
+    MANIFEST_FILE = "manifest.json"
+    VECTORS_FILE = "vectors.f32"
+    IDS_FILE = "ids.i64"
+    OFFSETS_FILE = "offsets.i64"
+    PAYLOADS_FILE = "payloads.jsonl"
+    HNSW_FILE = "hnsw.bin"
+
+    def __init__(self, path: str, dim: int, metric_type: str = "COSINE",
+                 hnsw: Optional[Dict[str, Any]] = None, initial_capacity: int = 1024):
+        metric_type = metric_type.upper()
+        if metric_type not in SUPPORTED_METRICS:
+            raise VectorStoreError(f"metric_type must be one of {', '.join(SUPPORTED_METRICS)}")
+        if hnsw and hnswlib is None:
+            raise VectorStoreError("HNSW indexing needs the hnswlib package: pip install hnswlib")
+        self.path = path
+        self.hnsw_params = hnsw
+        os.makedirs(path, exist_ok=True)
+
+        manifest = self._read_manifest()
+        if manifest:
+            if manifest["dim"] != dim or manifest["metric_type"] != metric_type:
+                raise VectorStoreError(
+                    f"Vector store at {path} holds {manifest['dim']}-dim {manifest['metric_type']} "
+                    f"vectors, expected {dim}-dim {metric_type}; remove it to rebuild")
+            self.dim = manifest["dim"]
+            self.metric_type = manifest["metric_type"]
+            self.rows = manifest["rows"]
+            self.capacity = manifest["capacity"]
+            self.next_id = manifest["next_id"]
+            self.generation = manifest["generation"]
+            self.hnsw_rows = manifest.get("hnsw_rows", 0) if manifest.get("hnsw") == hnsw else 0
+        else:
+            self.dim = dim
+            self.metric_type = metric_type
+            self.rows = 0
+            self.capacity = initial_capacity
+            self.next_id = 1
+            self.generation = 0
+            self.hnsw_rows = 0
+            self._allocate(self.capacity)
+        self._open()
+        self._row_of = {int(row_id): row for row, row_id in enumerate(self.ids[:self.rows]) if row_id >= 0}
+        self._deleted_rows: List[int] = []
+        self._hnsw = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._file(self.MANIFEST_FILE), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        if manifest.get("version") != FORMAT_VERSION:
+            raise VectorStoreError(f"Unsupported vector store format {manifest.get('version')} at {self.path}")
+        return manifest
+
+    def _allocate(self, capacity: int, suffix: str = "") -> None:
+        """Create zero-filled matrices for ``capacity`` rows."""
+        for name, dtype, shape in ((self.VECTORS_FILE, np.float32, (capacity, self.dim)),
+                                   (self.IDS_FILE, np.int64, (capacity,)),
+                                   (self.OFFSETS_FILE, np.int64, (capacity, 2))):
+            matrix = np.memmap(self._file(name + suffix), dtype=dtype, mode="w+", shape=shape)
+            if name == self.IDS_FILE:
+                matrix[:] = -1
+            matrix.flush()
+            del matrix
+        open(self._file(self.PAYLOADS_FILE), "ab").close()
+
+    def _open(self) -> None:
+        self.vectors = np.memmap(self._file(self.VECTORS_FILE), dtype=np.float32, mode="r+",
+                                 shape=(self.capacity, self.dim))
+        self.ids = np.memmap(self._file(self.IDS_FILE), dtype=np.int64, mode="r+", shape=(self.capacity,))
+        self.offsets = np.memmap(self._file(self.OFFSETS_FILE), dtype=np.int64, mode="r+",
+                                 shape=(self.capacity, 2))
+
+    def _grow(self, needed_rows: int) -> None:
+        """Copy the matrices into files with room for ``needed_rows`` rows."""
+        capacity = self.capacity
+        while capacity < needed_rows:
+            capacity *= 2
+        self._allocate(capacity, suffix=".tmp")
+        for name, source in ((self.VECTORS_FILE, self.vectors), (self.IDS_FILE, self.ids),
+                             (self.OFFSETS_FILE, self.offsets)):
+            target = np.memmap(self._file(name + ".tmp"), dtype=source.dtype, mode="r+",
+                               shape=(capacity,) + source.shape[1:])
+            target[:self.rows] = source[:self.rows]
+            target.flush()
+            del target
+        self.flush()
+        for name in (self.VECTORS_FILE, self.IDS_FILE, self.OFFSETS_FILE):
+            os.replace(self._file(name + ".tmp"), self._file(name))
+        self.capacity = capacity
+        self._open()
+
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if self.metric_type == "COSINE":
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+    def add(self, vectors: np.ndarray, payloads: List[Dict[str, Any]]) -> List[int]:
+        """Append rows and return their new primary keys; visible to readers after ``commit()``."""
+        vectors = self._prepare(vectors)
+        if len(vectors) != len(payloads):
+            raise VectorStoreError("Every vector needs exactly one payload")
+        if not len(vectors):
+            return []
+        if self.rows + len(vectors) > self.capacity:
+            self._grow(self.rows + len(vectors))
+
+        start, end = self.rows, self.rows + len(vectors)
+        ids = list(range(self.next_id, self.next_id + len(vectors)))
+        with open(self._file(self.PAYLOADS_FILE), "ab") as f:
+            position = f.tell()
+            for row, payload in enumerate(payloads, start=start):
+                encoded = (json.dumps(payload, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+                f.write(encoded)
+                self.offsets[row] = (position, len(encoded))
+                position += len(encoded)
+        self.vectors[start:end] = vectors
+        self.ids[start:end] = ids
+        for row, row_id in enumerate(ids, start=start):
+            self._row_of[row_id] = row
+        self.rows = end
+        self.next_id += len(ids)
+        return ids
+
+    def delete(self, ids: List[int]) -> int:
+        """Mark rows as deleted; returns how many existed."""
+        deleted = 0
+        for row_id in ids:
+            row = self._row_of.pop(int(row_id), None)
+            if row is not None:
+                self.ids[row] = -1
+                self._deleted_rows.append(row)
+                deleted += 1
+        return deleted
+
+    @property
+    def live_rows(self) -> int:
+        return len(self._row_of)
+
+    def flush(self) -> None:
+        for matrix in (self.vectors, self.ids, self.offsets):
+            matrix.flush()
+
+    def _update_hnsw(self) -> None:
+        """Add the rows written since the last commit to the HNSW graph and persist it."""
+        if not self.hnsw_params:
+            return
+        space = {"COSINE": "ip", "IP": "ip", "L2": "l2"}[self.metric_type]
+        if self._hnsw is None:
+            self._hnsw = hnswlib.Index(space=space, dim=self.dim)
+            if self.hnsw_rows and os.path.exists(self._file(self.HNSW_FILE)):
+                self._hnsw.load_index(self._file(self.HNSW_FILE), max_elements=max(self.capacity, 1),
+                                      allow_replace_deleted=False)
+            else:
+                self._hnsw.init_index(max_elements=max(self.capacity, 1),
+                                      M=self.hnsw_params.get("M", 16),
+                                      ef_construction=self.hnsw_params.get("ef_construction", 200))
+                self.hnsw_rows = 0
+        if self._hnsw.get_max_elements() < self.capacity:
+            self._hnsw.resize_index(self.capacity)
+        if self.rows > self.hnsw_rows:
+            rows = np.arange(self.hnsw_rows, self.rows)
+            self._hnsw.add_items(np.asarray(self.vectors[self.hnsw_rows:self.rows]), rows)
+            for row in rows[self.ids[self.hnsw_rows:self.rows] < 0]:
+                self._hnsw.mark_deleted(int(row))
+        for row in self._deleted_rows:
+            if row < self.hnsw_rows:
+                self._hnsw.mark_deleted(row)
+        self.hnsw_rows = self.rows
+        self._hnsw.save_index(self._file(self.HNSW_FILE + ".tmp"))
+        os.replace(self._file(self.HNSW_FILE + ".tmp"), self._file(self.HNSW_FILE))
+
+    def commit(self) -> None:
+        """Persist written rows and deletions and publish them to readers."""
+        self.flush()
+        self._update_hnsw()
+        self._deleted_rows = []
+        self.generation += 1
+        manifest = {
+            "version": FORMAT_VERSION,
+            "dim": self.dim,
+            "metric_type": self.metric_type,
+            "rows": self.rows,
+            "capacity": self.capacity,
+            "next_id": self.next_id,
+            "generation": self.generation,
+            "hnsw": self.hnsw_params,
+            "hnsw_rows": self.hnsw_rows if self.hnsw_params else 0,
+        }
+        tmp_path = self._file(self.MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._file(self.MANIFEST_FILE))
+
+    def compact(self) -> None:
+        """Rewrite the store without deleted rows; primary keys are kept."""
+        live = np.flatnonzero(self.ids[:self.rows] >= 0)
+        vectors = np.array(self.vectors[live])
+        ids = np.array(self.ids[live])
+        with open(self._file(self.PAYLOADS_FILE), "rb") as f:
+            payloads = [self._read_payload(f, *self.offsets[row]) for row in live]
+        for name in (self.PAYLOADS_FILE, self.HNSW_FILE):
+            if os.path.exists(self._file(name)):
+                os.replace(self._file(name), self._file(name + ".old"))
+        next_id = self.next_id
+        self.rows, self.hnsw_rows, self._hnsw, self._row_of = 0, 0, None, {}
+        self._grow(max(len(live), 1))
+        self.ids[:] = -1
+        self.add(vectors, payloads)
+        # add() assigns fresh keys; restore the original ones
+        self.ids[:len(live)] = ids
+        self._row_of = {int(row_id): row for row, row_id in enumerate(ids)}
+        self.next_id = next_id
+        self._deleted_rows = []
+        self.commit()
+        for name in (self.PAYLOADS_FILE, self.HNSW_FILE):
+            if os.path.exists(self._file(name + ".old")):
+                os.remove(self._file(name + ".old"))
+        logger.info(f"Compacted vector store at {self.path} to {len(live)} rows")
+
+    @staticmethod
+    def _read_payload(f, start: int, length: int) -> Dict[str, Any]:
+        f.seek(int(start))
+        return json.loads(f.read(int(length)).decode("utf-8"))
+
+    def search(self, queries: np.ndarray, top_k: int) -> List[List[Tuple[int, float, Dict[str, Any]]]]:
+        """Exact top-k search; scores follow Milvus (similarity for COSINE/IP, squared L2 distance)."""
+        queries = self._prepare(queries)
+        vectors = self.vectors[:self.rows]
+        if self.metric_type == "L2":
+            scores = -(np.einsum("ij,ij->i", vectors, vectors)[None, :] - 2 * queries @ vectors.T
+                       + np.einsum("ij,ij->i", queries, queries)[:, None])
+        else:
+            scores = queries @ vectors.T
+        scores[:, self.ids[:self.rows] < 0] = -np.inf
+        k = min(top_k, self.live_rows)
+        results = []
+        with open(self._file(self.PAYLOADS_FILE), "rb") as f:
+            for row_scores in scores:
+                if k <= 0:
+                    results.append([])
+                    continue
+                top = np.argpartition(-row_scores, k - 1)[:k]
+                top = top[np.argsort(-row_scores[top])]
+                results.append([
+                    (int(self.ids[row]),
+                     float(-row_scores[row] if self.metric_type == "L2" else row_scores[row]),
+                     self._read_payload(f, *self.offsets[row]))
+                    for row in top
+                ])
+        return results